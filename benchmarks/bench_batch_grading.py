@@ -0,0 +1,208 @@
+"""批量批改初评 + 仲裁阶段的吞吐量与内存占用。
+
+评审模型由脚本内的桩代替，每次调用固定耗时 `--latency` 秒并直接返回 JSON 结果。
+默认模式使用复用的评审代理和有界 worker 池（`--concurrency`）；`--legacy` 按改造前
+的方式为每个（学生，评审员）组合新建 ReAct 代理并一次性 gather 全部任务作为对照；
+`--batch-size` 大于 1 时使用批量批改模式。答案去重关闭，每份答案都会批改。
+加上 `--memory` 时用 tracemalloc 统计 Python 分配峰值（会明显拖慢运行）。
+
+用法（在仓库根目录）::
+
+    python benchmarks/bench_batch_grading.py --sizes 50 500 5000 --latency 0.05
+    python benchmarks/bench_batch_grading.py --sizes 50 500 --latency 0.05 --legacy
+    python benchmarks/bench_batch_grading.py --sizes 50 500 --memory
+    python benchmarks/bench_batch_grading.py --sizes 50 500 --batch-size 10
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import tracemalloc
+from typing import Any, List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import dotenv  # noqa: E402
+
+dotenv.load_dotenv()
+
+from langchain_core.language_models import BaseChatModel  # noqa: E402
+from langchain_core.messages import AIMessage, BaseMessage  # noqa: E402
+from langchain_core.outputs import ChatGeneration, ChatResult  # noqa: E402
+from langchain_core.runnables import RunnableLambda  # noqa: E402
+from langgraph.prebuilt import create_react_agent  # noqa: E402
+
+from src.agent import batch_grading_agent as bga  # noqa: E402
+from src.agent.models import register_model  # noqa: E402
+
+
+class _FakeGrader(BaseChatModel):
+    """固定耗时的评审模型，分数由答案决定；约 1/5 的答案 reviewer_B 给出相反的分数，
+    评审员对这些答案报告的把握程度也较低。"""
+
+    latency: float = 0.05
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-grader"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def with_structured_output(self, schema, **kwargs):
+        """批量批改：为输入中的每个学生 ID 返回一条结果；汇总报告返回空报告。"""
+        if schema is bga.AggregatedReport:
+            return RunnableLambda(
+                lambda _: schema(
+                    common_error_patterns=[], overall_performance_summary="", teaching_suggestions=[]
+                )
+            )
+
+        async def grade(messages):
+            await asyncio.sleep(self.latency)
+            system, user = messages[0][1], messages[-1][1]
+            pattern = r"学生\(ID: (\S+?)\)的回答:\*\*\n---\n(.*?)\n---"
+            return schema(
+                results=[
+                    {**self._result(answer, system), "student_id": student_id}
+                    for student_id, answer in re.findall(pattern, user, re.S)
+                ]
+            )
+
+        return RunnableLambda(grade)
+
+    def _result(self, answer: str, system: str) -> dict:
+        digest = hashlib.md5(answer.encode()).digest()
+        score = digest[0] / 255
+        disputed = digest[1] % 5 == 0
+        if disputed and "reviewer_B" in system:
+            score = 1 - score
+        return {
+            "student_id": "",
+            "is_correct": score > 0.5,
+            "score": score,
+            "analysis": "桩评审结果",
+            "errors": [],
+            "reviewer": "",
+            "confidence": 0.6 if disputed else 0.9,
+        }
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs):
+        raise NotImplementedError
+
+    async def _agenerate(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        answer = re.search(r"---\n(.*?)\n---", str(messages[-1].content), re.S)
+        content = json.dumps(self._result(answer.group(1), str(messages[0].content)))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+
+def _state(size: int) -> dict:
+    question = bga.Question(
+        questionType="short_answer",
+        questionText="简述 TCP 三次握手的过程",
+        difficulty="medium",
+        options=[],
+        correctAnswer="SYN、SYN-ACK、ACK",
+        answerExplanation="客户端发送 SYN，服务端回复 SYN-ACK，客户端再发送 ACK。",
+    )
+    answers = [
+        bga.StudentAnswer(student_id=f"s{i}", answer=f"第 {i % 97} 种答法：SYN 然后 ACK")
+        for i in range(size)
+    ]
+    return {"question": question, "student_answers": answers}
+
+
+async def _legacy_initial_review(state, config):
+    """改造前的做法：每个（学生，评审员）新建代理，全部任务一次性 gather。"""
+    question, answers = state["question"], state["student_answers"]
+
+    async def grade(answer, reviewer_id):
+        agent = create_react_agent(
+            model=bga.get_model(bga.REVIEWER_ROLES[reviewer_id]),
+            prompt=bga.GRADER_PROMPT.format(
+                reviewer_id=reviewer_id, schema=bga.SingleGradingResult.model_json_schema()
+            ),
+            tools=[bga.search, bga.get_stu_exam_status, bga.rag_tool],
+        )
+        result = await agent.ainvoke(
+            {"messages": [("user", f"{question.questionText}\n---\n{answer.answer}\n---")]}, config
+        )
+        parsed = bga.SingleGradingResult(**json.loads(result["messages"][-1].content))
+        parsed.student_id, parsed.reviewer = answer.student_id, reviewer_id
+        return parsed
+
+    results = await asyncio.gather(
+        *(grade(a, r) for a in answers for r in ("reviewer_A", "reviewer_B")),
+        return_exceptions=True,
+    )
+    review_results = {}
+    for res in results:
+        if isinstance(res, bga.SingleGradingResult):
+            review_results.setdefault(res.student_id, []).append(res)
+    return {"review_results": review_results}
+
+
+async def _run(size: int, concurrency: int, legacy: bool, memory: bool, batch_size: int):
+    state = _state(size)
+    config = {
+        "configurable": {
+            "course_id": "bench",
+            "grading_concurrency": concurrency,
+            "grading_batch_size": batch_size,
+            "answer_clustering": "off",
+            "prefetch_exam_status": False,
+        }
+    }
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    review = _legacy_initial_review if legacy else bga.initial_review_node
+    state.update(await review(state, config))
+    arbitration = await bga.arbitration_node(state, config)
+    elapsed = time.perf_counter() - start
+    peak = 0
+    if memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    arbitrated = sum(1 for r in arbitration.get("review_results", {}).values() if len(r) == 3)
+    return elapsed, peak, arbitrated
+
+
+async def main(
+    sizes: List[int], latency: float, concurrency: int, legacy: bool, memory: bool, batch_size: int
+):
+    register_model("reviewer", _FakeGrader(latency=latency))
+    register_model("arbitrator", _FakeGrader(latency=latency))
+    mode = "legacy" if legacy else f"pool({concurrency})"
+    if batch_size > 1:
+        mode += f" batch({batch_size})"
+    for size in sizes:
+        elapsed, peak, arbitrated = await _run(size, concurrency, legacy, memory, batch_size)
+        line = f"{mode:<10} answers={size:<6} {elapsed:7.2f} s  {size / elapsed:8.1f} answers/s"
+        if memory:
+            line += f"  peak={peak / 2**20:7.1f} MiB"
+        print(f"{line}  arbitrated={arbitrated}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--latency", type=float, default=0.05, help="每次模型调用耗时（秒）")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--legacy", action="store_true", help="每次新建代理并无上限 gather")
+    parser.add_argument("--memory", action="store_true", help="统计内存分配峰值")
+    parser.add_argument("--batch-size", type=int, default=1, help="每次调用批改的答案数")
+    args = parser.parse_args()
+    asyncio.run(
+        main(
+            args.sizes, args.latency, args.concurrency, args.legacy, args.memory, args.batch_size
+        )
+    )
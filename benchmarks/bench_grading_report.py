@@ -0,0 +1,125 @@
+"""汇总报告生成耗时与提示词长度随班级人数的变化。
+
+合成 `--sizes` 个不同规模班级的最终批改结果（失分评语来自若干错误模板并带上学生各自的
+细节，不会被完全去重），分别用改造前的做法（把全部结果序列化进一个提示词）和
+`report_generator_node` 生成报告。桩模型的耗时按提示词估算的 token 数计算：
+固定 `--base-latency` 秒加上每千 token `--per-1k` 秒，超过 `--context` 个 token 视为超长。
+
+用法（在仓库根目录）::
+
+    python benchmarks/bench_grading_report.py --sizes 30 300 3000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import dotenv  # noqa: E402
+
+dotenv.load_dotenv()
+
+from langchain_core.language_models import BaseChatModel  # noqa: E402
+from langchain_core.runnables import RunnableLambda  # noqa: E402
+
+from bench_batch_grading import _state  # noqa: E402
+from src.agent import batch_grading_agent as bga  # noqa: E402
+from src.agent.grading_report import ErrorPattern, ErrorPatterns, _estimate_tokens  # noqa: E402
+from src.agent.models import register_model  # noqa: E402
+
+ERRORS = [
+    "漏掉了第三次握手的 ACK", "把 SYN-ACK 写成了两个报文", "混淆了 SYN 和 FIN",
+    "没有说明序列号的作用", "把握手方向写反", "只写了报文名称没有解释", "将三次握手和四次挥手混淆",
+    "认为 UDP 也需要握手", "没有提到连接建立后的状态", "把确认号写成序列号",
+]
+
+
+class _TimedModel(BaseChatModel):
+    """耗时与提示词长度成正比的桩模型，记录每次调用的 token 数。"""
+
+    base_latency: float = 1.0
+    per_1k: float = 0.3
+    prompts: list = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "timed-fake"
+
+    def with_structured_output(self, schema, **kwargs):
+        async def respond(prompt):
+            tokens = _estimate_tokens(str(prompt))
+            self.prompts.append(tokens)
+            await asyncio.sleep(self.base_latency + self.per_1k * tokens / 1000)
+            if schema is ErrorPatterns:
+                return ErrorPatterns(
+                    patterns=[ErrorPattern(description=e, student_count=1) for e in ERRORS[:8]]
+                )
+            return schema(
+                common_error_patterns=ERRORS[:3], overall_performance_summary="", teaching_suggestions=[]
+            )
+
+        return RunnableLambda(respond)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise NotImplementedError
+
+
+def _results(size: int, rng: random.Random):
+    results = []
+    for i in range(size):
+        score = round(rng.random(), 2)
+        errors = "；".join(rng.sample(ERRORS, 2))
+        analysis = f"学生{i}的回答中{errors}，其中第 {rng.randint(1, 5)} 句表述不清，建议复习课本第 {rng.randint(1, 9)} 节。"
+        results.append(
+            bga.FinalGradingResult(
+                student_id=f"s{i}",
+                final_score=1.0 if score > 0.9 else score,
+                final_analysis="回答完全正确。" if score > 0.9 else analysis,
+                is_controversial=rng.random() < 0.1,
+            )
+        )
+    return results
+
+
+async def _legacy(state):
+    """改造前：全部结果序列化进一个提示词，交给报告模型。"""
+    summary = [r.model_dump_json() for r in state["final_grading_results"]]
+    prompt = f"{state['question'].questionText}\n---\n{summary}\n---\n{bga.AggregatedReport.model_json_schema()}"
+    return await bga.get_model("arbitrator").with_structured_output(bga.AggregatedReport).ainvoke(prompt)
+
+
+async def main(sizes, base_latency, per_1k, context):
+    model = _TimedModel(base_latency=base_latency, per_1k=per_1k, prompts=[])
+    register_model("arbitrator", model)
+    register_model("summarizer", model)
+    rng = random.Random(0)
+    for size in sizes:
+        state = {"question": _state(1)["question"], "final_grading_results": _results(size, rng)}
+        for name, run in (
+            ("legacy", _legacy),
+            ("map-reduce", lambda s: bga.report_generator_node(s, {})),
+        ):
+            model.prompts.clear()
+            start = time.perf_counter()
+            await run(state)
+            elapsed = time.perf_counter() - start
+            largest = max(model.prompts)
+            flag = "  EXCEEDS CONTEXT" if largest > context else ""
+            print(
+                f"{name:<10} students={size:<5} {elapsed:6.2f} s  calls={len(model.prompts):<3} "
+                f"largest prompt={largest:>7} tokens{flag}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[30, 300, 3000])
+    parser.add_argument("--base-latency", type=float, default=1.0, help="每次调用的固定耗时（秒）")
+    parser.add_argument("--per-1k", type=float, default=0.3, help="每千个输入 token 增加的耗时（秒）")
+    parser.add_argument("--context", type=int, default=32000, help="报告模型的上下文长度（token）")
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.base_latency, args.per_1k, args.context))
@@ -0,0 +1,78 @@
+"""对比批量批改图中 student_graded 事件与图状态中的结果，教师多久能看到结果。
+
+按学生扇出批改时，每个学生批改完成（初评一致或仲裁结束）就发送一个 student_graded
+事件；只读取图状态的客户端要等 collect_results 之后才一次性看到全部结果。脚本在同一次
+运行中记录两者首个结果的到达时间（TTFR）和完成曲线（累计完成 10%、25%、50%、75%、
+90%、100% 的时间）。
+评审模型为 bench_batch_grading 中的桩模型，每次调用耗时 `--latency` 秒并带随机抖动。
+
+用法（在仓库根目录）::
+
+    python benchmarks/bench_grading_stream.py --students 200 --latency 0.2
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import dotenv  # noqa: E402
+
+dotenv.load_dotenv()
+
+from bench_batch_grading import _FakeGrader, _state  # noqa: E402
+
+from src.agent.batch_grading_agent import build_batch_grading_workflow  # noqa: E402
+from src.agent.models import register_model  # noqa: E402
+
+MILESTONES = (0.1, 0.25, 0.5, 0.75, 0.9, 1.0)
+
+
+class _JitteryGrader(_FakeGrader):
+    """每次调用耗时在 latency 的 0.5~1.5 倍之间随机波动。"""
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency * random.uniform(-0.5, 0.5))
+        return await super()._agenerate(messages, stop, run_manager, **kwargs)
+
+
+async def _run(graph, students: int, concurrency: int):
+    config = {"configurable": {"grading_concurrency": concurrency, "answer_clustering": "off"}}
+    arrivals = {"events": [], "state": []}
+    start = time.perf_counter()
+    async for mode, chunk in graph.astream(_state(students), config, stream_mode=["custom", "updates"]):
+        now = time.perf_counter() - start
+        if mode == "custom" and chunk.get("event") == "student_graded":
+            arrivals["events"].append(now)
+        elif mode == "updates" and "collect_results" in chunk:
+            arrivals["state"].extend([now] * len(chunk["collect_results"]["final_grading_results"]))
+    total = time.perf_counter() - start
+    return {
+        name: (times[0], [times[max(0, int(len(times) * m) - 1)] for m in MILESTONES], total)
+        for name, times in arrivals.items()
+    }
+
+
+async def main(students: int, latency: float, concurrency: int):
+    random.seed(0)
+    register_model("reviewer", _JitteryGrader(latency=latency))
+    register_model("arbitrator", _JitteryGrader(latency=latency))
+    graph = build_batch_grading_workflow()
+    header = "  ".join(f"{int(m * 100):>3}%" for m in MILESTONES)
+    print(f"{'mode':<9} {'TTFR':>6}  {header}   total")
+    for name, (ttfr, curve, total) in (await _run(graph, students, concurrency)).items():
+        points = "  ".join(f"{t:4.1f}" for t in curve)
+        print(f"{name:<9} {ttfr:5.2f}s  {points}  {total:5.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2, help="每次模型调用的平均耗时（秒）")
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    asyncio.run(main(args.students, args.latency, args.concurrency))
@@ -0,0 +1,67 @@
+"""对比每次调用都构建图与从注册表取已编译图的开销。
+
+只测构建/编译本身，不运行图，因此不会调用模型或 LightRAG（仍需要 .env 中的
+API Key 等配置，以便各模块能正常导入）。
+
+用法（在仓库根目录）::
+
+    python benchmarks/bench_graph_registry.py --iterations 50
+"""
+
+import argparse
+import asyncio
+import importlib
+import inspect
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import dotenv  # noqa: E402
+
+dotenv.load_dotenv()
+
+from src.agent import graph_registry  # noqa: E402
+
+
+async def _build(name: str):
+    module_name, attr = graph_registry.GRAPH_BUILDERS[name].split(":")
+    graph = getattr(importlib.import_module(module_name), attr)()
+    if inspect.isawaitable(graph):
+        graph = await graph
+    return graph
+
+
+async def _time(fn, iterations: int):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+async def main(names, iterations: int):
+    await graph_registry.warm_up(names)
+    print(f"{'graph':<28}{'rebuild p50':>14}{'registry p50':>15}{'speedup':>10}")
+    for name in names:
+        rebuild_p50, _ = await _time(lambda: _build(name), iterations)
+        cached_p50, _ = await _time(lambda: graph_registry.get_graph(name), iterations)
+        print(
+            f"{name:<28}{rebuild_p50:>11.2f} ms{cached_p50 * 1000:>12.2f} µs"
+            f"{rebuild_p50 / max(cached_p50, 1e-6):>9.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument(
+        "--graphs",
+        nargs="*",
+        default=["rag_agent", "quiz_generator", "code_generator", "code_validator"],
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.graphs, args.iterations))
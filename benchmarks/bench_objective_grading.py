@@ -0,0 +1,109 @@
+"""客观题确定性批改与模型批改的耗时对比。
+
+生成一份 `--students` 人、`--questions` 道选择题（单选、多选各半）的随机试卷，
+先用 `objective_grading_node` 批改全部题目，再对第一道题走原来的模型批改流程
+（初评 + 仲裁，桩模型每次调用耗时 `--latency` 秒，关闭答案去重）作为对照。
+
+用法（在仓库根目录）::
+
+    python benchmarks/bench_objective_grading.py --students 1000 --questions 20
+    python benchmarks/bench_objective_grading.py --students 1000 --skip-llm
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import dotenv  # noqa: E402
+
+dotenv.load_dotenv()
+
+from bench_batch_grading import _FakeGrader  # noqa: E402
+
+from src.agent import batch_grading_agent as bga  # noqa: E402
+from src.agent.models import register_model  # noqa: E402
+
+LABELS = "ABCD"
+
+
+def _question(rng: random.Random, index: int) -> bga.Question:
+    multiple = index % 2 == 1
+    correct = set(rng.sample(LABELS, rng.randint(2, 3))) if multiple else {rng.choice(LABELS)}
+    return bga.Question(
+        questionType="multiple_choice" if multiple else "single_choice",
+        questionText=f"第 {index + 1} 题",
+        difficulty="medium",
+        options=[
+            bga.Option(optionLabel=label, optionText=f"选项 {label}", isCorrect=label in correct)
+            for label in LABELS
+        ],
+        correctAnswer=",".join(sorted(correct)),
+        answerExplanation="略",
+    )
+
+
+def _answers(rng: random.Random, students: int):
+    formats = [",".join, "".join, "、".join, lambda s: " ".join(s).lower()]
+    answers = []
+    for i in range(students):
+        chosen = rng.sample(LABELS, rng.randint(1, 3))
+        answers.append(
+            bga.StudentAnswer(student_id=f"s{i}", answer=rng.choice(formats)(sorted(chosen)))
+        )
+    return answers
+
+
+async def main(students: int, questions: int, latency: float, concurrency: int, skip_llm: bool):
+    rng = random.Random(0)
+    exam = [(_question(rng, q), _answers(rng, students)) for q in range(questions)]
+
+    start = time.perf_counter()
+    total = 0.0
+    for question, answers in exam:
+        result = bga.objective_grading_node(
+            {"question": question, "student_answers": answers}, {}
+        )
+        total += sum(r.final_score for r in result["final_grading_results"])
+    elapsed = time.perf_counter() - start
+    graded = students * questions
+    print(
+        f"objective  {graded} answers  {elapsed * 1000:8.1f} ms  "
+        f"{elapsed / graded * 1e6:6.1f} us/answer  avg score={total / graded:.3f}"
+    )
+
+    if skip_llm:
+        return
+    register_model("reviewer", _FakeGrader(latency=latency))
+    register_model("arbitrator", _FakeGrader(latency=latency))
+    question, answers = exam[0]
+    state = {"question": question, "student_answers": answers}
+    config = {
+        "configurable": {"grading_concurrency": concurrency, "answer_clustering": "off"}
+    }
+    start = time.perf_counter()
+    state.update(await bga.initial_review_node(state, config))
+    state.update(await bga.arbitration_node(state, config))
+    bga.calculate_final_scores_node(state, config)
+    elapsed = time.perf_counter() - start
+    print(
+        f"llm        {students} answers  {elapsed * 1000:8.1f} ms  "
+        f"{elapsed / students * 1e6:6.1f} us/answer  (1 question, latency={latency}s)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05, help="每次模型调用耗时（秒）")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--skip-llm", action="store_true", help="只运行确定性批改")
+    args = parser.parse_args()
+    asyncio.run(
+        main(args.students, args.questions, args.latency, args.concurrency, args.skip_llm)
+    )
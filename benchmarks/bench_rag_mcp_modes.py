@@ -0,0 +1,194 @@
+"""对比 RAG MCP 服务两种部署方式的内存占用与工具调用延迟。
+
+- stdio：每门课程一个 `rag_tools.py --course-id ...` 子进程（原有方式）
+- http：一个多租户 `rag_tools.py --transport streamable-http` 进程服务所有课程
+
+LightRAG 后端由脚本内置的桩服务代替，因此测到的是 MCP 层本身的开销。
+
+用法（在仓库根目录）::
+
+    python benchmarks/bench_rag_mcp_modes.py --courses 20 --calls 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.agent.mcp_pool import SHARED_SESSION_KEY, MCPSessionPool  # noqa: E402
+
+RAG_TOOLS = os.path.join("src", "agent", "mcp", "rag_tools.py")
+
+
+class _FakeLightRAG(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        body = json.dumps({"response": "stub context"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _children_rss_mb() -> float:
+    """汇总当前进程所有子进程（含孙进程）的 RSS，单位 MB，仅支持 Linux。"""
+    parents = {os.getpid()}
+    total_kb = 0
+    changed = True
+    seen = set()
+    while changed:
+        changed = False
+        for pid in os.listdir("/proc"):
+            if not pid.isdigit() or pid in seen:
+                continue
+            try:
+                with open(f"/proc/{pid}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+                if ppid not in parents:
+                    continue
+                with open(f"/proc/{pid}/status") as f:
+                    for line in f:
+                        if line.startswith("VmRSS:"):
+                            total_kb += int(line.split()[1])
+            except (FileNotFoundError, ProcessLookupError, IndexError, ValueError):
+                continue
+            seen.add(pid)
+            parents.add(int(pid))
+            changed = True
+    return total_kb / 1024
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def _run(pool: MCPSessionPool, keys, courses, calls, concurrency):
+    # 预热：每个 key 建立一次会话
+    for course in courses:
+        await pool.get_tools(keys(course), bound_args={"course_id": course})
+    rss = _children_rss_mb()
+
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        course = random.choice(courses)
+        tools = await pool.get_tools(keys(course), bound_args={"course_id": course})
+        async with sem:
+            start = time.perf_counter()
+            await tools[0].ainvoke({"query": "什么是向量检索", "mode": "naive"})
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one() for _ in range(calls)))
+    await pool.close()
+    return {
+        "rss_mb": round(rss, 1),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p99_ms": round(_percentile(latencies, 0.99), 2),
+        "pool": pool.stats(),
+    }
+
+
+async def bench_stdio(rag_url, courses, calls, concurrency):
+    def connection(course_id):
+        return {
+            "transport": "stdio",
+            "command": sys.executable,
+            "args": [RAG_TOOLS, "--course-id", course_id, "--rag-url", rag_url],
+            "session_kwargs": {"read_timeout_seconds": timedelta(seconds=60)},
+        }
+
+    pool = MCPSessionPool(connection, max_size=len(courses))
+    return await _run(pool, lambda c: c, courses, calls, concurrency)
+
+
+async def bench_http(rag_url, courses, calls, concurrency):
+    port = _free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            RAG_TOOLS,
+            "--transport",
+            "streamable-http",
+            "--port",
+            str(port),
+            "--rag-url",
+            rag_url,
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                await asyncio.sleep(0.1)
+
+        def connection(_key):
+            return {
+                "transport": "streamable_http",
+                "url": f"http://127.0.0.1:{port}/mcp",
+                "session_kwargs": {"read_timeout_seconds": timedelta(seconds=60)},
+            }
+
+        pool = MCPSessionPool(connection, max_size=1)
+        return await _run(
+            pool, lambda c: SHARED_SESSION_KEY, courses, calls, concurrency
+        )
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--courses", type=int, default=20)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    rag_port = _free_port()
+    rag_server = ThreadingHTTPServer(("127.0.0.1", rag_port), _FakeLightRAG)
+    threading.Thread(target=rag_server.serve_forever, daemon=True).start()
+    rag_url = f"http://127.0.0.1:{rag_port}/api"
+
+    courses = [f"course-{i}" for i in range(args.courses)]
+    results = {
+        "stdio": asyncio.run(
+            bench_stdio(rag_url, courses, args.calls, args.concurrency)
+        ),
+        "http": asyncio.run(
+            bench_http(rag_url, courses, args.calls, args.concurrency)
+        ),
+    }
+    rag_server.shutdown()
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
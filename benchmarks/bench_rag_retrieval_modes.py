@@ -0,0 +1,129 @@
+"""对比 RAG 图的两种检索模式在最坏情况下的耗时与模型调用次数。
+
+- loop：检索 → 评分 → 改写 → 再检索，最多 `max_rewrite` 轮，严格串行
+- multi_query：一次调用生成多个改写，并发检索，RRF 融合后只评分一次
+
+模型和检索工具由脚本内的桩代替，每次调用固定耗时。桩评分器对前几次判定都返回
+“不相关”，让 loop 模式走满全部改写轮次。
+
+用法（在仓库根目录）::
+
+    python benchmarks/bench_rag_retrieval_modes.py --latency 0.3 --retrieval-latency 0.2
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import dotenv  # noqa: E402
+
+dotenv.load_dotenv()
+
+from langchain_core.messages import AIMessage  # noqa: E402
+from langchain_core.tools import StructuredTool  # noqa: E402
+
+from src.agent import rag_agent  # noqa: E402
+from src.agent.models import register_model  # noqa: E402
+
+calls: Counter = Counter()
+
+
+class _FakeModel:
+    """只实现 rag_agent 用到的接口。"""
+
+    def __init__(self, latency: float, tools=None, schema=None, relevant_after: int = 0):
+        self.latency = latency
+        self.tools = tools
+        self.schema = schema
+        self.relevant_after = relevant_after
+
+    def bind_tools(self, tools):
+        return _FakeModel(self.latency, tools=tools)
+
+    def with_structured_output(self, schema):
+        return _FakeModel(self.latency, schema=schema, relevant_after=self.relevant_after)
+
+    async def astream(self, messages, config=None):
+        yield await self.ainvoke(messages, config)
+
+    async def ainvoke(self, messages, config=None):
+        await asyncio.sleep(self.latency)
+        if self.schema is rag_agent.GradeDocuments:
+            calls["grade"] += 1
+            relevant = calls["grade"] > self.relevant_after
+            return self.schema(relevant="yes" if relevant else "no")
+        if self.schema is rag_agent.QueryRewrites:
+            calls["multi_query_rewrite"] += 1
+            return self.schema(queries=[f"改写 {i}" for i in range(3)])
+        if self.tools:
+            calls["tool_choice"] += 1
+            return AIMessage(
+                content="",
+                tool_calls=[{"name": self.tools[0].name, "args": {"query": "q"}, "id": "c0"}],
+            )
+        calls["rewrite_or_answer"] += 1
+        return AIMessage(content="answer")
+
+
+def _fake_rag_tools(latency: float):
+    async def query_rag_tool(query: str, mode: str = "mix", only_need_context: bool = False) -> str:
+        """Query the knowledge base."""
+        calls["retrieve"] += 1
+        await asyncio.sleep(latency)
+        return f"关于 {query} 的片段\n\n共享片段"
+
+    tools = [StructuredTool.from_function(coroutine=query_rag_tool)]
+
+    async def get_rag_tools(course_id: str = None):
+        return tools
+
+    return get_rag_tools
+
+
+async def _run(graph, mode: str, max_rewrite: int):
+    calls.clear()
+    start = time.perf_counter()
+    await graph.ainvoke(
+        {
+            "messages": [{"role": "user", "content": "什么是向量检索"}],
+            "max_rewrite": max_rewrite,
+            "rewrite_count": 0,
+        },
+        {
+            "configurable": {
+                "course_id": "bench",
+                "retrieval_mode": mode,
+                "relevance_grader": "llm",
+            }
+        },
+    )
+    return time.perf_counter() - start, dict(calls)
+
+
+async def main(latency: float, retrieval_latency: float, max_rewrite: int):
+    register_model("responder", _FakeModel(latency))
+    register_model("grader", _FakeModel(latency, relevant_after=max_rewrite))
+    rag_agent.get_rag_tools = _fake_rag_tools(retrieval_latency)
+    graph = await rag_agent.make_graph()
+
+    for mode in ("loop", "multi_query"):
+        elapsed, counts = await _run(graph, mode, max_rewrite)
+        llm_calls = sum(v for k, v in counts.items() if k != "retrieve")
+        print(
+            f"{mode:<12} {elapsed:6.2f} s  llm calls={llm_calls:<3} "
+            f"retrievals={counts.get('retrieve', 0):<3} {counts}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.3, help="每次模型调用耗时（秒）")
+    parser.add_argument("--retrieval-latency", type=float, default=0.2, help="每次检索耗时（秒）")
+    parser.add_argument("--max-rewrite", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.latency, args.retrieval_latency, args.max_rewrite))
@@ -0,0 +1,103 @@
+"""知识掌握分析的构建耗时与正确性检查。
+
+为 `--sizes` 个不同规模的班级合成考试统计（`--chapters` 个章节，每章若干知识点的题目级记录，
+每个学生 `--exams` 次考试成绩），测量 `build_mastery` 与单个学生上下文的耗时，并用逐个
+学生的朴素循环核对章节正确率、百分位和趋势。
+
+用法（在仓库根目录）::
+
+    python benchmarks/bench_student_analytics.py --sizes 30 300 3000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np  # noqa: E402
+
+from src.agent.student_analytics import build_mastery  # noqa: E402
+
+
+def _records(size: int, chapters: int, points: int, exams: int, rng: random.Random) -> dict:
+    records = {}
+    for s in range(size):
+        ability = rng.random()
+        questions = []
+        for c in range(chapters):
+            if rng.random() < 0.1:  # 部分学生没有做某些章节
+                continue
+            for q in range(rng.randint(3, 8)):
+                questions.append(
+                    {
+                        "chapterName": f"第{c + 1}章",
+                        "knowledgePoints": f"知识点{c}-{rng.randrange(points)}",
+                        "isCorrect": rng.random() < ability,
+                    }
+                )
+        papers = [
+            {"paperId": p, "averageScore": min(100, 60 * ability + 5 * p + rng.gauss(0, 5))}
+            for p in range(1, rng.randint(1, exams) + 1)
+        ]
+        records[f"s{s}"] = {
+            "code": "0",
+            "data": {"problemQuestionList": questions, "paperStatisticsList": papers},
+        }
+    return records
+
+
+def _check(records: dict, analytics) -> None:
+    """朴素循环计算章节正确率、百分位与趋势，与向量化结果对比。"""
+    for c, chapter in enumerate(analytics.chapters):
+        per_student = {}
+        for sid, payload in records.items():
+            items = [q for q in payload["data"]["problemQuestionList"] if q["chapterName"] == chapter]
+            if items:
+                per_student[sid] = sum(q["isCorrect"] for q in items) / len(items)
+        values = list(per_student.values())
+        for sid, acc in per_student.items():
+            i = analytics.student_ids.index(sid)
+            assert abs(analytics.chapter_accuracy[i, c] - acc) < 1e-9
+            expected = 100 * sum(v < acc for v in values) / max(len(values) - 1, 1)
+            assert abs(analytics.chapter_percentile[i, c] - expected) < 1e-6
+    for i, sid in enumerate(analytics.student_ids):
+        scores = [p["averageScore"] for p in records[sid]["data"]["paperStatisticsList"]]
+        if len(scores) >= 2:
+            assert abs(np.polyfit(range(len(scores)), scores, 1)[0] - analytics.trend[i]) < 1e-6
+        else:
+            assert np.isnan(analytics.trend[i])
+
+
+def main(sizes, chapters, points, exams, check):
+    rng = random.Random(0)
+    for size in sizes:
+        records = _records(size, chapters, points, exams, rng)
+        start = time.perf_counter()
+        analytics = build_mastery(records)
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        for sid in analytics.student_ids:
+            analytics.student_context(sid)
+        per_student = (time.perf_counter() - start) / size
+        line = (
+            f"students={size:<5} tensor={analytics.attempts.shape}  build {build * 1000:8.1f} ms  "
+            f"context {per_student * 1e6:6.1f} us/student"
+        )
+        if check:
+            _check(records, analytics)
+            line += "  check ok"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[30, 300, 3000])
+    parser.add_argument("--chapters", type=int, default=12)
+    parser.add_argument("--points", type=int, default=5, help="每章的知识点数")
+    parser.add_argument("--exams", type=int, default=6, help="每个学生最多的考试次数")
+    parser.add_argument("--no-check", action="store_true", help="跳过与朴素实现的对比")
+    args = parser.parse_args()
+    main(args.sizes, args.chapters, args.points, args.exams, not args.no_check)
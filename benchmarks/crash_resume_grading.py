@@ -0,0 +1,139 @@
+"""扇出批改的崩溃注入与恢复测试。
+
+在子进程中用 SQLite checkpointer 运行批改图，桩评审模型在第 `--crash-after` 次调用时
+直接 ``os._exit`` 模拟进程崩溃；随后在新的子进程中用同一个 thread_id 恢复运行。
+脚本统计两次运行各自批改过的学生：恢复时重新批改的、崩溃前已经批改过的学生数
+应不超过崩溃时正在进行的分支数（``--concurrency``），并且最终每个学生都有结果。
+``tests/unit_tests/test_grading_fanout.py`` 用内存 checkpointer 检查同样的保证，这里换成
+真实的 SQLite 文件和进程崩溃。
+
+用法（在仓库根目录）::
+
+    python benchmarks/crash_resume_grading.py --students 200 --crash-after 250
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import dotenv  # noqa: E402
+
+dotenv.load_dotenv()
+
+from bench_batch_grading import _FakeGrader, _state  # noqa: E402
+
+from src.agent import batch_grading_agent as bga  # noqa: E402
+from src.agent.checkpoint import open_checkpointer  # noqa: E402
+from src.agent.models import register_model  # noqa: E402
+
+THREAD_ID = "crash-resume"
+_calls = 0
+
+
+class _CrashingGrader(_FakeGrader):
+    """每完成一次调用在日志中记一行学生 ID，第 `crash_after` 次调用开始时退出进程。"""
+
+    log_path: str = ""
+    crash_after: int = 0
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        global _calls
+        _calls += 1
+        if self.crash_after and _calls >= self.crash_after:
+            os._exit(17)
+        result = await super()._agenerate(messages, stop, run_manager, **kwargs)
+        student_id = re.search(r"学生\(ID: (\S+?)\)", str(messages[-1].content)).group(1)
+        with open(self.log_path, "a") as f:
+            f.write(student_id + "\n")
+        return result
+
+
+async def _child(args):
+    grader = _CrashingGrader(
+        latency=args.latency, log_path=args.log, crash_after=args.crash_after
+    )
+    register_model("reviewer", grader)
+    register_model("arbitrator", grader)
+    config = {
+        "configurable": {
+            "thread_id": THREAD_ID,
+            "answer_clustering": "off",
+            "grading_concurrency": args.concurrency,
+        },
+    }
+    async with open_checkpointer(f"sqlite:///{args.db}") as saver:
+        graph = bga.build_checkpointed_grading_workflow(saver)
+        inputs = None if args.resume else _state(args.students)
+        state = await graph.ainvoke(inputs, config)
+    print(json.dumps({"results": len(state["final_grading_results"])}))
+
+
+def _graded(log: str) -> set:
+    if not os.path.exists(log):
+        return set()
+    with open(log) as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def main(args):
+    workdir = tempfile.mkdtemp(prefix="crash-resume-")
+    db = os.path.join(workdir, "checkpoints.sqlite")
+    logs = [os.path.join(workdir, "run.log"), os.path.join(workdir, "resume.log")]
+    base = [
+        sys.executable, __file__, "--child",
+        "--db", db,
+        "--students", str(args.students),
+        "--latency", str(args.latency),
+        "--concurrency", str(args.concurrency),
+    ]
+
+    first = subprocess.run(
+        base + ["--log", logs[0], "--crash-after", str(args.crash_after)],
+        capture_output=True, text=True,
+    )
+    print(f"run:    exit code {first.returncode}, students graded {len(_graded(logs[0]))}")
+    if first.returncode != 17:
+        sys.exit(f"首次运行没有在注入点崩溃:\n{first.stderr}")
+    second = subprocess.run(
+        base + ["--log", logs[1], "--resume"], capture_output=True, text=True
+    )
+    if second.returncode != 0:
+        sys.exit(f"恢复运行失败:\n{second.stderr}")
+    results = json.loads(second.stdout.strip().splitlines()[-1])["results"]
+    before, after = _graded(logs[0]), _graded(logs[1])
+    recomputed = before & after
+    print(f"resume: students graded {len(after)}, final results {results}/{args.students}")
+    print(f"recomputed after crash: {len(recomputed)} (in-flight bound {args.concurrency})")
+    print(f"students never graded: {args.students - len(before | after)}")
+    ok = (
+        first.returncode == 17
+        and results == args.students
+        and len(before | after) == args.students
+        and len(recomputed) <= args.concurrency
+    )
+    print("PASS" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--crash-after", type=int, default=250, help="第几次模型调用时崩溃")
+    parser.add_argument("--latency", type=float, default=0.02, help="每次模型调用耗时（秒）")
+    parser.add_argument("--concurrency", type=int, default=16, help="同时批改的学生数")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--resume", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    parser.add_argument("--log", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        asyncio.run(_child(args))
+    else:
+        main(args)
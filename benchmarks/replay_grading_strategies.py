@@ -0,0 +1,102 @@
+"""在同一批答案上回放 dual（两位初评员）与 cascade（级联）两种批改策略并对比。
+
+输出 cascade 跳过第二位初评员的比例、两种策略的模型调用数，以及最终分数的一致率
+（分差不超过 `--tolerance` 视为一致）和平均分差。
+
+数据集为 JSON 列表，每项与批量批改图的输入相同::
+
+    [{"question": {...}, "student_answers": [{"student_id": "...", "answer": "..."}]}]
+
+默认使用配置好的真实模型；`--fake` 用基准脚本中的桩评审模型和合成数据。
+
+用法（在仓库根目录）::
+
+    python benchmarks/replay_grading_strategies.py --dataset data/grading_replay.json
+    python benchmarks/replay_grading_strategies.py --fake --students 300
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import dotenv  # noqa: E402
+
+dotenv.load_dotenv()
+
+from src.agent import batch_grading_agent as bga  # noqa: E402
+from src.agent.models import register_model  # noqa: E402
+
+
+async def _grade(item: dict, strategy: str, extra: dict):
+    config = {"configurable": {"grading_strategy": strategy, **extra}}
+    state = dict(item)
+    state.update(await bga.initial_review_node(state, config))
+    state.update(await bga.arbitration_node(state, config))
+    state.update(bga.calculate_final_scores_node(state, config))
+    calls = sum(len(reviews) for reviews in state["review_results"].values())
+    scores = {r.student_id: r.final_score for r in state["final_grading_results"]}
+    return scores, calls, state["grading_stats"]
+
+
+async def main(dataset: list, tolerance: float, extra: dict):
+    totals = {"answers": 0, "agree": 0, "abs_diff": 0.0, "skipped": 0, "graded": 0}
+    calls = {"dual": 0, "cascade": 0}
+    for item in dataset:
+        dual, dual_calls, _ = await _grade(item, "dual", extra)
+        cascade, cascade_calls, stats = await _grade(item, "cascade", extra)
+        calls["dual"] += dual_calls
+        calls["cascade"] += cascade_calls
+        totals["skipped"] += stats["second_reviews_skipped"]
+        totals["graded"] += stats["graded_answers"]
+        for student_id, score in dual.items():
+            if student_id not in cascade:
+                continue
+            diff = abs(score - cascade[student_id])
+            totals["answers"] += 1
+            totals["abs_diff"] += diff
+            totals["agree"] += diff <= tolerance
+
+    answers = totals["answers"] or 1
+    print(f"questions={len(dataset)} answers compared={totals['answers']}")
+    print(f"second reviews skipped: {totals['skipped']}/{totals['graded']} "
+          f"({totals['skipped'] / (totals['graded'] or 1):.1%})")
+    print(f"model calls: dual={calls['dual']} cascade={calls['cascade']} "
+          f"({1 - calls['cascade'] / (calls['dual'] or 1):.1%} fewer)")
+    print(f"agreement (|diff| <= {tolerance}): {totals['agree'] / answers:.1%}  "
+          f"mean |diff|={totals['abs_diff'] / answers:.3f}")
+
+
+def _fake_dataset(students: int) -> list:
+    from bench_batch_grading import _FakeGrader, _state
+
+    register_model("reviewer", _FakeGrader(latency=0.0))
+    register_model("arbitrator", _FakeGrader(latency=0.0))
+    return [_state(students)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dataset", help="回放数据集（JSON）")
+    parser.add_argument("--fake", action="store_true", help="使用桩模型和合成数据")
+    parser.add_argument("--students", type=int, default=300, help="--fake 时的学生数")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--threshold", type=float, default=0.8, help="级联的把握阈值")
+    parser.add_argument("--band", type=float, nargs=2, default=[0.3, 0.7], help="模糊分数区间")
+    args = parser.parse_args()
+    if args.fake:
+        data = _fake_dataset(args.students)
+    elif args.dataset:
+        with open(args.dataset, encoding="utf-8") as f:
+            data = json.load(f)
+    else:
+        parser.error("需要 --dataset 或 --fake")
+    overrides = {
+        "cascade_confidence_threshold": args.threshold,
+        "cascade_ambiguous_band": args.band,
+        "answer_clustering": "off",
+    }
+    asyncio.run(main(data, args.tolerance, overrides))
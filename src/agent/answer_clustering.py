@@ -0,0 +1,119 @@
+"""批改前的答案去重与聚类。
+
+同一个班级里常有大量完全相同或几乎相同的答案（尤其是简答题）。批改前先把答案
+规范化（全角转半角、去掉空白差异和标点），按内容哈希把完全相同的答案分为一组；
+可选地再用本地句向量模型把相似度不低于阈值的答案并入同一组。每组只批改代表答案，
+结果再分发给组内每个学生。
+"""
+
+import asyncio
+import functools
+import hashlib
+import os
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+DEFAULT_MODEL = "BAAI/bge-small-zh-v1.5"
+
+
+def normalize_answer(text: str) -> str:
+    """规范化答案：NFKC（全角转半角）、小写、去掉标点、合并空白。
+
+    紧跟数字之前的标点（如 ``1.5`` 中的小数点、``-3`` 中的负号）保留，避免不同的
+    数值被当成同一个答案。
+    """
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    chars = []
+    for i, ch in enumerate(text):
+        if unicodedata.category(ch).startswith("P"):
+            following = text[i + 1] if i + 1 < len(text) else ""
+            if not following.isdigit():
+                chars.append(" ")
+                continue
+        chars.append(ch)
+    return re.sub(r"\s+", " ", "".join(chars)).strip()
+
+
+def answer_fingerprint(text: str) -> str:
+    return hashlib.sha1(normalize_answer(text).encode()).hexdigest()
+
+
+@dataclass
+class AnswerCluster:
+    """一组等价的答案，`members` 为组内全部学生 id（包括代表答案的学生）。"""
+
+    representative_id: str
+    answer: str
+    members: List[str] = field(default_factory=list)
+
+
+def cluster_exact(answers: Sequence) -> List[AnswerCluster]:
+    """按规范化后的内容哈希分组，组内第一个答案作为代表，保持原有顺序。"""
+    clusters: Dict[str, AnswerCluster] = {}
+    for answer in answers:
+        key = answer_fingerprint(answer.answer)
+        cluster = clusters.get(key)
+        if cluster is None:
+            cluster = clusters[key] = AnswerCluster(answer.student_id, answer.answer)
+        cluster.members.append(answer.student_id)
+    return list(clusters.values())
+
+
+@functools.cache
+def get_encoder(model_name: str):
+    """进程共享的句向量模型，首次调用时加载（较慢，宜在线程中调用）。"""
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(model_name)
+
+
+def merge_similar(
+    clusters: List[AnswerCluster], embeddings: np.ndarray, threshold: float
+) -> List[AnswerCluster]:
+    """贪心合并：依次把每个组并入第一个与其代表答案余弦相似度不低于阈值的已有组。
+
+    `embeddings` 为各组代表答案的单位向量，行顺序与 `clusters` 一致。
+    """
+    merged: List[AnswerCluster] = []
+    leaders: List[int] = []
+    for i, cluster in enumerate(clusters):
+        if leaders:
+            similarities = embeddings[leaders] @ embeddings[i]
+            best = int(np.argmax(similarities))
+            if similarities[best] >= threshold:
+                merged[best].members.extend(cluster.members)
+                continue
+        leaders.append(i)
+        merged.append(cluster)
+    return merged
+
+
+async def cluster_answers(
+    answers: Sequence,
+    near_duplicates: bool = False,
+    threshold: float = 0.97,
+    model_name: str = None,
+) -> List[AnswerCluster]:
+    """对 `StudentAnswer` 列表去重聚类。
+
+    Args:
+        answers: 带 `student_id` 和 `answer` 字段的学生答案
+        near_duplicates: 是否用句向量合并近似重复的答案
+        threshold: 近似重复的余弦相似度阈值
+        model_name: 句向量模型，默认取 ``ANSWER_CLUSTER_MODEL``
+    """
+    clusters = cluster_exact(answers)
+    if not near_duplicates or len(clusters) < 2:
+        return clusters
+    model_name = model_name or os.getenv("ANSWER_CLUSTER_MODEL", DEFAULT_MODEL)
+    encoder = await asyncio.to_thread(get_encoder, model_name)
+    embeddings = await asyncio.to_thread(
+        encoder.encode,
+        [normalize_answer(c.answer) for c in clusters],
+        normalize_embeddings=True,
+    )
+    return merge_similar(clusters, np.asarray(embeddings, dtype=np.float32), threshold)
@@ -1,24 +1,74 @@
 import asyncio
-from asyncio.log import logger
+import contextlib
+import functools
+import itertools
+import json
 import os
+import time
+import weakref
+from asyncio.log import logger
+from dataclasses import dataclass
 from threading import local
-from typing import Dict, List, TypedDict
+from typing import (
+    Annotated,
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TypedDict,
+    TypeVar,
+    Union,
+)
 
-from langchain.chat_models import init_chat_model
 from langchain_core.output_parsers import JsonOutputParser
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph import END, StateGraph
+from langgraph.graph.graph import CompiledGraph
 from langgraph.prebuilt import create_react_agent
+from langgraph.types import RetryPolicy, Send
+from src.agent.answer_clustering import cluster_answers
+from src.agent.exam_status_client import get_exam_status_client
+from src.agent.grading_report import group_analyses, score_statistics, summarize_errors
+from src.agent.models import get_model
+from src.agent.objective_grading import MultipleChoiceScoring, grade_choice, is_objective
+from src.agent.plagiarism import OverlapCluster, detect_overlaps
+from src.agent.streaming import emit_progress
+from src.agent.student_analytics import get_course_mastery
 from src.agent.tools import get_stu_exam_status, search, rag_tool
 from pydantic import BaseModel, Field
+from pydantic.json_schema import SkipJsonSchema
 
 # --- 1. 常量与配置 ---
 SCORE_DIFFERENCE_THRESHOLD = 0.2  # 分数差异阈值，超过此值则需要仲裁
 
+T = TypeVar("T")
+
 # --- 2. Pydantic 模型定义 ---
 
 
 class ConfigSchema(TypedDict):
     course_id: str
+    grading_concurrency: int
+    answer_clustering: str  # "exact"（默认）、"near" 或 "off"
+    answer_similarity_threshold: float
+    grading_strategy: str  # "dual"（默认，两位初评员）或 "cascade"（先一位，把握不足时再请第二位）
+    cascade_confidence_threshold: float
+    cascade_ambiguous_band: List[float]
+    grading_batch_size: int  # 大于 1 时每次调用最多批改这么多份答案
+    grading_batch_token_budget: int  # 单次批量调用的 token 预算（输入 + 输出估算）
+    explain_objective: bool  # 为 true 时客观题也交给模型批改并给出讲解
+    multiple_choice_scoring: str  # all_or_nothing / fixed（默认）/ proportional
+    multiple_choice_partial_score: float  # fixed 时少选的得分，默认 0.5
+    stream_results: bool  # 为 true 时即使设置了 grading_batch_size 也逐个学生批改并发送 student_graded 事件
+    prefetch_exam_status: bool  # 批改前是否预取学生考试统计，默认取 EXAM_STATUS_PREFETCH（true）
+    report_clustering: str  # 报告中失分评语的聚类方式："exact"（默认）或 "near"
+    report_chunk_tokens: int  # 报告分层归纳时每块的 token 预算，默认 6000
+    plagiarism_detection: bool  # 是否检测雷同答案，默认取 PLAGIARISM_DETECTION（true）
+    plagiarism_threshold: float  # 雷同答案的 Jaccard 相似度阈值，默认 0.8
 
 
 class Option(BaseModel):
@@ -53,6 +103,13 @@ class SingleGradingResult(BaseModel):
     analysis: str
     errors: List[DetectedError]
     reviewer: str  # 标记是哪个评审员（'reviewer_A', 'reviewer_B', 'arbitrator')
+    confidence: Optional[float] = Field(default=None, description="评审员对评分的把握程度，0~1")
+
+
+class BatchReviewResults(BaseModel):
+    results: List[SingleGradingResult] = Field(
+        description="每位学生一条批改结果，student_id 与输入中的学生 ID 一一对应"
+    )
 
 
 class FinalGradingResult(BaseModel):
@@ -66,54 +123,76 @@ class AggregatedReport(BaseModel):
     common_error_patterns: List[str]
     overall_performance_summary: str
     teaching_suggestions: List[str]
+    # 本地检测出的雷同答案组，不出现在给模型的 JSON Schema 中
+    suspicious_overlaps: SkipJsonSchema[List[OverlapCluster]] = Field(default_factory=list)
 
 
 # --- 3. LangGraph 状态定义 ---
 
 
+@dataclass
+class Replace:
+    """写入按学生合并的状态键时整体替换旧值，而不是与之合并。"""
+
+    value: Dict[str, Any]
+
+
+def merge_by_student(left: Dict[str, T], right: Union[Dict[str, T], Replace]) -> Dict[str, T]:
+    """按 student_id 合并，同一学生以后写入的为准（重试、恢复时重复写入不会产生重复项）。
+
+    已有的值不再校验，每次写入只复制一次字典；写入 `Replace` 时丢弃旧值。
+    """
+    if isinstance(right, Replace):
+        return dict(right.value)
+    return {**(left or {}), **(right or {})}
+
+
+def reset_results(review_results: Optional[Dict[str, List[SingleGradingResult]]] = None) -> Dict:
+    """每条批改流程的第一个节点写入：清掉同一线程上一次运行留下的评审结果和最终结果。"""
+    return {"review_results": Replace(review_results or {}), "graded_results": Replace({})}
+
+
 class BatchGradingState(TypedDict):
     question: Question
     student_answers: List[StudentAnswer]
+    # 答案去重聚类：代表答案的 student_id -> 组内全部学生 id
+    answer_clusters: Dict[str, List[str]]
     # 中间状态，存储所有评审结果
-    review_results: Dict[str, List[SingleGradingResult]]  # key: student_id
+    review_results: Annotated[
+        Dict[str, List[SingleGradingResult]], merge_by_student
+    ]  # key: 代表答案的 student_id
+    # 扇出批改时各学生分支写入的最终结果，key: student_id
+    graded_results: Annotated[Dict[str, FinalGradingResult], merge_by_student]
     # 最终计分结果
     final_grading_results: List[FinalGradingResult]
     final_report: AggregatedReport
+    # 本地计算的分数统计：均值、中位数、直方图、分数段、仲裁比例等
+    score_statistics: Dict[str, object]
+    # 去重节省的模型调用数等统计
+    grading_stats: Dict[str, int]
+    # 扇出批改开始的时间戳（time.time()），用于计算 student_graded 事件中的耗时
+    grading_started_at: float
+
+
+class StudentGradingTask(TypedDict):
+    """扇出批改时发给单个学生分支的输入。"""
+
+    question: Question
+    student_answer: StudentAnswer
+    members: List[str]  # 与该代表答案同组的全部学生 id
+    total: int  # 本次批改的学生总数
+    started_at: float
 
 
 # --- 4. LLM 定义 ---
 
-# 初评员LLM
-reviewer_llm = init_chat_model(
-    model="qwen-plus",
-    model_provider="openai",
-    temperature=0.2,  # 稍微增加一点多样性
-    extra_body={"enable_thinking": False},
-    api_key=os.getenv("DASH_SCOPE_API_KEY", ""),
-    base_url=os.getenv(
-        "DASH_SCOPE_API_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1"
-    ),
-)
+# 初评员使用 models 中的 reviewer 角色，仲裁员使用更强的 arbitrator 角色
 
-# 仲裁员LLM (更强的模型)
-arbitrator_llm = init_chat_model(
-    model="qwen-max",
-    model_provider="openai",
-    temperature=0.0,  # 追求最准确的结果
-    extra_body={"enable_thinking": False},
-    api_key=os.getenv("DASH_SCOPE_API_KEY", ""),
-    base_url=os.getenv(
-        "DASH_SCOPE_API_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1"
-    ),
-)
 
 # --- 5. 核心实现 ---
 
 
-async def grade_answer(
-    question: Question, student_answer: StudentAnswer, reviewer_id: str, llm, config
-) -> SingleGradingResult:
-    prompt = f"""你是一位严谨、细致、公正的AI助教（角色：{reviewer_id}）。你的任务是根据提供的标准答案和解析，对学生的回答进行自动化批改和分析。
+GRADER_PROMPT = """你是一位严谨、细致、公正的AI助教（角色：{reviewer_id}）。你的任务是根据提供的标准答案和解析，对学生的回答进行自动化批改和分析。
 
 **批改任务:**
 1.  **判断对错**: 确定学生的回答是否完全正确。
@@ -121,6 +200,7 @@ async def grade_answer(
 3.  **错误定位**: 如果回答不完全正确，请精确、具体地指出每一个错误点。
 4.  **提供建议**: 针对每一个错误点，给出清晰、有建设性的修正建议。
 5.  **总体评价**: 给出一段综合性的评价。
+6.  **评估把握**: 在 confidence 字段给出你对本次评分的把握程度（0~1），答案含糊或难以判断时给出较低的值。
 
 **使用工具:**
 - **get_stu_exam_status**: 获取学生的考试历史数据，帮助你更好地理解学生的知识点掌握情况。
@@ -129,9 +209,83 @@ async def grade_answer(
 
 **输出要求:** 必须严格按照以下JSON格式进行响应。
 ```json
-{SingleGradingResult.model_json_schema()}
+{schema}
 ```"""
 
+BATCH_GRADER_PROMPT = """你是一位严谨、细致、公正的AI助教（角色：{reviewer_id}）。下面给出一道题目和多位学生的回答，请根据提供的标准答案和解析，逐一独立地批改每位学生的回答。
+
+**批改任务（每位学生分别完成）:**
+1.  **判断对错**: 确定学生的回答是否完全正确。
+2.  **给出分数**: 基于回答的正确性、完整性，给出一个在 [0.0, 1.0] 区间内的浮点数分数。
+3.  **错误定位**: 如果回答不完全正确，请精确、具体地指出每一个错误点。
+4.  **提供建议**: 针对每一个错误点，给出清晰、有建设性的修正建议。
+5.  **总体评价**: 给出一段综合性的评价。
+6.  **评估把握**: 在 confidence 字段给出你对本次评分的把握程度（0~1），答案含糊或难以判断时给出较低的值。
+
+**输出要求:** 在 results 中为每位学生各返回一条结果，student_id 必须与输入中的学生 ID 完全一致，不要遗漏、合并或编造学生。reviewer 字段填写 {reviewer_id}。"""
+
+# 批量模式下估算每位学生的结果占用的输出 token 数
+OUTPUT_TOKENS_PER_RESULT = 300
+
+# schema 只序列化一次，各评审员的系统提示在首次使用时生成
+_RESULT_SCHEMA = SingleGradingResult.model_json_schema()
+
+# 评审员对应的模型角色
+REVIEWER_ROLES = {"reviewer_A": "reviewer", "reviewer_B": "reviewer", "arbitrator": "arbitrator"}
+
+_grading_agents: Dict[tuple, CompiledGraph] = {}
+
+
+def get_grading_agent(reviewer_id: str, config=None) -> CompiledGraph:
+    """返回评审员的 ReAct 代理，同一评审员和模型在进程内只构建一次。"""
+    llm = get_model(REVIEWER_ROLES[reviewer_id], config)
+    key = (reviewer_id, id(llm))
+    agent = _grading_agents.get(key)
+    if agent is None:
+        prompt = GRADER_PROMPT.format(reviewer_id=reviewer_id, schema=_RESULT_SCHEMA)
+        agent = _grading_agents.setdefault(
+            key,
+            create_react_agent(
+                model=llm, prompt=prompt, tools=[search, get_stu_exam_status, rag_tool]
+            ),
+        )
+    return agent
+
+
+def grading_concurrency(config) -> int:
+    """同时进行的批改调用数：`configurable.grading_concurrency`，默认取环境变量。"""
+    configured = (config or {}).get("configurable", {}).get("grading_concurrency")
+    return max(1, int(configured or os.getenv("GRADING_CONCURRENCY", 16)))
+
+
+async def run_bounded(
+    jobs: Iterable[Callable[[], Awaitable[T]]],
+    concurrency: int,
+) -> List[T]:
+    """用固定数量的 worker 依次执行 `jobs`，返回成功的结果，失败的只记录日志。
+
+    与一次性 gather 全部协程不同，同一时刻只有 `concurrency` 个任务在运行，
+    内存占用不随待批改的答案数增长。
+    """
+    iterator = iter(jobs)
+    results: List[T] = []
+
+    async def worker():
+        for job in iterator:
+            try:
+                result = await job()
+            except Exception as e:
+                logger.error(f"批改任务失败: {e}")
+                continue
+            results.append(result)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results
+
+
+async def grade_answer(
+    question: Question, student_answer: StudentAnswer, reviewer_id: str, config
+) -> SingleGradingResult:
     quest = f"""
 
 **题目信息:**
@@ -145,12 +299,7 @@ async def grade_answer(
 ---
 
 """
-    grading_agent = create_react_agent(
-        model=llm, prompt=prompt, tools=[search, get_stu_exam_status, rag_tool]
-    )
-
-    # structured_llm = llm.with_structured_output(SingleGradingResult)
-    # result = await structured_llm.ainvoke(prompt)
+    grading_agent = get_grading_agent(reviewer_id, config)
     raw_result = await grading_agent.ainvoke({"messages": [("user", quest)]}, config)
     json_parser = JsonOutputParser()
 
@@ -175,18 +324,187 @@ async def grade_answer(
     return result
 
 
+def _estimate_tokens(text: str) -> int:
+    # 中文约 1~2 个字符一个 token，按 2 个字符估算
+    return len(text) // 2 + 1
+
+
+def grading_batch_size(config) -> int:
+    configured = (config or {}).get("configurable", {}).get("grading_batch_size")
+    return max(1, int(configured or os.getenv("GRADING_BATCH_SIZE", 1)))
+
+
+def pack_batches(
+    answers: List[StudentAnswer], prefix: str, max_size: int, token_budget: int
+) -> Iterator[List[StudentAnswer]]:
+    """按 token 预算把答案分批：每批不超过 `max_size` 份，估算的输入输出总量不超过预算。"""
+    available = token_budget - _estimate_tokens(prefix)
+    batch: List[StudentAnswer] = []
+    used = 0
+    for answer in answers:
+        cost = _estimate_tokens(answer.answer) + OUTPUT_TOKENS_PER_RESULT
+        if batch and (len(batch) >= max_size or used + cost > available):
+            yield batch
+            batch, used = [], 0
+        batch.append(answer)
+        used += cost
+    if batch:
+        yield batch
+
+
+async def grade_batch(
+    question: Question, answers: List[StudentAnswer], reviewer_id: str, config
+) -> List[SingleGradingResult]:
+    """一次调用批改多份答案；缺失或无效的结果逐份重新批改。"""
+    answer_blocks = "\n\n".join(
+        f"**学生(ID: {sa.student_id})的回答:**\n---\n{sa.answer}\n---" for sa in answers
+    )
+    quest = f"""**题目信息:**
+- **题干**: {question.questionText}
+- **标准答案**: {question.correctAnswer}
+- **答案解析**: {question.answerExplanation}
+
+{answer_blocks}
+"""
+    structured_llm = get_model(REVIEWER_ROLES[reviewer_id], config).with_structured_output(
+        BatchReviewResults
+    )
+    expected = {sa.student_id for sa in answers}
+    graded: Dict[str, SingleGradingResult] = {}
+    try:
+        response = await structured_llm.ainvoke(
+            [("system", BATCH_GRADER_PROMPT.format(reviewer_id=reviewer_id)), ("user", quest)],
+            config,
+        )
+        for result in response.results:
+            if result.student_id in expected and 0.0 <= result.score <= 1.0:
+                result.reviewer = reviewer_id
+                graded.setdefault(result.student_id, result)
+    except Exception as e:
+        logger.error(f"批量批改失败，改为逐份批改: {e}")
+
+    missing = [sa for sa in answers if sa.student_id not in graded]
+    if missing:
+        logger.warning(f"批量批改缺少 {len(missing)} 份有效结果，逐份重新批改")
+        regraded = await asyncio.gather(
+            *(grade_answer(question, sa, reviewer_id, config) for sa in missing)
+        )
+        graded.update((r.student_id, r) for r in regraded)
+    return [graded[sa.student_id] for sa in answers]
+
+
+def review_jobs(
+    question: Question, answers: List[StudentAnswer], reviewer_id: str, config
+) -> Iterator[Callable[[], Awaitable[List[SingleGradingResult]]]]:
+    """生成某位评审员批改 `answers` 的任务，每个任务返回一组批改结果。"""
+    batch_size = grading_batch_size(config)
+    if batch_size == 1:
+        for answer in answers:
+            yield functools.partial(_grade_one, question, answer, reviewer_id, config)
+        return
+    token_budget = int(
+        (config or {}).get("configurable", {}).get("grading_batch_token_budget")
+        or os.getenv("GRADING_BATCH_TOKEN_BUDGET", 8000)
+    )
+    prefix = "".join(
+        (BATCH_GRADER_PROMPT, question.questionText, question.correctAnswer, question.answerExplanation)
+    )
+    for batch in pack_batches(answers, prefix, batch_size, token_budget):
+        yield functools.partial(grade_batch, question, batch, reviewer_id, config)
+
+
+async def _grade_one(question, answer, reviewer_id, config) -> List[SingleGradingResult]:
+    return [await grade_answer(question, answer, reviewer_id, config)]
+
+
+async def review_all(
+    question: Question, answers: List[StudentAnswer], reviewer_ids, config
+) -> List[SingleGradingResult]:
+    """所有评审员的批改任务共用一个有界 worker 池。"""
+    jobs = itertools.chain.from_iterable(
+        review_jobs(question, answers, reviewer_id, config) for reviewer_id in reviewer_ids
+    )
+    batches = await run_bounded(jobs, grading_concurrency(config))
+    return [result for batch in batches for result in batch]
+
+
+async def group_answers(student_answers: List[StudentAnswer], config) -> Dict[str, List[str]]:
+    """按 `configurable.answer_clustering` 对答案去重聚类，返回代表 id -> 组员 id。"""
+    configurable = (config or {}).get("configurable", {})
+    mode = configurable.get("answer_clustering") or os.getenv("ANSWER_CLUSTERING", "exact")
+    if mode == "off":
+        return {sa.student_id: [sa.student_id] for sa in student_answers}
+    threshold = configurable.get("answer_similarity_threshold") or float(
+        os.getenv("ANSWER_CLUSTER_THRESHOLD", 0.97)
+    )
+    clusters = await cluster_answers(
+        student_answers, near_duplicates=mode == "near", threshold=threshold
+    )
+    return {c.representative_id: c.members for c in clusters}
+
+
+def _exam_status_target(config):
+    """返回 (course_id, authorization)；未配置课程或关闭了考试统计预取时返回 None。"""
+    configurable = (config or {}).get("configurable", {})
+    enabled = configurable.get("prefetch_exam_status")
+    if enabled is None:
+        enabled = os.getenv("EXAM_STATUS_PREFETCH", "true").lower() in ("1", "true", "yes")
+    course_id = configurable.get("course_id")
+    if not enabled or not course_id:
+        return None
+    user_info = configurable.get("langgraph_auth_user") or {}
+    return course_id, user_info.get("authorization")
+
+
+async def prefetch_exam_status(student_answers: List[StudentAnswer], config) -> None:
+    """批改前并发加载这些学生的考试统计，评审员调用 get_stu_exam_status 时直接命中缓存。"""
+    target = _exam_status_target(config)
+    if target is None or not student_answers:
+        return
+    loaded = await get_exam_status_client().prefetch(
+        [sa.student_id for sa in student_answers],
+        *target,
+        concurrency=grading_concurrency(config),
+        roster=True,
+    )
+    logger.info(f"已预取 {loaded}/{len(student_answers)} 名学生的考试统计")
+
+
+def grading_strategy(config) -> str:
+    configurable = (config or {}).get("configurable", {})
+    return configurable.get("grading_strategy") or os.getenv("GRADING_STRATEGY", "dual")
+
+
+def needs_second_review(result: SingleGradingResult, config) -> bool:
+    """级联模式下，第一位初评员把握不足或分数落在模糊区间时需要第二位初评员。"""
+    configurable = (config or {}).get("configurable", {})
+    threshold = configurable.get("cascade_confidence_threshold", 0.8)
+    low, high = configurable.get("cascade_ambiguous_band") or (0.3, 0.7)
+    confidence = result.confidence if result.confidence is not None else 0.0
+    return confidence < threshold or low <= result.score <= high
+
+
 async def initial_review_node(state: BatchGradingState, config) -> Dict:
     question = Question.model_validate(state["question"])
     student_answers = [
         StudentAnswer.model_validate(sa) for sa in state["student_answers"]
     ]
-    tasks = []
-    for answer in student_answers:
-        # 每个学生答案都由两位初评员并行批改
-        tasks.append(grade_answer(question, answer, "reviewer_A", reviewer_llm, config))
-        tasks.append(grade_answer(question, answer, "reviewer_B", reviewer_llm, config))
-
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+    answer_clusters = await group_answers(student_answers, config)
+    representatives = [sa for sa in student_answers if sa.student_id in answer_clusters]
+    logger.info(f"{len(student_answers)} 份答案去重后需批改 {len(representatives)} 份")
+    if grading_batch_size(config) == 1:  # 批量批改不使用工具
+        await prefetch_exam_status(student_answers, config)
+    cascade = grading_strategy(config) == "cascade"
+    # 每个代表答案都由两位初评员批改（级联模式先只请 reviewer_A），按并发上限分批执行
+    reviewers = ("reviewer_A",) if cascade else ("reviewer_A", "reviewer_B")
+    results = await review_all(question, representatives, reviewers, config)
+    if cascade:
+        answers_by_id = {sa.student_id: sa for sa in representatives}
+        uncertain = [
+            answers_by_id[res.student_id] for res in results if needs_second_review(res, config)
+        ]
+        logger.info(f"级联批改：{len(results) - len(uncertain)} 份答案跳过第二位初评员")
+        results += await review_all(question, uncertain, ("reviewer_B",), config)
 
     review_results: Dict[str, List[SingleGradingResult]] = {}
     for res in results:
@@ -195,7 +513,7 @@ async def initial_review_node(state: BatchGradingState, config) -> Dict:
                 review_results[res.student_id] = []
             review_results[res.student_id].append(res)
 
-    return {"review_results": review_results}
+    return {**reset_results(review_results), "answer_clusters": answer_clusters}
 
 
 async def arbitration_node(state: BatchGradingState, config) -> Dict:
@@ -206,27 +524,19 @@ async def arbitration_node(state: BatchGradingState, config) -> Dict:
     review_results = state["review_results"]
     student_answers_map = {sa.student_id: sa for sa in student_answers}
 
-    tasks = []
+    disputed = []
     for student_id, reviews in review_results.items():
         if len(reviews) == 2:
             score_a = reviews[0].score
             score_b = reviews[1].score
             if abs(score_a - score_b) >= SCORE_DIFFERENCE_THRESHOLD:
                 # 如果分数差异大，则提交给仲裁员
-                tasks.append(
-                    grade_answer(
-                        question,
-                        student_answers_map[student_id],
-                        "arbitrator",
-                        arbitrator_llm,
-                        config,
-                    )
-                )
-
-    if not tasks:
+                disputed.append(student_answers_map[student_id])
+
+    if not disputed:
         return {}
 
-    arbitration_results = await asyncio.gather(*tasks, return_exceptions=True)
+    arbitration_results = await review_all(question, disputed, ("arbitrator",), config)
 
     for res in arbitration_results:
         if isinstance(res, SingleGradingResult):
@@ -235,92 +545,432 @@ async def arbitration_node(state: BatchGradingState, config) -> Dict:
     return {"review_results": review_results}
 
 
-def calculate_final_scores_node(state: BatchGradingState) -> Dict:
-    review_results = state["review_results"]
-    final_results = []
+def route_grading(state: BatchGradingState, config) -> str:
+    """客观题直接按标准答案批改；简答题默认按学生扇出批改，设置了批量批改时走分阶段流程。"""
+    question = Question.model_validate(state["question"])
+    configurable = (config or {}).get("configurable", {})
+    if is_objective(question) and not configurable.get("explain_objective"):
+        return "objective_grading"
+    if grading_batch_size(config) > 1:
+        if not configurable.get("stream_results"):
+            return "initial_review"
+        # 批量批改只能在全部完成后给出结果，与逐个发送结果冲突
+        logger.warning("同时设置了 stream_results 和 grading_batch_size > 1，不使用批量批改")
+    return "plan_review"
+
+
+def objective_grading_node(state: BatchGradingState, config) -> Dict:
+    question = Question.model_validate(state["question"])
+    configurable = (config or {}).get("configurable", {})
+    scoring = MultipleChoiceScoring(configurable.get("multiple_choice_scoring") or "fixed")
+    partial_score = configurable.get("multiple_choice_partial_score", 0.5)
 
-    for student_id, reviews in review_results.items():
-        if len(reviews) == 2:  # 无争议
-            final_score = (reviews[0].score + reviews[1].score) / 2
-            final_analysis = f"综合意见:\n- 评审A: {reviews[0].analysis}\n- 评审B: {reviews[1].analysis}"
-            is_controversial = False
-        elif len(reviews) == 3:  # 有争议，已仲裁
-            is_controversial = True
-            scores = {r.reviewer: r.score for r in reviews}
-            s_a, s_b, s_arb = (
-                scores["reviewer_A"],
-                scores["reviewer_B"],
-                scores["arbitrator"],
+    final_results = []
+    for sa in state["student_answers"]:
+        sa = StudentAnswer.model_validate(sa)
+        score, analysis = grade_choice(question, sa.answer, scoring, partial_score)
+        final_results.append(
+            FinalGradingResult(
+                student_id=sa.student_id,
+                final_score=score,
+                final_analysis=analysis,
+                is_controversial=False,
             )
+        )
 
-            # 取与仲裁分数最接近的两个分数的平均值
-            if abs(s_a - s_arb) < abs(s_b - s_arb):
-                final_score = (s_a + s_arb) / 2
-            else:
-                final_score = (s_b + s_arb) / 2
-
-            # 最终分析以仲裁员为准
-            final_analysis = next(
-                r.analysis for r in reviews if r.reviewer == "arbitrator"
-            )
-        else:  # 数据异常
-            continue
+    grading_stats = {
+        "answers": len(final_results),
+        "graded_answers": len(final_results),
+        "llm_calls_saved": 2 * len(final_results),
+    }
+    return {
+        **reset_results(),
+        "final_grading_results": final_results,
+        "grading_stats": grading_stats,
+    }
+
+
+def combine_reviews(reviews: List[SingleGradingResult], cascade: bool):
+    """根据一份答案的全部评审结果计算 (最终分数, 综合分析, 是否经过仲裁)，数据异常时返回 None。"""
+    if len(reviews) == 1 and cascade:  # 级联模式下第一位初评员把握充分
+        return reviews[0].score, reviews[0].analysis, False
+    if len(reviews) == 2:  # 无争议
+        final_score = (reviews[0].score + reviews[1].score) / 2
+        final_analysis = f"综合意见:\n- 评审A: {reviews[0].analysis}\n- 评审B: {reviews[1].analysis}"
+        return final_score, final_analysis, False
+    if len(reviews) == 3:  # 有争议，已仲裁
+        scores = {r.reviewer: r.score for r in reviews}
+        s_a, s_b, s_arb = (
+            scores["reviewer_A"],
+            scores["reviewer_B"],
+            scores["arbitrator"],
+        )
 
-        final_results.append(
+        # 取与仲裁分数最接近的两个分数的平均值
+        if abs(s_a - s_arb) < abs(s_b - s_arb):
+            final_score = (s_a + s_arb) / 2
+        else:
+            final_score = (s_b + s_arb) / 2
+
+        # 最终分析以仲裁员为准
+        final_analysis = next(r.analysis for r in reviews if r.reviewer == "arbitrator")
+        return final_score, final_analysis, True
+    return None
+
+
+class _FinalScores:
+    """把代表答案的评审结果汇总为组内每个学生的最终结果，并累计统计。"""
+
+    def __init__(self, answer_clusters: Dict[str, List[str]], cascade: bool):
+        self.answer_clusters = answer_clusters
+        self.cascade = cascade
+        self.results: List[FinalGradingResult] = []
+        self.saved_calls = 0
+        self.single_reviews = 0
+
+    def add(self, student_id: str, reviews: List[SingleGradingResult]) -> List[FinalGradingResult]:
+        combined = combine_reviews(reviews, self.cascade)
+        if combined is None:  # 数据异常
+            return []
+        final_score, final_analysis, is_controversial = combined
+        self.single_reviews += len(reviews) == 1
+        # 代表答案的结果分发给组内每个学生
+        members = self.answer_clusters.get(student_id, [student_id])
+        self.saved_calls += len(reviews) * (len(members) - 1)
+        added = [
             FinalGradingResult(
-                student_id=student_id,
+                student_id=member_id,
                 final_score=final_score,
                 final_analysis=final_analysis,
                 is_controversial=is_controversial,
             )
+            for member_id in members
+        ]
+        self.results.extend(added)
+        return added
+
+    def stats(self, answers: int, graded_answers: int) -> Dict[str, int]:
+        logger.info(f"答案去重节省了 {self.saved_calls} 次模型调用")
+        return {
+            "answers": answers,
+            "graded_answers": graded_answers,
+            "llm_calls_saved": self.saved_calls,
+            "second_reviews_skipped": self.single_reviews,
+        }
+
+
+def calculate_final_scores_node(state: BatchGradingState, config) -> Dict:
+    review_results = state["review_results"]
+    final_scores = _FinalScores(
+        state.get("answer_clusters") or {}, grading_strategy(config) == "cascade"
+    )
+    for student_id, reviews in review_results.items():
+        final_scores.add(student_id, reviews)
+
+    grading_stats = final_scores.stats(len(state["student_answers"]), len(review_results))
+    return {"final_grading_results": final_scores.results, "grading_stats": grading_stats}
+
+
+async def review_student(
+    question: Question, answer: StudentAnswer, config, limit: Optional[asyncio.Semaphore] = None
+) -> List[SingleGradingResult]:
+    """单独走完一份答案的初评与仲裁，返回其全部评审结果；给出 `limit` 时每次模型调用占用其一个名额。"""
+
+    async def review(reviewer_id: str) -> SingleGradingResult:
+        async with limit or contextlib.nullcontext():
+            return await grade_answer(question, answer, reviewer_id, config)
+
+    if grading_strategy(config) == "cascade":
+        reviews = [await review("reviewer_A")]
+        if needs_second_review(reviews[0], config):
+            reviews.append(await review("reviewer_B"))
+    else:
+        reviews = list(await asyncio.gather(review("reviewer_A"), review("reviewer_B")))
+    if (
+        len(reviews) == 2
+        and abs(reviews[0].score - reviews[1].score) >= SCORE_DIFFERENCE_THRESHOLD
+    ):
+        reviews.append(await review("arbitrator"))
+    return reviews
+
+
+async def plan_review_node(state: BatchGradingState, config) -> Dict:
+    student_answers = [
+        StudentAnswer.model_validate(sa) for sa in state["student_answers"]
+    ]
+    answer_clusters = await group_answers(student_answers, config)
+    logger.info(f"{len(student_answers)} 份答案去重后需批改 {len(answer_clusters)} 份")
+    # 加载全班而不只是代表答案的学生，掌握情况中的班级百分位才覆盖所有人
+    await prefetch_exam_status(student_answers, config)
+    return {
+        **reset_results(),
+        "answer_clusters": answer_clusters,
+        "grading_started_at": time.time(),
+    }
+
+
+class _RunLimits:
+    """一次运行的学生分支共用的并发限制，与逐个学生批改的其他流程相同：
+    同时批改的学生数和同时进行的模型调用数都不超过 grading_concurrency。"""
+
+    def __init__(self, concurrency: int):
+        self.students = asyncio.Semaphore(concurrency)
+        self.calls = asyncio.Semaphore(concurrency)
+
+
+_run_limits_by_step: "weakref.WeakValueDictionary[tuple, _RunLimits]" = weakref.WeakValueDictionary()
+
+
+def _run_limits(config) -> _RunLimits:
+    """返回本次运行共用的 `_RunLimits`。
+
+    扇出的分支在同一个超步内运行，配置中的 checkpoint_map（该超步的检查点 ID）相同，
+    以此区分不同的运行；所有分支结束后随之释放。
+    """
+    configurable = (config or {}).get("configurable", {})
+    concurrency = grading_concurrency(config)
+    step = configurable.get("checkpoint_map")
+    if not step:
+        return _RunLimits(concurrency)
+    key = (asyncio.get_running_loop(), tuple(sorted(step.items())), concurrency)
+    limits = _run_limits_by_step.get(key)
+    if limits is None:
+        limits = _run_limits_by_step[key] = _RunLimits(concurrency)
+    return limits
+
+
+def dispatch_students(state: BatchGradingState):
+    """为每个代表答案发出一个 grade_student 分支。
+
+    所有分支在同一个超步内运行，配置了 checkpointer 时每个分支完成后其结果立即写入检查点；
+    运行中断后用同一个 thread_id 以 None 为输入恢复，只会重新批改尚未完成的学生。
+    """
+    answer_clusters = state["answer_clusters"]
+    sends = [
+        Send(
+            "grade_student",
+            {
+                "question": state["question"],
+                "student_answer": sa,
+                "members": answer_clusters[sa.student_id],
+                "total": len(state["student_answers"]),
+                "started_at": state["grading_started_at"],
+            },
         )
+        for sa in map(StudentAnswer.model_validate, state["student_answers"])
+        if sa.student_id in answer_clusters
+    ]
+    return sends or "collect_results"
+
+
+async def grade_student_node(task: StudentGradingTask, config) -> Dict:
+    """批改一个学生：初评、必要时仲裁，再计算组内每个学生的最终分数。
+
+    每得到一个学生的最终结果立即通过 custom 流发送 student_graded 事件。
+    """
+    question = Question.model_validate(task["question"])
+    answer = StudentAnswer.model_validate(task["student_answer"])
+    limits = _run_limits(config)
+    async with limits.students:
+        reviews = await review_student(question, answer, config, limits.calls)
+    final_scores = _FinalScores(
+        {answer.student_id: task["members"]}, grading_strategy(config) == "cascade"
+    )
+    added = final_scores.add(answer.student_id, reviews)
+    elapsed = time.time() - task["started_at"]
+    for result in added:
+        emit_progress(
+            "student_graded",
+            result=result.model_dump(),
+            total=task["total"],
+            elapsed_seconds=elapsed,
+        )
+    return {
+        "review_results": {answer.student_id: reviews},
+        "graded_results": {result.student_id: result for result in added},
+    }
+
+
+def collect_results_node(state: BatchGradingState, config) -> Dict:
+    # 最终结果已由各学生分支经 reducer 写入，这里按答案顺序排好并累计统计
+    student_answers = [StudentAnswer.model_validate(sa) for sa in state["student_answers"]]
+    graded = state.get("graded_results") or {}
+    review_results = state.get("review_results") or {}
+    final_scores = _FinalScores(
+        state.get("answer_clusters") or {}, grading_strategy(config) == "cascade"
+    )
+    for student_id, reviews in review_results.items():
+        final_scores.add(student_id, reviews)
+    grading_stats = final_scores.stats(len(student_answers), len(review_results))
+    grading_stats["completion_seconds"] = time.time() - state["grading_started_at"]
+    return {
+        "final_grading_results": [
+            graded[sa.student_id] for sa in student_answers if sa.student_id in graded
+        ],
+        "grading_stats": grading_stats,
+    }
+
+
+def _format_statistics(stats: Dict) -> str:
+    if not stats.get("count"):
+        return "无学生作答"
+    histogram = stats["histogram"]
+    bins = ", ".join(
+        f"{low:.1f}~{high:.1f}: {count}"
+        for low, high, count in zip(histogram["edges"], histogram["edges"][1:], histogram["counts"])
+    )
+    buckets = ", ".join(f"{name} {count} 人" for name, count in stats["buckets"].items())
+    return (
+        f"- 人数: {stats['count']}\n"
+        f"- 平均分: {stats['mean']:.3f}，中位数: {stats['median']:.3f}，标准差: {stats['std']:.3f}\n"
+        f"- 最低分: {stats['min']:.2f}，最高分: {stats['max']:.2f}，满分率: {stats['full_marks_rate']:.1%}\n"
+        f"- 经过仲裁的比例: {stats['controversial_rate']:.1%}\n"
+        f"- 分数段: {buckets}\n"
+        f"- 分数分布: {bins}"
+    )
+
 
-    return {"final_grading_results": final_results}
+async def _class_mastery_text(state: BatchGradingState, config) -> str:
+    """全班历史考试的知识掌握情况（本地计算），没有数据时返回空字符串。"""
+    target = _exam_status_target(config)
+    if target is None:
+        return ""
+    student_ids = [StudentAnswer.model_validate(sa).student_id for sa in state["student_answers"]]
+    try:
+        analytics = await get_course_mastery(*target, student_ids=student_ids)
+    except Exception as e:
+        logger.warning(f"计算班级知识掌握情况失败: {e}")
+        return ""
+    if analytics is None:
+        return ""
+    context = json.dumps(analytics.class_context(), ensure_ascii=False)
+    return f"**全班历史考试的知识掌握情况（已计算好）:**\n{context}\n\n"
 
 
-async def report_generator_node(state: BatchGradingState) -> Dict:
-    final_grading_results = state["final_grading_results"]
+async def _suspicious_overlaps(state: BatchGradingState, config) -> List[OverlapCluster]:
+    """在线程中检测雷同的主观题答案，客观题或关闭检测时返回空列表。"""
     question = Question.model_validate(state["question"])
-    results_summary = [res.model_dump_json() for res in final_grading_results]
+    configurable = (config or {}).get("configurable", {})
+    enabled = configurable.get("plagiarism_detection")
+    if enabled is None:
+        enabled = os.getenv("PLAGIARISM_DETECTION", "true").lower() in ("1", "true", "yes")
+    if not enabled or is_objective(question):
+        return []
+    answers = [StudentAnswer.model_validate(sa) for sa in state.get("student_answers") or []]
+    threshold = float(
+        configurable.get("plagiarism_threshold") or os.getenv("PLAGIARISM_THRESHOLD", 0.8)
+    )
+    return await asyncio.to_thread(
+        detect_overlaps,
+        [(sa.student_id, sa.answer) for sa in answers],
+        threshold=threshold,
+        references=[question.correctAnswer],
+    )
 
-    prompt = f"""你是一位资深的教学分析专家。根据对全班学生针对同一道题的最终批改结果，洞察学情并提供教学建议。
+
+async def report_generator_node(state: BatchGradingState, config) -> Dict:
+    final_grading_results = [
+        FinalGradingResult.model_validate(r) for r in state["final_grading_results"]
+    ]
+    question = Question.model_validate(state["question"])
+    configurable = (config or {}).get("configurable", {})
+
+    # 分数统计在本地计算，模型只负责归纳错误模式和教学建议
+    statistics = score_statistics(final_grading_results)
+    overlaps = asyncio.create_task(_suspicious_overlaps(state, config))
+    try:
+        clustering = configurable.get("report_clustering") or os.getenv(
+            "REPORT_CLUSTERING", "exact"
+        )
+        groups = await group_analyses(final_grading_results, near_duplicates=clustering == "near")
+        error_patterns = await summarize_errors(
+            question.questionText,
+            groups,
+            get_model("summarizer", config),
+            token_budget=int(
+                configurable.get("report_chunk_tokens") or os.getenv("REPORT_CHUNK_TOKENS", 6000)
+            ),
+            concurrency=grading_concurrency(config),
+        )
+        errors_text = "\n".join(error_patterns) or "所有学生均得满分"
+        mastery_text = await _class_mastery_text(state, config)
+
+        prompt = f"""你是一位资深的教学分析专家。根据对全班学生针对同一道题的批改统计和失分情况，洞察学情并提供教学建议。
 
 **分析的题目:** {question.questionText}
 
-**全班学生的最终得分与分析摘要:**
+**全班得分统计（已计算好，请直接引用）:**
+{_format_statistics(statistics)}
+
+{mastery_text}**失分学生的评语或已归纳的错误模式（方括号内为涉及人数）:**
 ---
-{results_summary}
+{errors_text}
 ---
 
 **分析任务:**
-1.  **总结共性错误模式**: 基于学生的最终分析报告，提炼出最普遍的共性错误。
-2.  **总结整体表现**: 计算平均分，并对整体表现进行概括性描述。
+1.  **总结共性错误模式**: 基于以上失分情况，按涉及人数提炼出最普遍的共性错误。
+2.  **总结整体表现**: 依据给出的得分统计，对整体表现进行概括性描述。
 3.  **提出教学建议**: 基于以上分析，为教师提供具体、可操作的教学建议。
 
 **输出要求:** 必须严格按照以下JSON格式进行响应。
 ```json
 {AggregatedReport.model_json_schema()}
 ```"""
-    structured_llm = arbitrator_llm.with_structured_output(AggregatedReport)
-    final_report = await structured_llm.ainvoke(prompt)
-    return {"final_report": final_report}
+        structured_llm = get_model("arbitrator", config).with_structured_output(AggregatedReport)
+        final_report = await structured_llm.ainvoke(prompt)
+        final_report.suspicious_overlaps = await overlaps
+    finally:
+        # 归纳错误模式或生成报告出错时取消雷同检测，不留下无人等待的任务
+        if not overlaps.done():
+            overlaps.cancel()
+        elif not overlaps.cancelled():
+            overlaps.exception()
+    return {"final_report": final_report, "score_statistics": statistics}
 
 
 # --- 6. 构建工作流 ---
 
 
-def build_batch_grading_workflow():
+def _grading_workflow() -> StateGraph:
     workflow = StateGraph(BatchGradingState, ConfigSchema)
 
+    workflow.add_node("objective_grading", objective_grading_node)
+    workflow.add_node("plan_review", plan_review_node)
+    # 单个学生失败时先重试；仍失败则本次运行报错，已完成的学生保留在检查点中
+    workflow.add_node(
+        "grade_student", grade_student_node, retry=RetryPolicy(max_attempts=3)
+    )
+    workflow.add_node("collect_results", collect_results_node)
     workflow.add_node("initial_review", initial_review_node)
     workflow.add_node("arbitration", arbitration_node)
     workflow.add_node("calculate_final_scores", calculate_final_scores_node)
     workflow.add_node("generate_report", report_generator_node)
 
-    workflow.set_entry_point("initial_review")
+    workflow.set_conditional_entry_point(
+        route_grading, ["objective_grading", "plan_review", "initial_review"]
+    )
+    workflow.add_edge("objective_grading", "generate_report")
+    workflow.add_conditional_edges(
+        "plan_review", dispatch_students, ["grade_student", "collect_results"]
+    )
+    workflow.add_edge("grade_student", "collect_results")
+    workflow.add_edge("collect_results", "generate_report")
     workflow.add_edge("initial_review", "arbitration")
     workflow.add_edge("arbitration", "calculate_final_scores")
     workflow.add_edge("calculate_final_scores", "generate_report")
     workflow.add_edge("generate_report", END)
 
-    return workflow.compile()
+    return workflow
+
+
+def build_checkpointed_grading_workflow(checkpointer: Optional[BaseCheckpointSaver]):
+    """编译批改图并挂上 `checkpointer`（见 `src.agent.checkpoint.open_checkpointer`）。
+
+    学生分支全部同时发出，同时进行的模型调用数和其他流程一样由 grading_concurrency 限制。
+    """
+    return _grading_workflow().compile(checkpointer=checkpointer)
+
+
+def build_batch_grading_workflow():
+    # 通过 LangGraph 服务运行时由服务提供 checkpointer
+    return build_checkpointed_grading_workflow(None)
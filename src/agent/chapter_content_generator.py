@@ -1,16 +1,16 @@
+import functools
 import operator
-import os
 import pprint
 from typing import Annotated, Dict, List, Optional, Tuple, TypedDict, Union
 
 from langgraph.prebuilt import create_react_agent
-from langchain.chat_models import init_chat_model
 from langchain_core.prompts import PromptTemplate
 from langgraph.constants import END
 from langgraph.graph import StateGraph
 from pydantic import BaseModel, Field
 from sentence_transformers.cross_encoder.evaluation import classification
 
+from src.agent.models import get_model
 from src.agent.tools import (
     calculate_time,
     code_generate_tool,
@@ -53,19 +53,6 @@ class Plan(BaseModel):
     )
 
 
-planner = init_chat_model(
-    model="qwen3-235b-a22b",
-    model_provider="openai",
-    temperature=0,
-    extra_body={"enable_thinking": False},
-    api_key=os.getenv("DASH_SCOPE_API_KEY", ""),
-    # rate_limiter=rate_limiter,
-    base_url=os.getenv(
-        "DASH_SCOPE_API_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1"
-    ),
-)
-
-
 # 2. 从 Pydantic 模型生成 JSON Schema
 plan_schema = Plan.model_json_schema()
 
@@ -113,7 +100,7 @@ async def plan_step(state: PlanExecutionState, config) -> Dict:
 {plan_schema}
 """
 
-    structured_llm = planner.with_structured_output(Plan)
+    structured_llm = get_model("planner", config).with_structured_output(Plan)
     try:
         result = await structured_llm.ainvoke(prompt)
         return {
@@ -126,19 +113,6 @@ async def plan_step(state: PlanExecutionState, config) -> Dict:
         }
 
 
-executioner = init_chat_model(
-    model="qwen3-30b-a3b",
-    model_provider="openai",
-    temperature=0,
-    extra_body={"enable_thinking": False},
-    api_key=os.getenv("DASH_SCOPE_API_KEY", ""),
-    # rate_limiter=rate_limiter,
-    base_url=os.getenv(
-        "DASH_SCOPE_API_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1"
-    ),
-)
-
-
 async def classify_task_step(state: PlanExecutionState, config) -> Dict:
     """
     Classify the task to be whether it can be executed parallelly or it needs to be executed after all previous tasks are completed.
@@ -180,7 +154,7 @@ JSON 对象，格式如下：
 ```json
 {Classifier.model_json_schema()}
 """
-    structured_llm = executioner.with_structured_output(Classifier)
+    structured_llm = get_model("executor", config).with_structured_output(Classifier)
     result = await structured_llm.ainvoke(classification_prompt)
     return {
         "before_parallel_plan": result.before_parallel_plan,
@@ -191,17 +165,7 @@ JSON 对象，格式如下：
 
 async def summarize_step(detail: str) -> str:
     prompt = f"请用一句话总结以下内容，突出关键知识点和教学要点：\n\n{detail}"
-    resp_llm = init_chat_model(
-        model="qwen3-14b",
-        model_provider="openai",
-        temperature=0,
-        extra_body={"enable_thinking": False},
-        api_key=os.getenv("DASH_SCOPE_API_KEY", ""),
-        base_url=os.getenv(
-            "DASH_SCOPE_API_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1"
-        ),
-    )
-    result = await resp_llm.ainvoke(prompt)
+    result = await get_model("summarizer").ainvoke(prompt)
     return result.content.strip()
 
 
@@ -228,7 +192,7 @@ async def execute_before_parallel_step(state: PlanExecutionState, config) -> Dic
 这是前面的历史步骤和结果：
 {completed_steps or 'null'}
 """
-    agent_response = await execution_agent.ainvoke(
+    agent_response = await get_execution_agent().ainvoke(
         {"messages": [("user", task_formatted)]}, child_config
     )
     detail = agent_response["messages"][-1].content
@@ -237,31 +201,7 @@ async def execute_before_parallel_step(state: PlanExecutionState, config) -> Dic
     return {"past_steps": [(task, detail, summary)]}
 
 
-math_tool = get_math_tool(
-    init_chat_model(
-        model="qwen2.5-coder-32b-instruct",
-        model_provider="openai",
-        temperature=0,
-        # extra_body={"enable_thinking": False},
-        api_key=os.getenv("DASH_SCOPE_API_KEY", ""),
-        base_url=os.getenv(
-            "DASH_SCOPE_API_URL",
-            "https://dashscope.aliyuncs.com/compatible-mode/v1",
-        ),
-    )
-)
-execution_agent = create_react_agent(
-    model=executioner,
-    tools=[
-        rag_tool,
-        count_words,
-        calculate_time,
-        search,
-        math_tool,
-        code_generate_tool,
-        code_validate_tool,
-    ],
-    prompt="""你是教案撰写助手，负责根据教学计划中的每个步骤，生成详细、连贯且可操作的教案内容。
+EXECUTION_PROMPT = """你是教案撰写助手，负责根据教学计划中的每个步骤，生成详细、连贯且可操作的教案内容。
 请确保每个步骤内容详实、逻辑清晰，便于教师和学生直接参考。
 如遇专业知识点或不确定内容，优先调用 rag_tool 检索知识库，必要时使用 search 搜索外部资料。
 如涉及数学或计算问题，可调用 math_tool 进行辅助。
@@ -272,8 +212,25 @@ execution_agent = create_react_agent(
 正文用简洁明了的语言，适当包含代码示例、注意事项或操作要点。
 不需要出现练习题。
 如有必要，可补充背景知识或关键概念说明，但避免冗余。
-""",
-)
+"""
+
+
+@functools.cache
+def get_execution_agent():
+    """教案步骤执行 agent，首次使用时创建。"""
+    return create_react_agent(
+        model=get_model("executor"),
+        tools=[
+            rag_tool,
+            count_words,
+            calculate_time,
+            search,
+            get_math_tool(get_model("coder")),
+            code_generate_tool,
+            code_validate_tool,
+        ],
+        prompt=EXECUTION_PROMPT,
+    )
 
 import asyncio
 
@@ -301,7 +258,7 @@ async def execute_parallel_step(state: PlanExecutionState, config) -> Dict:
 针对以下计划：{task}\n\n你需要执行此步骤：{task}。"""
 
         async def run_with_summary(task=task, task_formatted=task_formatted):
-            result = await execution_agent.ainvoke(
+            result = await get_execution_agent().ainvoke(
                 {"messages": [("user", task_formatted)]}, child_config
             )
             detail = result["messages"][-1].content
@@ -339,7 +296,7 @@ async def execute_after_parallel_step(state: PlanExecutionState, config) -> Dict
 这是前面的历史步骤和结果：
 {completed_steps or 'null'}
 """
-    agent_response = await execution_agent.ainvoke(
+    agent_response = await get_execution_agent().ainvoke(
         {"messages": [("user", task_formatted)]}, child_config
     )
     detail = agent_response["messages"][-1].content
@@ -1,15 +1,15 @@
+import functools
 import operator
-import os
 import pprint
 from typing import Annotated, Dict, List, Optional, Tuple, TypedDict, Union
 
 from langgraph.prebuilt import create_react_agent
-from langchain.chat_models import init_chat_model
 from langchain_core.prompts import PromptTemplate
 from langgraph.constants import END
 from langgraph.graph import StateGraph
 from pydantic import BaseModel, Field
 
+from src.agent.models import get_model
 from src.agent.tools import (
     calculate_time,
     code_generate_tool,
@@ -49,19 +49,6 @@ class Plan(BaseModel):
     )
 
 
-planner = init_chat_model(
-    model="qwen3-235b-a22b",
-    model_provider="openai",
-    temperature=0,
-    extra_body={"enable_thinking": False},
-    api_key=os.getenv("DASH_SCOPE_API_KEY", ""),
-    # rate_limiter=rate_limiter,
-    base_url=os.getenv(
-        "DASH_SCOPE_API_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1"
-    ),
-)
-
-
 # 2. 从 Pydantic 模型生成 JSON Schema
 plan_schema = Plan.model_json_schema()
 
@@ -108,7 +95,7 @@ async def plan_step(state: PlanExecutionState, config) -> Dict:
 {plan_schema}
 """
 
-    structured_llm = planner.with_structured_output(Plan)
+    structured_llm = get_model("planner", config).with_structured_output(Plan)
     try:
         result = await structured_llm.ainvoke(prompt)
         return {
@@ -121,44 +108,28 @@ async def plan_step(state: PlanExecutionState, config) -> Dict:
         }
 
 
-executioner = init_chat_model(
-    model="qwen3-30b-a3b",
-    model_provider="openai",
-    temperature=0,
-    extra_body={"enable_thinking": False},
-    api_key=os.getenv("DASH_SCOPE_API_KEY", ""),
-    # rate_limiter=rate_limiter,
-    base_url=os.getenv(
-        "DASH_SCOPE_API_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1"
-    ),
-)
-
-execution_agent = create_react_agent(
-    model=executioner,
-    tools=[rag_tool, search, code_generate_tool, code_validate_tool],
-    prompt="""你是实训课教案撰写助手，负责根据教学计划中的每个步骤，生成详细、连贯且可操作的实验步骤内容。
+EXECUTION_PROMPT = """你是实训课教案撰写助手，负责根据教学计划中的每个步骤，生成详细、连贯且可操作的实验步骤内容。
 请确保每个步骤内容详实、逻辑清晰，便于教师和学生直接参考。
 如遇专业知识点或不确定内容，优先调用 rag_tool 检索知识库，必要时使用 search 搜索外部资料。
 如果需要生成代码，优先调用 code_generate_tool，必要时使用 code_validate_tool 进行验证。
 输出内容应聚焦于实验教学本身，避免涉及管理流程。
 需使用markdown标题表明当前的步骤，请从###开始，步骤尽量简短作为标题
-请用简洁明了的语言，适当包含代码示例、注意事项或操作要点。""",
-)
+请用简洁明了的语言，适当包含代码示例、注意事项或操作要点。"""
+
+
+@functools.cache
+def get_execution_agent():
+    """实验步骤执行 agent，首次使用时创建。"""
+    return create_react_agent(
+        model=get_model("executor"),
+        tools=[rag_tool, search, code_generate_tool, code_validate_tool],
+        prompt=EXECUTION_PROMPT,
+    )
 
 
 async def summarize_step(detail: str) -> str:
     prompt = f"请用一句话总结以下内容，突出关键操作和要点：\n\n{detail}"
-    resp_llm = init_chat_model(
-        model="qwen3-14b",
-        model_provider="openai",
-        temperature=0,
-        extra_body={"enable_thinking": False},
-        api_key=os.getenv("DASH_SCOPE_API_KEY", ""),
-        base_url=os.getenv(
-            "DASH_SCOPE_API_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1"
-        ),
-    )
-    result = await resp_llm.ainvoke(prompt)
+    result = await get_model("summarizer").ainvoke(prompt)
     return result.content.strip()
 
 
@@ -173,7 +144,7 @@ async def execute_step(state: PlanExecutionState, config) -> Dict:
     plan_str = "\n".join([f"{i+1}. {step}" for i, step in enumerate(completed + plan)])
     task = plan[0]
     task_formatted = f"""针对以下计划：{plan_str}\n\n你需要执行：{task}。"""
-    agent_response = await execution_agent.ainvoke(
+    agent_response = await get_execution_agent().ainvoke(
         {"messages": [("user", task_formatted)]}, config
     )
     detail = agent_response["messages"][-1].content
@@ -236,7 +207,7 @@ async def replan_step(state: PlanExecutionState, config) -> Dict:
 不要返回已经完成的步骤，只需返回新的步骤或最终答复内容。
 """
 
-    structured_llm = planner.with_structured_output(Act)
+    structured_llm = get_model("planner", config).with_structured_output(Act)
     result = await structured_llm.ainvoke(prompt)
     if isinstance(result.action, Response):
         return {"response": result.action.response}
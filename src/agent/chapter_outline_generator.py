@@ -1,11 +1,11 @@
-import os
 from typing import Dict, List, TypedDict
-from langchain.chat_models import init_chat_model
 from langgraph.constants import END
 from langgraph.graph import StateGraph
 from langgraph.graph.graph import CompiledGraph
 from pydantic import BaseModel, Field
 
+from src.agent.models import get_model
+
 
 # 结构化章节条目
 class ChapterItem(BaseModel):
@@ -29,18 +29,6 @@ class ChapterState(TypedDict):
     chapters: List[dict]
 
 
-llm = init_chat_model(
-    model="qwen3-235b-a22b",
-    model_provider="openai",
-    temperature=0,
-    extra_body={"enable_thinking": False},
-    api_key=os.getenv("DASH_SCOPE_API_KEY", ""),
-    base_url=os.getenv(
-        "DASH_SCOPE_API_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1"
-    ),
-)
-
-
 def extract_chapters(state: ChapterState) -> Dict:
     raw_syllabus = state["raw_syllabus"]
     prompt = f"""
@@ -61,7 +49,7 @@ def extract_chapters(state: ChapterState) -> Dict:
 ```
 每个章节对象都必须包含上述所有字段。
 """
-    structured_llm = llm.with_structured_output(ChapterItemList)
+    structured_llm = get_model("planner").with_structured_output(ChapterItemList)
     result = structured_llm.invoke(prompt)
 
     return {"chapters": result.chapters}
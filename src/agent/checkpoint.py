@@ -0,0 +1,72 @@
+"""在服务之外直接运行图时使用的持久化 checkpointer。
+
+通过 LangGraph 服务（``langgraph dev`` / ``langgraph up``）运行时，检查点由服务负责保存
+（生产环境为 Postgres），图本身不需要 checkpointer。在脚本、notebook 或离线任务中直接
+运行批改等耗时较长的图时，用 `open_checkpointer` 按 URL 打开一个持久化的 checkpointer，
+进程中断后可以用同一个 thread_id 从最近的检查点恢复::
+
+    async with open_checkpointer("sqlite:///grading.sqlite") as saver:
+        graph = build_checkpointed_grading_workflow(saver)
+        config = {"configurable": {"thread_id": "exam-42"}}
+        await graph.ainvoke(inputs, config)   # 首次运行
+        await graph.ainvoke(None, config)     # 中断后恢复
+
+支持的 URL：``sqlite:///相对路径``、``sqlite:////绝对路径``、``postgresql://...``、
+``redis://...`` 以及 ``memory://``（仅进程内，用于调试）。SQLite 随项目依赖安装；Postgres
+和 Redis 需要安装可选依赖 ``checkpoint``（``uv sync --extra checkpoint`` 或
+``pip install -e ".[checkpoint]"``）。
+"""
+
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+
+DEFAULT_URL = "sqlite:///.langgraph_checkpoints.sqlite"
+
+
+def _require(package: str, extra: Optional[str] = None) -> ImportError:
+    """缺少 checkpointer 依赖时的错误，说明应安装的包或可选依赖。"""
+    if extra:
+        hint = f"安装可选依赖 {extra}：uv sync --extra {extra} 或 pip install -e \".[{extra}]\""
+    else:
+        hint = "重新安装项目依赖：uv sync 或 pip install -e ."
+    return ImportError(f"该 checkpointer 需要 {package}，请{hint}")
+
+
+@asynccontextmanager
+async def open_checkpointer(url: Optional[str] = None) -> AsyncIterator[BaseCheckpointSaver]:
+    """按 URL 打开 checkpointer，默认取环境变量 ``CHECKPOINT_URL``，未设置时用本地 SQLite 文件。"""
+    url = url or os.getenv("CHECKPOINT_URL", DEFAULT_URL)
+    scheme = url.split("://", 1)[0]
+
+    if scheme == "memory":
+        from langgraph.checkpoint.memory import InMemorySaver
+
+        yield InMemorySaver()
+    elif scheme == "sqlite":
+        try:
+            from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        except ImportError as e:
+            raise _require("langgraph-checkpoint-sqlite") from e
+        async with AsyncSqliteSaver.from_conn_string(url[len("sqlite:///"):]) as saver:
+            yield saver
+    elif scheme in ("postgres", "postgresql"):
+        try:
+            from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+        except ImportError as e:
+            raise _require("langgraph-checkpoint-postgres", "checkpoint") from e
+        async with AsyncPostgresSaver.from_conn_string(url) as saver:
+            await saver.setup()
+            yield saver
+    elif scheme in ("redis", "rediss"):
+        try:
+            from langgraph.checkpoint.redis.aio import AsyncRedisSaver
+        except ImportError as e:
+            raise _require("langgraph-checkpoint-redis", "checkpoint") from e
+        async with AsyncRedisSaver.from_conn_string(url) as saver:
+            await saver.asetup()
+            yield saver
+    else:
+        raise ValueError(f"不支持的 checkpointer URL: {url}")
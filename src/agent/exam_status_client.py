@@ -0,0 +1,301 @@
+"""后端学生考试统计接口的异步客户端。
+
+批改时 ReAct 评审员会按（学生，评审员）调用 `get_stu_exam_status`，同一个学生的考试
+历史在一道题里最多被拉取、总结三次。这里用一个进程共享的 `httpx.AsyncClient` 复用
+到后端的连接，对网络错误和 5xx/429 做指数退避重试，并按（学生，课程）缓存原始统计
+数据和模型生成的评价；同一个键的并发请求只会真正发出一次。批改开始前可以用
+`prefetch` 一次并发加载全班的统计数据。
+
+缓存键中带有调用方 ``Authorization`` 的摘要，用一个令牌取到的数据不会返回给持有
+其他令牌的调用方。
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "http://127.0.0.1:8080/api/eduagentx"
+
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+CacheKey = Tuple[str, str, str, str]
+
+
+def principal(authorization: Optional[str]) -> str:
+    """调用方令牌的摘要，用于隔离不同调用方的缓存；没有令牌时为空字符串。"""
+    if not authorization:
+        return ""
+    return hashlib.sha256(authorization.encode()).hexdigest()[:16]
+
+
+class ExamStatusClient:
+    """带连接池、重试和 TTL 缓存的考试统计客户端。
+
+    Args:
+        base_url: 后端地址（``BACKEND_BASE_URL``）
+        max_connections: 连接池最大连接数
+        timeout: 单次请求超时（秒）
+        retries: 网络错误或 5xx/429 时的最多重试次数
+        backoff: 第一次重试前的等待（秒），之后每次翻倍
+        ttl: 缓存有效期（秒）
+        max_entries: 最多缓存的（学生，课程）数，超出时淘汰最久未使用的
+    """
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_BASE_URL,
+        max_connections: int = 32,
+        timeout: float = 10.0,
+        retries: int = 3,
+        backoff: float = 0.5,
+        ttl: float = 600.0,
+        max_entries: int = 10000,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._client: Optional[httpx.AsyncClient] = None
+        # key: (kind, student_id, course_id, principal)，kind 为 "stats" 或 "evaluation"
+        self._cache: "OrderedDict[CacheKey, Tuple[float, Any]]" = OrderedDict()
+        self._pending: Dict[CacheKey, asyncio.Future] = {}
+        # 每门课程的统计数据版本号，缓存的统计数据有增删时递增
+        self._versions: Dict[str, int] = {}
+        # (course_id, principal) -> 最近一次以整个班级预取的学生 ID
+        self._rosters: Dict[Tuple[str, str], Tuple[str, ...]] = {}
+        self._stats = {
+            "requests": 0,
+            "retries": 0,
+            "errors": 0,
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "evaluations": 0,
+            "prefetched": 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "ExamStatusClient":
+        """按环境变量构造客户端。"""
+        return cls(
+            base_url=os.getenv("BACKEND_BASE_URL", DEFAULT_BASE_URL),
+            max_connections=int(os.getenv("EXAM_STATUS_MAX_CONNECTIONS", 32)),
+            timeout=float(os.getenv("EXAM_STATUS_TIMEOUT", 10)),
+            retries=int(os.getenv("EXAM_STATUS_RETRIES", 3)),
+            backoff=float(os.getenv("EXAM_STATUS_BACKOFF", 0.5)),
+            ttl=float(os.getenv("EXAM_STATUS_CACHE_TTL", 600)),
+            max_entries=int(os.getenv("EXAM_STATUS_CACHE_MAX_ENTRIES", 10000)),
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """首次使用时创建底层 `httpx.AsyncClient`。"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                timeout=self.timeout,
+            )
+        return self._client
+
+    async def _get(self, path: str, authorization: Optional[str]) -> Any:
+        headers = {"Content-Type": "application/json"}
+        if authorization:
+            headers["Authorization"] = authorization
+        for attempt in range(self.retries + 1):
+            self._stats["requests"] += 1
+            try:
+                resp = await self.client.get(path, headers=headers)
+            except httpx.TransportError as e:
+                if attempt == self.retries:
+                    self._stats["errors"] += 1
+                    raise
+                logger.warning(f"请求考试统计失败，准备重试: {e}")
+            else:
+                if resp.status_code == 200:
+                    return resp.json()
+                if resp.status_code not in _RETRY_STATUS or attempt == self.retries:
+                    self._stats["errors"] += 1
+                    raise ValueError(
+                        f"Failed to get student exam status. Status code: {resp.status_code}, "
+                        f"Response: {resp.text}"
+                    )
+            self._stats["retries"] += 1
+            await asyncio.sleep(self.backoff * 2**attempt)
+
+    async def _cached(self, key: CacheKey, load: Callable[[], Awaitable[Any]]) -> Any:
+        """返回未过期的缓存值；未命中时调用 `load`，同一个键的并发调用共用一次加载。"""
+        entry = self._cache.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            self._cache.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+        pending = self._pending.get(key)
+        if pending is not None:
+            self._stats["coalesced"] += 1
+            return await asyncio.shield(pending)
+
+        self._stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            value = await load()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # 没有并发等待者时避免 "exception was never retrieved"
+            raise
+        finally:
+            self._pending.pop(key, None)
+        future.set_result(value)
+        self._cache[key] = (time.monotonic(), value)
+        self._cache.move_to_end(key)
+        self._bump(key)
+        while len(self._cache) > self.max_entries:
+            self._bump(self._cache.popitem(last=False)[0])
+        return value
+
+    def _bump(self, key: CacheKey) -> None:
+        if key[0] == "stats":
+            self._versions[key[2]] = self._versions.get(key[2], 0) + 1
+
+    def course_snapshot(
+        self,
+        course_id: str,
+        authorization: Optional[str] = None,
+        student_ids: Optional[Sequence[str]] = None,
+    ) -> Tuple[Tuple[int, int], Dict[str, Any]]:
+        """返回（数据版本，学生 ID -> 未过期的考试统计），供本地分析按版本缓存结果。
+
+        只包含用同一个 `authorization` 取到的数据；给出 `student_ids` 时只包含这些学生。
+        """
+        course_id, now = str(course_id), time.monotonic()
+        owner = principal(authorization)
+        wanted = None if student_ids is None else {str(s) for s in student_ids}
+        records = {
+            key[1]: value
+            for key, (stored_at, value) in list(self._cache.items())
+            if key[0] == "stats"
+            and key[2] == course_id
+            and key[3] == owner
+            and (wanted is None or key[1] in wanted)
+            and now - stored_at < self.ttl
+        }
+        # 条目过期不会递增版本号，版本中带上条目数使其同样生效
+        return (self._versions.get(course_id, 0), len(records)), records
+
+    async def fetch(
+        self, student_id: str, course_id: str, authorization: Optional[str] = None
+    ) -> Any:
+        """学生在某门课程下的考试统计（后端返回的 JSON）。"""
+        path = f"/exam/statistics/student/{student_id}/course/{course_id}"
+        return await self._cached(
+            ("stats", str(student_id), str(course_id), principal(authorization)),
+            lambda: self._get(path, authorization),
+        )
+
+    async def evaluation(
+        self,
+        student_id: str,
+        course_id: str,
+        authorization: Optional[str],
+        evaluate: Callable[[Any], Awaitable[str]],
+    ) -> str:
+        """对考试统计生成的评价，`evaluate` 只在缓存未命中时调用。"""
+
+        async def load() -> str:
+            data = await self.fetch(student_id, course_id, authorization)
+            self._stats["evaluations"] += 1
+            return await evaluate(data)
+
+        key = ("evaluation", str(student_id), str(course_id), principal(authorization))
+        return await self._cached(key, load)
+
+    async def prefetch(
+        self,
+        student_ids: Iterable[str],
+        course_id: str,
+        authorization: Optional[str] = None,
+        concurrency: int = 16,
+        roster: bool = False,
+    ) -> int:
+        """并发加载一批学生的考试统计，返回成功的数量；失败的只记录日志。
+
+        `roster` 为 true 表示这批学生就是整个班级（如一次批改的全部学生），之后
+        `roster` 方法会返回它们，用于计算班级百分位。
+        """
+        student_ids = list(dict.fromkeys(str(s) for s in student_ids))
+        if roster:
+            self._rosters[(str(course_id), principal(authorization))] = tuple(student_ids)
+        limit = asyncio.Semaphore(concurrency)
+
+        async def load(student_id: str) -> bool:
+            async with limit:
+                try:
+                    await self.fetch(student_id, course_id, authorization)
+                    return True
+                except Exception as e:
+                    logger.warning(f"预取学生 {student_id} 的考试统计失败: {e}")
+                    return False
+
+        loaded = sum(await asyncio.gather(*(load(s) for s in student_ids)))
+        self._stats["prefetched"] += loaded
+        return loaded
+
+    def roster(self, course_id: str, authorization: Optional[str] = None) -> Tuple[str, ...]:
+        """同一调用方最近一次以整个班级预取的学生 ID，没有时为空。"""
+        return self._rosters.get((str(course_id), principal(authorization)), ())
+
+    def invalidate(self, course_id: Optional[str] = None) -> int:
+        """清除某门课程（默认全部）的缓存，返回清除的条目数。"""
+        keys = [k for k in self._cache if course_id is None or k[2] == str(course_id)]
+        for key in keys:
+            del self._cache[key]
+            self._bump(key)
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "entries": len(self._cache),
+            "hit_ratio": self._stats["hits"] / lookups if lookups else 0.0,
+        }
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+
+
+_client: Optional[ExamStatusClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_exam_status_client() -> ExamStatusClient:
+    """返回当前事件循环上进程共享的考试统计客户端。"""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        _client = ExamStatusClient.from_env()
+        _client_loop = loop
+    return _client
+
+
+def exam_status_stats() -> Dict[str, Any]:
+    return _client.stats() if _client is not None else {}
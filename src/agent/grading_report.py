@@ -0,0 +1,199 @@
+"""批改汇总报告的本地统计与分层归纳。
+
+全班的分数统计（均值、中位数、分布直方图、分数段、仲裁比例）直接用 NumPy 在本地计算，
+不再交给模型。需要模型归纳的只有错误分析：先把失分学生的评语按内容去重聚类，
+再按 token 预算切块，并行让 summarizer 把每块归纳为若干错误模式；归纳结果仍放不进
+一块时继续逐层归纳，最后只把错误模式交给报告模型。这样报告的提示词长度和耗时
+基本不随班级人数增长。
+"""
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Sequence
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from src.agent.answer_clustering import (
+    DEFAULT_MODEL,
+    AnswerCluster,
+    answer_fingerprint,
+    get_encoder,
+    merge_similar,
+)
+
+logger = logging.getLogger(__name__)
+
+# (名称, 下限, 上限)，区间左闭右开，最高一档包含 1.0
+SCORE_BUCKETS = [("优秀", 0.9, 1.0), ("良好", 0.75, 0.9), ("及格", 0.6, 0.75), ("不及格", 0.0, 0.6)]
+
+MAX_ANALYSIS_CHARS = 300
+
+
+def score_statistics(results: Sequence, bins: int = 10) -> Dict[str, object]:
+    """计算 `FinalGradingResult` 列表的分数统计。"""
+    scores = np.fromiter((r.final_score for r in results), dtype=np.float64, count=len(results))
+    controversial = np.fromiter(
+        (r.is_controversial for r in results), dtype=bool, count=len(results)
+    )
+    if scores.size == 0:
+        return {"count": 0}
+    counts, edges = np.histogram(np.clip(scores, 0.0, 1.0), bins=bins, range=(0.0, 1.0))
+    buckets = {}
+    for name, low, high in SCORE_BUCKETS:
+        upper = scores <= high if high >= 1.0 else scores < high
+        buckets[name] = int(np.count_nonzero((scores >= low) & upper))
+    return {
+        "count": int(scores.size),
+        "mean": float(scores.mean()),
+        "median": float(np.median(scores)),
+        "std": float(scores.std()),
+        "min": float(scores.min()),
+        "max": float(scores.max()),
+        "full_marks_rate": float(np.mean(scores >= 1.0)),
+        "controversial_rate": float(controversial.mean()),
+        "histogram": {
+            "edges": [round(float(e), 2) for e in edges],
+            "counts": counts.tolist(),
+        },
+        "buckets": buckets,
+    }
+
+
+@dataclass
+class AnalysisGroup:
+    """内容相同（或相近）的一组失分评语。"""
+
+    analysis: str
+    count: int
+    mean_score: float
+
+
+async def group_analyses(
+    results: Sequence, near_duplicates: bool = False, threshold: float = 0.9
+) -> List[AnalysisGroup]:
+    """把未得满分学生的评语去重聚类，按人数从多到少排列。"""
+    groups: Dict[str, List] = {}
+    for r in results:
+        if r.final_score < 1.0 and r.final_analysis:
+            groups.setdefault(answer_fingerprint(r.final_analysis), []).append(r)
+    members = list(groups.values())
+
+    if near_duplicates and len(members) > 1:
+        model_name = os.getenv("ANSWER_CLUSTER_MODEL", DEFAULT_MODEL)
+        encoder = await asyncio.to_thread(get_encoder, model_name)
+        embeddings = await asyncio.to_thread(
+            encoder.encode, [m[0].final_analysis for m in members], normalize_embeddings=True
+        )
+        # 复用答案聚类的贪心合并，members 中存放的是组下标
+        clusters = merge_similar(
+            [AnswerCluster(str(i), "", [i]) for i in range(len(members))],
+            np.asarray(embeddings, dtype=np.float32),
+            threshold,
+        )
+        members = [[r for i in c.members for r in members[i]] for c in clusters]
+
+    analysis_groups = [
+        AnalysisGroup(
+            analysis=m[0].final_analysis[:MAX_ANALYSIS_CHARS],
+            count=len(m),
+            mean_score=float(np.mean([r.final_score for r in m])),
+        )
+        for m in members
+    ]
+    analysis_groups.sort(key=lambda g: g.count, reverse=True)
+    return analysis_groups
+
+
+class ErrorPattern(BaseModel):
+    description: str = Field(description="错误模式的概括描述")
+    student_count: int = Field(description="出现该错误的学生人数（按输入中标注的人数累加）")
+
+
+class ErrorPatterns(BaseModel):
+    patterns: List[ErrorPattern]
+
+
+CHUNK_PROMPT = """下面是同一道题中部分学生的失分评语，每条前面标注了有多少学生得到这条评语及其平均分。
+请把它们归纳为不超过 {max_patterns} 个共性错误模式，每个模式给出概括描述和涉及的学生人数（把归入该模式的各条评语的人数相加）。
+
+**题目:** {question}
+
+**评语:**
+---
+{items}
+---"""
+
+
+def _estimate_tokens(text: str) -> int:
+    # 中文约 1~2 个字符一个 token，按 2 个字符估算
+    return len(text) // 2 + 1
+
+
+def _chunk(items: List[str], token_budget: int) -> List[List[str]]:
+    chunks, current, tokens = [], [], 0
+    for item in items:
+        cost = _estimate_tokens(item)
+        if current and tokens + cost > token_budget:
+            chunks.append(current)
+            current, tokens = [], 0
+        current.append(item)
+        tokens += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def summarize_errors(
+    question: str,
+    groups: List[AnalysisGroup],
+    llm,
+    token_budget: int = 6000,
+    concurrency: int = 8,
+    max_patterns: int = 8,
+    retries: int = 1,
+) -> List[str]:
+    """分层归纳失分评语，返回可以放进一块预算的错误模式文本（每条带人数）。
+
+    评语本身放得下一块时不调用模型，直接返回。某一块归纳失败时重试 `retries` 次，
+    仍失败则原样保留该块的全部评语（连同人数），留给下一层归纳。
+    """
+    items = [f"[{g.count} 人，平均分 {g.mean_score:.2f}] {g.analysis}" for g in groups]
+    structured = llm.with_structured_output(ErrorPatterns)
+    limit = asyncio.Semaphore(concurrency)
+
+    async def summarize(chunk: List[str]) -> List[str]:
+        prompt = CHUNK_PROMPT.format(
+            max_patterns=max_patterns, question=question, items="\n".join(chunk)
+        )
+        async with limit:
+            for attempt in range(retries + 1):
+                try:
+                    result = await structured.ainvoke(prompt)
+                    break
+                except Exception as e:
+                    if attempt == retries:
+                        raise
+                    logger.warning(f"归纳错误模式失败，重试: {e}")
+        return [f"[{p.student_count} 人] {p.description}" for p in result.patterns]
+
+    level = 0
+    while _estimate_tokens("\n".join(items)) > token_budget:
+        chunks = _chunk(items, token_budget)
+        if len(chunks) == 1:  # 只剩一条且本身超出预算，无需再归纳
+            break
+        level += 1
+        outputs = await asyncio.gather(*(summarize(c) for c in chunks), return_exceptions=True)
+        summarized = []
+        for chunk, output in zip(chunks, outputs):
+            if isinstance(output, BaseException):
+                logger.error(f"归纳错误模式失败，保留该块的全部 {len(chunk)} 条评语: {output}")
+                output = chunk
+            summarized.extend(output)
+        logger.info(f"第 {level} 层归纳：{len(items)} 条 -> {len(summarized)} 条（{len(chunks)} 块）")
+        if len(summarized) >= len(items):  # 没有收敛，避免无限循环
+            break
+        items = summarized
+    return items
@@ -0,0 +1,73 @@
+"""进程级的已编译图注册表。
+
+LangGraph 的图在编译后不保存运行状态，可以在任意多个并发运行之间共享。
+各节点内部需要子图（RAG、测验生成、代码生成等）时，从这里取已编译好的图，
+而不是每次调用都重新构建、编译一遍 StateGraph。
+"""
+
+import importlib
+import inspect
+import logging
+import time
+from typing import Dict, List, Optional
+
+from langgraph.graph.graph import CompiledGraph
+
+logger = logging.getLogger(__name__)
+
+# 与 langgraph.json 中的 graphs 保持一致，另外加上只作为子图使用的构建函数
+GRAPH_BUILDERS: Dict[str, str] = {
+    "rag_agent": "src.agent.rag_agent:make_graph",
+    "chapter_content_generator": "src.agent.chapter_content_generator:build_lesson_planner",
+    "chapter_outline_generator": "src.agent.chapter_outline_generator:build_chapter_graph",
+    "code_agent": "src.agent.code_agent:build_code_agent",
+    "experiment_planner": "src.agent.chapter_experiment_generator:build_experiment_planner",
+    "quiz_planner_v2": "src.agent.quiz_generator_beta:build_quiz_planner_v2",
+    "grade_agent": "src.agent.batch_grading_agent:build_batch_grading_workflow",
+    "quiz_generator": "src.agent.quiz_generator:build_quiz_workflow",
+    "lesson_planner": "src.agent.lesson_plan_workflow:build_plan_workflow",
+    "code_generator": "src.agent.code_agent:build_code_generator",
+    "code_validator": "src.agent.code_agent:build_code_validator",
+}
+
+_graphs: Dict[str, CompiledGraph] = {}
+_build_seconds: Dict[str, float] = {}
+
+
+async def get_graph(name: str) -> CompiledGraph:
+    """返回名为 `name` 的已编译图，首次调用时构建并缓存。"""
+    graph = _graphs.get(name)
+    if graph is not None:
+        return graph
+    if name not in GRAPH_BUILDERS:
+        raise KeyError(f"未注册的图: {name}")
+
+    module_name, attr = GRAPH_BUILDERS[name].split(":")
+    builder = getattr(importlib.import_module(module_name), attr)
+    start = time.perf_counter()
+    graph = builder()
+    if inspect.isawaitable(graph):
+        graph = await graph
+    _build_seconds[name] = time.perf_counter() - start
+    # 与 LangGraph 服务一致地在运行元数据中带上图名，供缓存、指标按图统计
+    graph = graph.with_config(metadata={"graph_id": name})
+    # 并发的首次调用可能各自构建了一份，保留先写入的那份
+    return _graphs.setdefault(name, graph)
+
+
+async def warm_up(names: Optional[List[str]] = None) -> Dict[str, float]:
+    """预先构建注册表中的图，返回各图的构建耗时（秒）。构建失败只记录日志。"""
+    for name in names or list(GRAPH_BUILDERS):
+        try:
+            await get_graph(name)
+        except Exception as e:
+            logger.warning(f"预编译图 {name} 失败，将在首次使用时重试: {e}")
+    return dict(_build_seconds)
+
+
+def stats() -> Dict[str, object]:
+    """返回已编译的图及其构建耗时。"""
+    return {
+        "compiled": sorted(_graphs),
+        "build_seconds": dict(_build_seconds),
+    }
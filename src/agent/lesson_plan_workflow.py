@@ -2,37 +2,20 @@ import ast
 import asyncio
 import json
 import logging
-import os
 import re
 from typing import Dict, List, TypedDict
 
-from langchain.chat_models import init_chat_model
-from langchain_core.rate_limiters import InMemoryRateLimiter
 from langgraph.constants import END
 from langgraph.graph import StateGraph
 from langgraph.graph.graph import CompiledGraph
 from pydantic import BaseModel, Field
 
-from src.agent import quiz_generator, rag_agent
+from src.agent.graph_registry import get_graph
+from src.agent.models import get_model
 
 # 注意：由于我们直接在代码中定义了更健壮的prompt，以下导入将不再被使用，但暂时保留以供参考
 # from src.agent.prompt import FINAL_PLAN_COMPILER_PROMPT, SYLLABUS_PARSE_PROMPT, TIME_ALLOCATOR_PROMPT
 
-rate_limiter = InMemoryRateLimiter(
-    requests_per_second=0.25,  # <-- Super slow! We can only make a request once every 10 seconds!!
-    check_every_n_seconds=0.1,  # Wake up every 100 ms to check whether allowed to make a request,
-    max_bucket_size=10,  # Controls the maximum burst size.
-)
-llm = init_chat_model(
-    model="qwen3-235b-a22b",
-    model_provider="openai",
-    temperature=0,
-    extra_body={"enable_thinking": False},
-    api_key=os.getenv("DASH_SCOPE_API_KEY", ""),
-    # rate_limiter=rate_limiter,
-    base_url=os.getenv("DASH_SCOPE_API_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1"),
-)
-
 
 class ConfigSchema(TypedDict):
     course_id: str
@@ -115,7 +98,7 @@ def parse_syllabus(state: LessonPlanState) -> Dict:
     解析原始的大纲字符串，转换为结构化的章节列表。
     """
     raw_syllabus = state['raw_syllabus']
-    structured_llm = llm.with_structured_output(SyllabusStructure)
+    structured_llm = get_model("planner").with_structured_output(SyllabusStructure)
     try:
         # 优化：使用更明确的Prompt来指导模型
         prompt = (
@@ -178,7 +161,7 @@ async def generate_chapter_content(state: LessonPlanState, config) -> Dict:
             "2. 讲解内容应直接、简洁，不要包含开场白或总结。\n"
             "3. 数组元素的数量必须与知识点列表的数量完全一致。"
         )
-        rag_graph = await rag_agent.make_graph()
+        rag_graph = await get_graph("rag_agent")
         response = await rag_graph.ainvoke({"messages": [
             {"role": "user", "content": prompt}, ],
             "max_rewrite"                             : 3,
@@ -203,7 +186,7 @@ async def generate_chapter_content(state: LessonPlanState, config) -> Dict:
                 "\n".join(
                     f"- {point}：{explanation}" for point, explanation in zip(knowledge_points, explanations)) + "\n\n")
         # 注意：如果quiz_generator中也存在不稳定的LLM调用，其prompt也需要按类似方式进行优化
-        quiz_graph = quiz_generator.build_quiz_workflow()
+        quiz_graph = await get_graph("quiz_generator")
         quiz_state = {
             'content'                    : content,
             'num_choice_questions'       : state['num_choice_questions'],
@@ -224,7 +207,7 @@ async def generate_chapter_content(state: LessonPlanState, config) -> Dict:
                 "\n".join(f"- {point}: {explanation}" for point, explanation in zip(knowledge_points, explanations)) +
                 "\n\n### 配套练习题:\n" + str(quiz_result.get("practice_exercises", ""))
         )
-        time_llm = llm.with_structured_output(TimeAllocation)
+        time_llm = get_model("planner", config).with_structured_output(TimeAllocation)
         # 修复：使用更强大、更明确的提示词，强制模型遵循JSON格式和字段名。
         prompt_for_time = (
             "你是一个教学计划助手，专门负责为课程章节评估和分配时间。\n"
@@ -345,14 +328,6 @@ async def finalize_plan(state: LessonPlanState) -> Dict:
     )
 
     try:
-        final_llm = init_chat_model(
-            model="qwen-plus",
-            model_provider="openai",
-            temperature=0,
-            extra_body={"enable_thinking": False},
-            api_key=os.getenv("DASH_SCOPE_API_KEY", ""),
-            base_url=os.getenv("DASH_SCOPE_API_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1"),
-        )
         # 优化：使用更明确的Prompt指导最终排版
         prompt = (
             "你是一位专业的教案编辑。你的任务是将一份草稿状态的教案内容进行美化、排版和润色，使其成为一份结构清晰、易于阅读的最终版 Markdown 格式教案。\n\n"
@@ -368,7 +343,7 @@ async def finalize_plan(state: LessonPlanState) -> Dict:
             "--- 你的任务 ---\n"
             "请根据以上要求，输出最终美化后的完整教案。"
         )
-        result = await final_llm.ainvoke([{"role": "user", "content": prompt}])
+        result = await get_model("finalizer").ainvoke([{"role": "user", "content": prompt}])
         final_content = result.content
     except Exception as e:
         logging.error(f"使用LLM最终化教案失败。将返回原始拼接版本。错误: {e}")
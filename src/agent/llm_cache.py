@@ -0,0 +1,307 @@
+"""温度为 0 的模型调用的结果缓存。
+
+大纲解析、章节抽取、题干生成等调用都使用 `temperature=0`，同样的输入反复运行只会
+得到同样的结果。设置 ``LLM_CACHE=true`` 后，`models` 会给温度为 0 的角色挂上
+`LLMResponseCache`（LangChain 的 `BaseCache`）：
+
+- 键由模型配置、绑定的工具与结构化输出 schema（LangChain 的 llm_string）以及
+  规范化后的消息（去掉每次运行都不同的消息 id 和元数据）组成；
+- 进程内 LRU 为第一层，设置 ``LLM_CACHE_REDIS_URL`` 后 Redis 为第二层，
+  多个 worker 共享；
+- 按 `configurable.course_id` 分命名空间，可以按课程清理；
+- 单次运行可在 `configurable` 中传 ``"llm_cache": "bypass"``（不读不写）或
+  ``"refresh"``（不读但写入新结果）；
+- 命中率和节省的模型耗时按图统计（图名取自运行元数据中的 ``graph_id``）。
+
+只有经过 `invoke`/`ainvoke` 的调用会命中缓存，`astream` 总是请求模型。
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.runnables.config import var_child_runnable_config
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "llm:cache"
+GLOBAL_NAMESPACE = "_global"
+
+# 消息中每次运行都会变化、不影响模型输出的字段
+_VOLATILE_FIELDS = ("id", "response_metadata", "usage_metadata")
+
+
+def _normalize_prompt(prompt: str) -> str:
+    try:
+        messages = json.loads(prompt)
+    except ValueError:
+        return prompt
+    for message in messages if isinstance(messages, list) else []:
+        kwargs = message.get("kwargs") if isinstance(message, dict) else None
+        if isinstance(kwargs, dict):
+            for field in _VOLATILE_FIELDS:
+                kwargs.pop(field, None)
+    return json.dumps(messages, sort_keys=True, ensure_ascii=False)
+
+
+def _run_context() -> Tuple[str, str, Optional[str]]:
+    """从当前运行配置中取出 (命名空间, 图名, 缓存模式)。"""
+    config = var_child_runnable_config.get() or {}
+    configurable = config.get("configurable") or {}
+    metadata = config.get("metadata") or {}
+    namespace = str(configurable.get("course_id") or GLOBAL_NAMESPACE)
+    graph = str(metadata.get("graph_id") or "unknown")
+    return namespace, graph, configurable.get("llm_cache")
+
+
+def _detach(generations: Sequence[Any]) -> list:
+    """复制一份结果并清掉消息 id，避免缓存中的对象被调用方修改或在状态中重复。"""
+    generations = copy.deepcopy(list(generations))
+    for generation in generations:
+        message = getattr(generation, "message", None)
+        if message is not None:
+            message.id = None
+    return generations
+
+
+class LLMResponseCache(BaseCache):
+    """两层的模型结果缓存。
+
+    Args:
+        max_entries: 进程内 LRU 的最大条目数
+        ttl: 条目有效期（秒），两层相同
+        max_value_bytes: 序列化后超过该大小的结果不缓存
+        redis_url: Redis 地址，为空时只使用进程内缓存
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 5000,
+        ttl: float = 7 * 24 * 3600,
+        max_value_bytes: int = 256 * 1024,
+        redis_url: Optional[str] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_value_bytes = max_value_bytes
+        self.redis_url = redis_url
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, float, list]]" = OrderedDict()
+        self._misses: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = None
+        self._aredis = None
+        self._graph_stats: Dict[str, Dict[str, float]] = {}
+
+    @classmethod
+    def from_env(cls) -> "LLMResponseCache":
+        return cls(
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", 5000)),
+            ttl=float(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600)),
+            max_value_bytes=int(os.getenv("LLM_CACHE_MAX_VALUE_BYTES", 256 * 1024)),
+            redis_url=os.getenv("LLM_CACHE_REDIS_URL") or None,
+        )
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key, graph, mode = self._prepare(prompt, llm_string)
+        if mode in ("bypass", "refresh"):
+            return None
+        hit = self._local_get(key)
+        if hit is None and self.redis_url:
+            hit = self._decode(self._redis_call(lambda r: r.get(self._redis_key(key))))
+            if hit is not None:
+                self._local_put(key, *hit)
+        return self._finish_lookup(key, graph, hit)
+
+    async def alookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key, graph, mode = self._prepare(prompt, llm_string)
+        if mode in ("bypass", "refresh"):
+            return None
+        hit = self._local_get(key)
+        if hit is None and self.redis_url:
+            try:
+                hit = self._decode(await self._get_aredis().get(self._redis_key(key)))
+            except Exception as e:
+                logger.warning(f"读取 Redis 模型缓存失败: {e}")
+            if hit is not None:
+                self._local_put(key, *hit)
+        return self._finish_lookup(key, graph, hit)
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        entry = self._prepare_update(prompt, llm_string, return_val)
+        if entry is not None and self.redis_url:
+            key, value = entry
+            self._redis_call(lambda r: r.set(self._redis_key(key), value, ex=int(self.ttl)))
+
+    async def aupdate(
+        self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE
+    ) -> None:
+        entry = self._prepare_update(prompt, llm_string, return_val)
+        if entry is not None and self.redis_url:
+            key, value = entry
+            try:
+                await self._get_aredis().set(self._redis_key(key), value, ex=int(self.ttl))
+            except Exception as e:
+                logger.warning(f"写入 Redis 模型缓存失败: {e}")
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.redis_url:
+            self._redis_call(self._delete_sync(f"{REDIS_KEY_PREFIX}:*"))
+
+    async def aclear(self, **kwargs: Any) -> None:
+        await self.invalidate(None)
+
+    async def invalidate(self, course_id: Optional[str]) -> int:
+        """删除某个课程（为 None 时删除全部）的缓存，返回删除的进程内条目数。"""
+        namespace = str(course_id) if course_id is not None else None
+        with self._lock:
+            keys = [k for k in self._entries if namespace is None or k[0] == namespace]
+            for key in keys:
+                del self._entries[key]
+        if self.redis_url:
+            pattern = f"{REDIS_KEY_PREFIX}:{namespace or '*'}:*"
+            try:
+                redis = self._get_aredis()
+                batch = [k async for k in redis.scan_iter(match=pattern, count=500)]
+                if batch:
+                    await redis.delete(*batch)
+            except Exception as e:
+                logger.warning(f"清理 Redis 模型缓存失败: {e}")
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        """按图统计的命中率与节省的模型耗时。"""
+        graphs = {}
+        for graph, s in self._graph_stats.items():
+            total = s["hits"] + s["misses"]
+            graphs[graph] = {
+                **s,
+                "hit_ratio": s["hits"] / total if total else 0.0,
+            }
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "redis_enabled": bool(self.redis_url),
+            "graphs": graphs,
+        }
+
+    def _prepare(self, prompt: str, llm_string: str) -> Tuple[Tuple[str, str], str, Optional[str]]:
+        namespace, graph, mode = _run_context()
+        digest = hashlib.sha256(
+            (llm_string + "\x00" + _normalize_prompt(prompt)).encode()
+        ).hexdigest()
+        return (namespace, digest), graph, mode
+
+    def _finish_lookup(self, key, graph: str, hit) -> Optional[RETURN_VAL_TYPE]:
+        with self._lock:
+            s = self._graph_stats.setdefault(
+                graph, {"hits": 0, "misses": 0, "seconds_saved": 0.0}
+            )
+            if hit is None:
+                s["misses"] += 1
+                self._misses[key] = time.perf_counter()
+                while len(self._misses) > self.max_entries:
+                    self._misses.popitem(last=False)
+                return None
+            s["hits"] += 1
+            s["seconds_saved"] += hit[0]
+        return _detach(hit[1])
+
+    def _prepare_update(self, prompt, llm_string, return_val) -> Optional[Tuple[Any, str]]:
+        key, _, mode = self._prepare(prompt, llm_string)
+        if mode == "bypass":
+            return None
+        with self._lock:
+            started = self._misses.pop(key, None)
+        seconds = time.perf_counter() - started if started is not None else 0.0
+        generations = _detach(return_val)
+        value = dumps({"seconds": seconds, "generations": generations})
+        if len(value.encode()) > self.max_value_bytes:
+            return None
+        self._local_put(key, seconds, generations)
+        return key, value
+
+    def _local_get(self, key) -> Optional[Tuple[float, list]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, seconds, generations = entry
+            if time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return seconds, generations
+
+    def _local_put(self, key, seconds: float, generations: list) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), seconds, generations)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _redis_key(key: Tuple[str, str]) -> str:
+        return f"{REDIS_KEY_PREFIX}:{key[0]}:{key[1]}"
+
+    @staticmethod
+    def _decode(raw) -> Optional[Tuple[float, list]]:
+        if raw is None:
+            return None
+        try:
+            data = loads(raw if isinstance(raw, str) else raw.decode())
+            return float(data["seconds"]), list(data["generations"])
+        except Exception as e:
+            logger.warning(f"无法解析模型缓存条目: {e}")
+            return None
+
+    def _get_aredis(self):
+        if self._aredis is None:
+            import redis.asyncio as aioredis
+
+            self._aredis = aioredis.Redis.from_url(self.redis_url)
+        return self._aredis
+
+    def _redis_call(self, fn):
+        """执行同步 Redis 操作，失败时只记录日志。"""
+        try:
+            if self._redis is None:
+                import redis
+
+                self._redis = redis.Redis.from_url(self.redis_url)
+            return fn(self._redis)
+        except Exception as e:
+            logger.warning(f"访问 Redis 模型缓存失败: {e}")
+            return None
+
+    @staticmethod
+    def _delete_sync(pattern: str):
+        def delete(redis):
+            keys = list(redis.scan_iter(match=pattern, count=500))
+            if keys:
+                redis.delete(*keys)
+
+        return delete
+
+
+_response_cache: Optional[LLMResponseCache] = None
+
+
+def get_response_cache() -> Optional[LLMResponseCache]:
+    """返回进程内共享的模型结果缓存，未设置 ``LLM_CACHE=true`` 时返回 None。"""
+    global _response_cache
+    if os.getenv("LLM_CACHE", "false").lower() != "true":
+        return None
+    if _response_cache is None:
+        _response_cache = LLMResponseCache.from_env()
+    return _response_cache
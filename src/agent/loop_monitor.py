@@ -0,0 +1,102 @@
+"""事件循环阻塞监控。
+
+后台任务按固定间隔 `sleep`，醒来时实际经过的时间减去预期间隔就是事件循环的延迟。
+延迟超过阈值说明有回调在同步阻塞事件循环（例如在 async 节点里调用了同步的
+`invoke`），此时同一个 worker 上的所有运行都会被卡住。
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """监控当前事件循环的调度延迟。
+
+    Args:
+        threshold: 延迟超过该值（秒）时记一次阻塞并打印警告
+        interval: 采样间隔（秒）
+        debug_slow_callbacks: 同时开启 asyncio 调试模式，由 asyncio 打印具体是哪个
+            回调执行过慢（开销较大，只建议排查问题时使用）
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.1,
+        interval: float = 0.05,
+        debug_slow_callbacks: bool = False,
+    ):
+        self.threshold = threshold
+        self.interval = interval
+        self.debug_slow_callbacks = debug_slow_callbacks
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {
+            "samples": 0,
+            "blocked": 0,
+            "max_lag_seconds": 0.0,
+            "total_blocked_seconds": 0.0,
+            "last_lag_seconds": 0.0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "LoopLagMonitor":
+        """按环境变量构造监控器。"""
+        return cls(
+            threshold=float(os.getenv("LOOP_LAG_THRESHOLD", 0.1)),
+            interval=float(os.getenv("LOOP_LAG_INTERVAL", 0.05)),
+            debug_slow_callbacks=os.getenv("LOOP_LAG_DEBUG", "false").lower()
+            in ("1", "true", "yes"),
+        )
+
+    def start(self) -> None:
+        """在当前事件循环上启动监控。"""
+        if self._task is not None and not self._task.done():
+            return
+        loop = asyncio.get_running_loop()
+        if self.debug_slow_callbacks:
+            loop.slow_callback_duration = self.threshold
+            loop.set_debug(True)
+        self._task = loop.create_task(self._run(), name="loop-lag-monitor")
+
+    async def stop(self) -> None:
+        """停止监控。"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """返回采样次数、阻塞次数和最大延迟。"""
+        return {**self._stats, "threshold_seconds": self.threshold}
+
+    async def _run(self) -> None:
+        stats = self._stats
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - start - self.interval)
+            stats["samples"] += 1
+            stats["last_lag_seconds"] = lag
+            stats["max_lag_seconds"] = max(stats["max_lag_seconds"], lag)
+            if lag >= self.threshold:
+                stats["blocked"] += 1
+                stats["total_blocked_seconds"] += lag
+                logger.warning(f"事件循环被阻塞 {lag * 1000:.0f} ms")
+
+
+_monitor: Optional[LoopLagMonitor] = None
+
+
+def get_loop_monitor() -> LoopLagMonitor:
+    """返回进程共享的监控器。"""
+    global _monitor
+    if _monitor is None:
+        _monitor = LoopLagMonitor.from_env()
+    return _monitor
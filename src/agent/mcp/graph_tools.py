@@ -1,47 +1,80 @@
 import argparse
 import os
 
-import httpx
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+try:
+    from .lightrag_http import get_lightrag_client
+except ImportError:  # 作为脚本直接运行
+    from lightrag_http import get_lightrag_client
 
 # ---
 # 全局变量来存储 RAG URL 和 Authorization Token
 # 默认值
 RAG_URL = "http://localhost:9621"
+# 为空时服务以多租户模式运行，user_id 由每次调用的参数或请求头提供
 USER_ID: str = ""
+USER_ID_HEADER = "x-user-id"
 # ---
 
 mcp = FastMCP("Light RAG Graph", "0.1.0")
 
 
-async def get_graph_labels() -> list[str]:
+def resolve_user_id(user_id: str = "", ctx: Context = None) -> str:
+    """
+    按 调用参数 > 请求头 > 启动参数 的顺序确定本次调用的 user_id。
+    """
+    if user_id:
+        return user_id
+    if ctx is not None:
+        try:
+            request = ctx.request_context.request
+        except ValueError:
+            request = None
+        headers = getattr(request, "headers", None)
+        if headers and headers.get(USER_ID_HEADER):
+            return headers[USER_ID_HEADER]
+    if USER_ID:
+        return USER_ID
+    raise ValueError(
+        f"user_id 未提供：请通过工具参数、{USER_ID_HEADER} 请求头或 --user-id 指定。"
+    )
+
+
+async def get_graph_labels(user_id: str) -> list[str]:
     """
     获取所有知识图谱标签
 
+    Args:
+        user_id (str): 用户ID
+
     Returns:
         List[str]: 标签列表
     """
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        resp = await client.get(f"{RAG_URL}/api/graph/label/list/{USER_ID}")
-        resp.raise_for_status()
-        return resp.json()
+    resp = await get_lightrag_client().request(
+        "graph", "GET", f"{RAG_URL}/api/graph/label/list/{user_id}"
+    )
+    return resp.json()
 
 
 @mcp.tool()
-async def graph_label_list() -> list[str]:
+async def graph_label_list(user_id: str = "", ctx: Context = None) -> list[str]:
     """
     获取知识图谱所有标签
     Returns:
         List[str]: 标签列表
     """
-    return await get_graph_labels()
+    return await get_graph_labels(resolve_user_id(user_id, ctx))
 
 
-async def get_knowledge_graph(label: str = "", max_depth: int = 3, max_nodes: int = 1000) -> dict:
+async def get_knowledge_graph(user_id: str, label: str = "", max_depth: int = 3, max_nodes: int = 1000) -> dict:
     """
     获取指定标签的知识子图
 
     Args:
+        user_id (str): 用户ID
         label (str): 起始节点标签
         max_depth (int): 最大深度
         max_nodes (int): 最大节点数
@@ -54,14 +87,14 @@ async def get_knowledge_graph(label: str = "", max_depth: int = 3, max_nodes: in
         "max_depth": max_depth,
         "max_nodes": max_nodes
     }
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        resp = await client.get(f"{RAG_URL}/api/graphs/{USER_ID}", params=params)
-        resp.raise_for_status()
-        return resp.json()
+    resp = await get_lightrag_client().request(
+        "graph", "GET", f"{RAG_URL}/api/graphs/{user_id}", params=params
+    )
+    return resp.json()
 
 
 @mcp.tool()
-async def get_graph(label: str = "", max_depth: int = 3, max_nodes: int = 1000) -> dict:
+async def get_graph(label: str = "", max_depth: int = 3, max_nodes: int = 1000, user_id: str = "", ctx: Context = None) -> dict:
     """
     获取知识图谱子图
 
@@ -73,28 +106,29 @@ async def get_graph(label: str = "", max_depth: int = 3, max_nodes: int = 1000)
     Returns:
         dict: 子图
     """
-    return await get_knowledge_graph(USER_ID, label, max_depth, max_nodes)
+    return await get_knowledge_graph(resolve_user_id(user_id, ctx), label, max_depth, max_nodes)
 
 
-async def check_entity_exists(name: str = "") -> dict:
+async def check_entity_exists(user_id: str, name: str = "") -> dict:
     """
     检查实体是否存在
 
     Args:
+        user_id (str): 用户ID
         name (str): 实体名
 
     Returns:
         Dict[str, bool]: {'exists': bool}
     """
     params = {"name": name}
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        resp = await client.get(f"{RAG_URL}/api/graph/entity/exists/{USER_ID}", params=params)
-        resp.raise_for_status()
-        return resp.json()
+    resp = await get_lightrag_client().request(
+        "graph", "GET", f"{RAG_URL}/api/graph/entity/exists/{user_id}", params=params
+    )
+    return resp.json()
 
 
 @mcp.tool()
-async def entity_exists(name: str = "") -> dict:
+async def entity_exists(name: str = "", user_id: str = "", ctx: Context = None) -> dict:
     """
     检查知识识图谱中实体是否存在
 
@@ -104,27 +138,28 @@ async def entity_exists(name: str = "") -> dict:
     Returns:
         dict: {'exists': bool}
     """
-    return await check_entity_exists(USER_ID, name)
+    return await check_entity_exists(resolve_user_id(user_id, ctx), name)
 
 
-async def update_entity(data: dict = {}) -> dict:
+async def update_entity(user_id: str, data: dict = {}) -> dict:
     """
     更新实体属性
 
     Args:
+        user_id (str): 用户ID
         data (dict): 实体更新请求体
 
     Returns:
         dict: 更新后的实体信息
     """
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        resp = await client.post(f"{RAG_URL}/api/graph/entity/edit/{USER_ID}", json=data)
-        resp.raise_for_status()
-        return resp.json()
+    resp = await get_lightrag_client().request(
+        "edit", "POST", f"{RAG_URL}/api/graph/entity/edit/{user_id}", json=data
+    )
+    return resp.json()
 
 
 @mcp.tool()
-async def entity_edit(request: dict = {}) -> dict:
+async def entity_edit(request: dict = {}, user_id: str = "", ctx: Context = None) -> dict:
     """
     更新知识图谱实体属性
 
@@ -134,27 +169,28 @@ async def entity_edit(request: dict = {}) -> dict:
     Returns:
         dict: 更新后的实体信息
     """
-    return await update_entity(USER_ID, request)
+    return await update_entity(resolve_user_id(user_id, ctx), request)
 
 
-async def update_relation(data: dict = {}) -> dict:
+async def update_relation(user_id: str, data: dict = {}) -> dict:
     """
     更新关系属性
 
     Args:
+        user_id (str): 用户ID
         data (dict): 关系更新请求体
 
     Returns:
         dict: 更新后的关系信息
     """
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        resp = await client.post(f"{RAG_URL}/api/graph/relation/edit/{USER_ID}", json=data)
-        resp.raise_for_status()
-        return resp.json()
+    resp = await get_lightrag_client().request(
+        "edit", "POST", f"{RAG_URL}/api/graph/relation/edit/{user_id}", json=data
+    )
+    return resp.json()
 
 
 @mcp.tool()
-async def relation_edit(request: dict = {}) -> dict:
+async def relation_edit(request: dict = {}, user_id: str = "", ctx: Context = None) -> dict:
     """
     更新知识图谱关系属性
 
@@ -164,7 +200,13 @@ async def relation_edit(request: dict = {}) -> dict:
     Returns:
         dict: 更新后的关系信息
     """
-    return await update_relation(USER_ID, request)
+    return await update_relation(resolve_user_id(user_id, ctx), request)
+
+
+@mcp.custom_route("/stats", methods=["GET"])
+async def stats(request: Request) -> JSONResponse:
+    """LightRAG 连接池统计（仅 streamable-http 模式可访问）。"""
+    return JSONResponse({"http_pool": get_lightrag_client().stats()})
 
 
 if __name__ == "__main__":
@@ -173,8 +215,16 @@ if __name__ == "__main__":
         "--user-id",
         type=str,
         default=None,
-        help="User id for the RAG service."
+        help="User id for the RAG service. Omit to serve every user from one process."
+    )
+    parser.add_argument(
+        "--transport",
+        choices=["stdio", "streamable-http"],
+        default="stdio",
+        help="MCP transport. Use streamable-http to share one server between graph workers."
     )
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
     parser.add_argument(
         "--rag-url",
         type=str,
@@ -192,4 +242,9 @@ if __name__ == "__main__":
     else:
         RAG_URL = os.environ.get("RAG_URL", "http://localhost:9621")
 
-    mcp.run(transport='stdio')
+    if args.user_id:
+        USER_ID = args.user_id
+
+    mcp.settings.host = args.host
+    mcp.settings.port = args.port
+    mcp.run(transport=args.transport)
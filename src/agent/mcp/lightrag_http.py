@@ -0,0 +1,171 @@
+"""LightRAG MCP 服务共用的 HTTP 客户端。
+
+每个 MCP 服务进程只维护一个 `httpx.AsyncClient`，通过连接池和 keep-alive
+复用到 LightRAG 的 TCP/TLS 连接，避免每次查询都重新握手。
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# 各类操作的默认读超时（秒），可通过 LIGHTRAG_TIMEOUT_<OP> 环境变量覆盖
+DEFAULT_TIMEOUTS = {
+    "query": 60.0,
+    "graph": 30.0,
+    "edit": 30.0,
+}
+
+
+class LightRAGHttpClient:
+    """带连接池统计的 LightRAG HTTP 客户端。
+
+    Args:
+        max_connections: 连接池最大连接数
+        max_keepalive_connections: 保持空闲的最大连接数
+        keepalive_expiry: 空闲连接保留时间（秒）
+        http2: 是否启用 HTTP/2（需要安装 h2，未安装时回退到 HTTP/1.1）
+        connect_timeout: 建连超时（秒）
+        pool_timeout: 等待空闲连接的超时（秒）
+        timeouts: 按操作类型区分的读超时（秒）
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        connect_timeout: float = 5.0,
+        pool_timeout: float = 10.0,
+        timeouts: Optional[Dict[str, float]] = None,
+    ):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2
+        self.connect_timeout = connect_timeout
+        self.pool_timeout = pool_timeout
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._stats = {
+            "requests": 0,
+            "errors": 0,
+            "pool_timeouts": 0,
+            "in_flight": 0,
+            "peak_in_flight": 0,
+            "total_latency_seconds": 0.0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "LightRAGHttpClient":
+        """按环境变量构造客户端。"""
+        return cls(
+            max_connections=int(os.getenv("LIGHTRAG_MAX_CONNECTIONS", 100)),
+            max_keepalive_connections=int(os.getenv("LIGHTRAG_MAX_KEEPALIVE", 20)),
+            keepalive_expiry=float(os.getenv("LIGHTRAG_KEEPALIVE_EXPIRY", 30)),
+            http2=os.getenv("LIGHTRAG_HTTP2", "false").lower() in ("1", "true", "yes"),
+            connect_timeout=float(os.getenv("LIGHTRAG_CONNECT_TIMEOUT", 5)),
+            pool_timeout=float(os.getenv("LIGHTRAG_POOL_TIMEOUT", 10)),
+            timeouts={
+                op: float(os.getenv(f"LIGHTRAG_TIMEOUT_{op.upper()}", default))
+                for op, default in DEFAULT_TIMEOUTS.items()
+            },
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """首次使用时创建底层 `httpx.AsyncClient`。"""
+        if self._client is None or self._client.is_closed:
+            limits = httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            )
+            http2 = self.http2
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    logger.warning("未安装 h2，LightRAG 客户端回退到 HTTP/1.1")
+                    http2 = False
+            self._client = httpx.AsyncClient(limits=limits, http2=http2)
+        return self._client
+
+    def timeout_for(self, op: str) -> httpx.Timeout:
+        """返回某类操作的超时设置。"""
+        return httpx.Timeout(
+            self.timeouts.get(op, DEFAULT_TIMEOUTS["query"]),
+            connect=self.connect_timeout,
+            pool=self.pool_timeout,
+        )
+
+    async def request(self, op: str, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        """发送请求并记录连接池使用情况，`op` 决定使用的超时。"""
+        stats = self._stats
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(
+                method, url, timeout=self.timeout_for(op), **kwargs
+            )
+            response.raise_for_status()
+            return response
+        except httpx.PoolTimeout:
+            stats["pool_timeouts"] += 1
+            stats["errors"] += 1
+            raise
+        except Exception:
+            stats["errors"] += 1
+            raise
+        finally:
+            stats["in_flight"] -= 1
+            stats["total_latency_seconds"] += time.perf_counter() - start
+
+    def stats(self) -> Dict[str, Any]:
+        """返回连接池饱和度等统计信息，用于按 LightRAG 负载调整连接池大小。"""
+        requests = self._stats["requests"]
+        return {
+            **self._stats,
+            "max_connections": self.max_connections,
+            "max_keepalive_connections": self.max_keepalive_connections,
+            "http2": self.http2,
+            "saturation": self._stats["in_flight"] / self.max_connections,
+            "peak_saturation": self._stats["peak_in_flight"] / self.max_connections,
+            "avg_latency_seconds": (
+                self._stats["total_latency_seconds"] / requests if requests else 0.0
+            ),
+        }
+
+    async def aclose(self) -> None:
+        """关闭底层连接池。"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self) -> "LightRAGHttpClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+
+_shared: Optional[LightRAGHttpClient] = None
+_shared_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_lightrag_client() -> LightRAGHttpClient:
+    """返回当前事件循环上进程共享的 LightRAG 客户端。"""
+    global _shared, _shared_loop
+    loop = asyncio.get_running_loop()
+    if _shared is None or _shared_loop is not loop:
+        _shared = LightRAGHttpClient.from_env()
+        _shared_loop = loop
+    return _shared
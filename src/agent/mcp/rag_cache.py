@@ -0,0 +1,211 @@
+"""知识库查询结果缓存。
+
+两级缓存：进程内 TTL + LRU（按字节数限额），以及可选的 Redis 共享层。
+每门课程是一个独立命名空间，命名空间带有版本号；上传新文档后调用
+`invalidate(course_id)` 递增版本号，旧结果即刻失效，Redis 中的旧键随 TTL 过期。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "rag:query"
+
+
+def generation_key(course_id: str) -> str:
+    """Redis 中保存课程缓存版本号的键。"""
+    return f"{REDIS_KEY_PREFIX}:gen:{course_id}"
+
+
+@dataclass
+class _Entry:
+    course_id: str
+    generation: int
+    value: str
+    nbytes: int
+    expires_at: float
+
+
+class RagQueryCache:
+    """知识库查询结果缓存。
+
+    Args:
+        max_bytes: 进程内缓存总字节上限
+        max_entry_bytes: 单条结果字节上限，超过的不缓存
+        ttl: 进程内缓存过期时间（秒）
+        redis_url: Redis 地址，为空时只使用进程内缓存
+        redis_ttl: Redis 中结果的过期时间（秒）
+        generation_ttl: 本地缓存 Redis 版本号的时间（秒），决定跨进程失效的最大延迟
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_entry_bytes: int = 1024 * 1024,
+        ttl: float = 600.0,
+        redis_url: Optional[str] = None,
+        redis_ttl: float = 3600.0,
+        generation_ttl: float = 2.0,
+    ):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.ttl = ttl
+        self.redis_ttl = redis_ttl
+        self.generation_ttl = generation_ttl
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._generations: Dict[str, Tuple[int, float]] = {}
+        self._redis = None
+        if redis_url:
+            import redis.asyncio as aioredis
+
+            self._redis = aioredis.Redis.from_url(redis_url)
+        self._stats = {
+            "memory_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+            "redis_errors": 0,
+            "bytes_saved": 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "RagQueryCache":
+        """按环境变量构造缓存。"""
+        return cls(
+            max_bytes=int(os.getenv("RAG_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+            max_entry_bytes=int(os.getenv("RAG_CACHE_MAX_ENTRY_BYTES", 1024 * 1024)),
+            ttl=float(os.getenv("RAG_CACHE_TTL", 600)),
+            redis_url=os.getenv("RAG_CACHE_REDIS_URL") or None,
+            redis_ttl=float(os.getenv("RAG_CACHE_REDIS_TTL", 3600)),
+        )
+
+    @staticmethod
+    def make_key(course_id: str, generation: int, params: Dict[str, Any]) -> str:
+        """由课程、版本号和完整查询参数生成缓存键。"""
+        digest = hashlib.sha256(
+            json.dumps(params, sort_keys=True, ensure_ascii=False).encode()
+        ).hexdigest()
+        return f"{REDIS_KEY_PREFIX}:{course_id}:{generation}:{digest}"
+
+    async def get(self, course_id: str, params: Dict[str, Any]) -> Optional[str]:
+        """查询缓存，未命中返回 None。"""
+        generation = await self._generation(course_id)
+        key = self.make_key(course_id, generation, params)
+        now = time.monotonic()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires_at > now:
+                self._entries.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                self._stats["bytes_saved"] += entry.nbytes
+                return entry.value
+            self._drop(key)
+            self._stats["expirations"] += 1
+
+        if self._redis is not None:
+            try:
+                raw = await self._redis.get(key)
+            except Exception as e:
+                self._stats["redis_errors"] += 1
+                logger.warning(f"读取 Redis 查询缓存失败: {e}")
+                raw = None
+            if raw is not None:
+                value = raw.decode() if isinstance(raw, bytes) else raw
+                self._stats["redis_hits"] += 1
+                self._stats["bytes_saved"] += len(raw)
+                self._store(key, course_id, generation, value)
+                return value
+
+        self._stats["misses"] += 1
+        return None
+
+    async def set(self, course_id: str, params: Dict[str, Any], value: str) -> None:
+        """写入缓存。"""
+        generation = await self._generation(course_id)
+        key = self.make_key(course_id, generation, params)
+        if not self._store(key, course_id, generation, value):
+            return
+        self._stats["sets"] += 1
+        if self._redis is not None:
+            try:
+                await self._redis.set(key, value, ex=int(self.redis_ttl))
+            except Exception as e:
+                self._stats["redis_errors"] += 1
+                logger.warning(f"写入 Redis 查询缓存失败: {e}")
+
+    async def invalidate(self, course_id: str) -> int:
+        """使某门课程的所有缓存结果失效，返回新的版本号。"""
+        self._stats["invalidations"] += 1
+        for key in [k for k, e in self._entries.items() if e.course_id == course_id]:
+            self._drop(key)
+        generation = self._generations.get(course_id, (0, 0.0))[0] + 1
+        if self._redis is not None:
+            try:
+                generation = int(await self._redis.incr(generation_key(course_id)))
+            except Exception as e:
+                self._stats["redis_errors"] += 1
+                logger.warning(f"更新 Redis 查询缓存版本号失败: {e}")
+        self._generations[course_id] = (generation, time.monotonic())
+        return generation
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中率、节省的字节数等统计信息。"""
+        hits = self._stats["memory_hits"] + self._stats["redis_hits"]
+        lookups = hits + self._stats["misses"]
+        return {
+            **self._stats,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "redis_enabled": self._redis is not None,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+    async def _generation(self, course_id: str) -> int:
+        cached = self._generations.get(course_id)
+        if self._redis is None:
+            return cached[0] if cached else 0
+        if cached and time.monotonic() - cached[1] < self.generation_ttl:
+            return cached[0]
+        try:
+            raw = await self._redis.get(generation_key(course_id))
+            generation = int(raw) if raw is not None else 0
+        except Exception as e:
+            self._stats["redis_errors"] += 1
+            logger.warning(f"读取 Redis 查询缓存版本号失败: {e}")
+            generation = cached[0] if cached else 0
+        self._generations[course_id] = (generation, time.monotonic())
+        return generation
+
+    def _store(self, key: str, course_id: str, generation: int, value: str) -> bool:
+        nbytes = len(value.encode())
+        if nbytes > self.max_entry_bytes:
+            return False
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = _Entry(
+            course_id, generation, value, nbytes, time.monotonic() + self.ttl
+        )
+        self._bytes += nbytes
+        while self._bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self._stats["evictions"] += 1
+        return True
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
@@ -2,21 +2,38 @@ import argparse
 import logging
 import os
 
-import httpx
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
+from starlette.requests import Request
+from starlette.responses import JSONResponse
 
 from typing import Literal, Optional
 from pydantic import BaseModel
 
+try:
+    from .lightrag_http import get_lightrag_client
+    from .rag_cache import RagQueryCache
+except ImportError:  # 作为脚本直接运行
+    from lightrag_http import get_lightrag_client
+    from rag_cache import RagQueryCache
+
 # ---
 # 全局变量来存储 RAG URL 和 Authorization Token
 # 默认值
 RAG_URL = "http://localhost:9621/api"
+# 为空时服务以多租户模式运行，course_id 由每次调用的参数或请求头提供
 COURSE_ID: str = ""
+COURSE_ID_HEADER = "x-course-id"
 # ---
 
 mcp = FastMCP("Light RAG", "0.1.0")
 
+# 查询结果缓存，RAG_CACHE_ENABLED=false 时关闭
+query_cache = (
+    RagQueryCache.from_env()
+    if os.getenv("RAG_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    else None
+)
+
 
 class QueryParams(BaseModel):
     query: str
@@ -30,19 +47,46 @@ class QueryParams(BaseModel):
     max_token_for_local_context: int = 4000
 
 
-async def query_knowledge_base(params: QueryParams) -> str:
+def resolve_course_id(course_id: str = "", ctx: Optional[Context] = None) -> str:
+    """
+    按 调用参数 > 请求头 > 启动参数 的顺序确定本次调用的 course_id。
+    """
+    if course_id:
+        return course_id
+    if ctx is not None:
+        try:
+            request = ctx.request_context.request
+        except ValueError:
+            request = None
+        headers = getattr(request, "headers", None)
+        if headers and headers.get(COURSE_ID_HEADER):
+            return headers[COURSE_ID_HEADER]
+    if COURSE_ID:
+        return COURSE_ID
+    raise ValueError(
+        f"course_id 未提供：请通过工具参数、{COURSE_ID_HEADER} 请求头或 --course-id 指定。"
+    )
+
+
+async def query_knowledge_base(params: QueryParams, course_id: str) -> str:
     """
     更灵活的知识库查询工具，支持多种检索模式和自定义参数。
     """
     body = params.model_dump()
+    # bypass 模式直接调用 LLM，不走检索，不缓存
+    use_cache = query_cache is not None and params.mode != "bypass"
+    if use_cache:
+        cached = await query_cache.get(course_id, body)
+        if cached is not None:
+            return cached
     query = body.pop("query")
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                f"{RAG_URL}/query/{COURSE_ID}", json=body | {"query": query}
-            )
-            response.raise_for_status()
-            return response.text
+        response = await get_lightrag_client().request(
+            "query", "POST", f"{RAG_URL}/query/{course_id}", json=body | {"query": query}
+        )
+        if use_cache:
+            await query_cache.set(course_id, params.model_dump(), response.text)
+        return response.text
     except Exception as e:
         logging.error(f"RAG 查询失败: {e}")
         raise
@@ -50,7 +94,7 @@ async def query_knowledge_base(params: QueryParams) -> str:
 
 # 用法示例
 # params = QueryParams(query="什么是向量检索？", mode="mix", only_need_context=True)
-# await query_knowledge_base(params)
+# await query_knowledge_base(params, "course-1")
 @mcp.tool(
     name="rag_tool",
     description="""
@@ -62,6 +106,7 @@ async def query_knowledge_base(params: QueryParams) -> str:
 - only_need_prompt: 仅返回提示词信息
 - response_type: 返回的响应类型，支持 Multiple Paragraphs、Single Paragraph、Bullet Points
 - top_k: 返回结果的数量
+- course_id: 课程ID，多租户模式下由调用方注入，单课程模式下可省略
 """,
 )
 async def query_rag_tool(
@@ -71,6 +116,8 @@ async def query_rag_tool(
     only_need_prompt: bool = False,
     response_type: str = "Multiple Paragraphs",
     top_k: int = 10,
+    course_id: str = "",
+    ctx: Context = None,
 ) -> str:
     params = QueryParams(
         query=query,
@@ -80,14 +127,44 @@ async def query_rag_tool(
         response_type=response_type,
         top_k=top_k,
     )
-    return await query_knowledge_base(params)
+    return await query_knowledge_base(params, resolve_course_id(course_id, ctx))
+
+
+@mcp.custom_route("/stats", methods=["GET"])
+async def stats(request: Request) -> JSONResponse:
+    """LightRAG 连接池与查询缓存统计（仅 streamable-http 模式可访问）。"""
+    return JSONResponse(
+        {
+            "http_pool": get_lightrag_client().stats(),
+            "query_cache": query_cache.stats() if query_cache else None,
+        }
+    )
+
+
+@mcp.custom_route("/cache/invalidate/{course_id}", methods=["POST"])
+async def invalidate_cache(request: Request) -> JSONResponse:
+    """课程上传新文档后使其查询缓存失效（仅 streamable-http 模式可访问）。"""
+    course_id = request.path_params["course_id"]
+    generation = await query_cache.invalidate(course_id) if query_cache else None
+    return JSONResponse({"course_id": course_id, "generation": generation})
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run the Light RAG MCP server.")
     parser.add_argument(
-        "--course-id", type=str, default=None, help="Course id for the RAG service."
+        "--course-id",
+        type=str,
+        default=None,
+        help="Course id for the RAG service. Omit to serve every course from one process.",
+    )
+    parser.add_argument(
+        "--transport",
+        choices=["stdio", "streamable-http"],
+        default="stdio",
+        help="MCP transport. Use streamable-http to share one server between graph workers.",
     )
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
     parser.add_argument(
         "--rag-url",
         type=str,
@@ -108,8 +185,8 @@ if __name__ == "__main__":
     if args.course_id:
         COURSE_ID = args.course_id
     else:
-        logging.error(
-            "COURSE ID must be provided either as a command line argument or through the COURSE_ID environment variable."
-        )
+        logging.info("未指定 --course-id，以多租户模式运行，course_id 由每次调用提供。")
 
-    mcp.run(transport="stdio")
+    mcp.settings.host = args.host
+    mcp.settings.port = args.port
+    mcp.run(transport=args.transport)
@@ -0,0 +1,336 @@
+"""按 course_id 复用的长连接 MCP 会话池。
+
+每个课程的 RAG MCP 服务只在第一次使用时启动一次，之后所有图共享同一个会话，
+避免每次检索都冷启动一个 `uv run rag_tools.py` 子进程。
+
+设置 `RAG_MCP_URL` 后改为连接一个以 streamable-http 方式运行的多租户 RAG MCP 服务，
+所有课程共用一个会话，course_id 作为工具参数注入。
+"""
+
+import asyncio
+import copy
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+import anyio
+from langchain_core.tools import BaseTool, StructuredTool
+from langchain_mcp_adapters.sessions import Connection, create_session
+from langchain_mcp_adapters.tools import load_mcp_tools
+from mcp import ClientSession
+from mcp.shared.exceptions import McpError
+
+logger = logging.getLogger(__name__)
+
+# 会话断开、子进程崩溃时可能抛出的异常，遇到这些异常会重建会话并重试一次
+_CONNECTION_ERRORS = (
+    McpError,
+    anyio.ClosedResourceError,
+    anyio.BrokenResourceError,
+    anyio.EndOfStream,
+    ConnectionError,
+    OSError,
+)
+
+# 多租户模式下所有课程共享的会话 key
+SHARED_SESSION_KEY = "__shared__"
+
+
+def _session_kwargs() -> Dict[str, Any]:
+    return {
+        "read_timeout_seconds": timedelta(
+            seconds=float(os.getenv("RAG_MCP_CALL_TIMEOUT", 120))
+        )
+    }
+
+
+def rag_stdio_connection(course_id: str) -> Connection:
+    """为指定课程构造 stdio 方式启动的 RAG MCP 服务连接配置。"""
+    return {
+        "command": "uv",
+        "args": [
+            "run",
+            "src/agent/mcp/rag_tools.py",
+            "--course-id",
+            f"{course_id}",
+        ],
+        "transport": "stdio",
+        "session_kwargs": _session_kwargs(),
+    }
+
+
+def rag_http_connection(_key: str) -> Connection:
+    """连接 `RAG_MCP_URL` 指向的多租户 RAG MCP 服务（streamable-http）。"""
+    return {
+        "transport": "streamable_http",
+        "url": os.environ["RAG_MCP_URL"],
+        "session_kwargs": _session_kwargs(),
+    }
+
+
+@dataclass
+class _PooledSession:
+    key: str
+    session: Optional[ClientSession] = None
+    tools: Dict[str, BaseTool] = field(default_factory=dict)
+    task: Optional[asyncio.Task] = None
+    closing: asyncio.Event = field(default_factory=asyncio.Event)
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    last_checked: float = field(default_factory=time.monotonic)
+    in_use: int = 0
+
+    @property
+    def alive(self) -> bool:
+        return (
+            self.session is not None
+            and self.task is not None
+            and not self.task.done()
+            and not self.closing.is_set()
+        )
+
+
+class MCPSessionPool:
+    """以 key（通常是 course_id）为索引的 MCP 会话池。
+
+    - 空闲超过 `idle_ttl` 秒的会话会被回收；
+    - 会话数超过 `max_size` 时按最近最少使用淘汰空闲会话；
+    - 空闲超过 `health_check_interval` 秒的会话在复用前先 ping 一次；
+    - 调用过程中连接断开时自动重建会话并重试一次。
+    """
+
+    def __init__(
+        self,
+        connection_factory: Callable[[str], Connection],
+        max_size: int = 32,
+        idle_ttl: float = 600.0,
+        health_check_interval: float = 30.0,
+        health_check_timeout: float = 5.0,
+    ):
+        self._connection_factory = connection_factory
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        self._entries: Dict[str, _PooledSession] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "spawns": 0,
+            "spawn_failures": 0,
+            "reconnects": 0,
+            "health_check_failures": 0,
+            "evictions_idle": 0,
+            "evictions_capacity": 0,
+            "evictions_unhealthy": 0,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中/未命中、子进程启动次数等统计信息。"""
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "size": len(self._entries),
+            "in_use": sum(e.in_use for e in self._entries.values()),
+            "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+        }
+
+    async def get_tools(
+        self, key: str, bound_args: Optional[Dict[str, Any]] = None
+    ) -> List[BaseTool]:
+        """返回绑定到池中会话的 LangChain 工具。
+
+        返回的工具不持有具体会话，每次调用时再从池中取会话，
+        因此会话被回收或重建后工具依然可用。`bound_args` 中的参数会从工具
+        schema 中移除，并在每次调用时自动注入（例如多租户服务的 course_id）。
+        """
+        entry = await self._acquire(key)
+        return [
+            self._make_pooled_tool(key, tool, bound_args or {})
+            for tool in entry.tools.values()
+        ]
+
+    async def call_tool(self, key: str, name: str, arguments: Dict[str, Any]) -> Any:
+        """在 key 对应的会话上调用工具，连接异常时重建会话并重试一次。"""
+        for attempt in range(2):
+            entry = await self._acquire(key)
+            entry.in_use += 1
+            try:
+                return await entry.tools[name].coroutine(**arguments)
+            except _CONNECTION_ERRORS as e:
+                if attempt:
+                    raise
+                logger.warning(f"MCP 会话 {key} 调用 {name} 失败，重建会话后重试: {e}")
+                self._stats["reconnects"] += 1
+                await self._evict(key, "evictions_unhealthy")
+            finally:
+                entry.in_use -= 1
+                entry.last_used = time.monotonic()
+
+    async def evict(self, key: str) -> None:
+        """主动关闭并移除 key 对应的会话。"""
+        await self._evict(key, None)
+
+    async def close(self) -> None:
+        """关闭池中所有会话。"""
+        for key in list(self._entries):
+            await self._evict(key, None)
+
+    def _make_pooled_tool(
+        self, key: str, tool: BaseTool, bound_args: Dict[str, Any]
+    ) -> BaseTool:
+        args_schema = tool.args_schema
+        bound_args = {
+            k: v
+            for k, v in bound_args.items()
+            if isinstance(args_schema, dict) and k in args_schema.get("properties", {})
+        }
+        if bound_args:
+            args_schema = copy.deepcopy(args_schema)
+            for k in bound_args:
+                args_schema["properties"].pop(k, None)
+                if k in args_schema.get("required", []):
+                    args_schema["required"].remove(k)
+
+        async def call_tool(**arguments: Any) -> Any:
+            return await self.call_tool(key, tool.name, arguments | bound_args)
+
+        return StructuredTool(
+            name=tool.name,
+            description=tool.description,
+            args_schema=args_schema,
+            coroutine=call_tool,
+            response_format="content_and_artifact",
+            metadata=tool.metadata,
+        )
+
+    async def _acquire(self, key: str) -> _PooledSession:
+        await self._sweep()
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.alive and await self._is_healthy(entry):
+                self._stats["hits"] += 1
+                entry.last_used = time.monotonic()
+                return entry
+            if entry is not None:
+                await self._evict(key, "evictions_unhealthy")
+            self._stats["misses"] += 1
+            await self._make_room()
+            entry = await self._spawn(key)
+            self._entries[key] = entry
+            return entry
+
+    async def _is_healthy(self, entry: _PooledSession) -> bool:
+        now = time.monotonic()
+        if entry.in_use or now - entry.last_checked < self.health_check_interval:
+            return True
+        try:
+            await asyncio.wait_for(
+                entry.session.send_ping(), timeout=self.health_check_timeout
+            )
+        except Exception as e:
+            logger.warning(f"MCP 会话 {entry.key} 健康检查失败: {e}")
+            self._stats["health_check_failures"] += 1
+            return False
+        entry.last_checked = now
+        return True
+
+    async def _spawn(self, key: str) -> _PooledSession:
+        entry = _PooledSession(key=key)
+        ready = asyncio.get_running_loop().create_future()
+        # 会话上下文必须在同一个任务中进入和退出，因此放到独立的后台任务里持有
+        entry.task = asyncio.create_task(
+            self._hold_session(entry, ready), name=f"mcp-session-{key}"
+        )
+        try:
+            await ready
+        except BaseException:
+            self._stats["spawn_failures"] += 1
+            entry.closing.set()
+            raise
+        self._stats["spawns"] += 1
+        logger.info(f"已为 {key} 启动 MCP 会话")
+        return entry
+
+    async def _hold_session(
+        self, entry: _PooledSession, ready: asyncio.Future
+    ) -> None:
+        try:
+            async with create_session(self._connection_factory(entry.key)) as session:
+                await session.initialize()
+                tools = await load_mcp_tools(session)
+                entry.session = session
+                entry.tools = {tool.name: tool for tool in tools}
+                ready.set_result(None)
+                await entry.closing.wait()
+        except BaseException as e:
+            if not ready.done():
+                ready.set_exception(e)
+            elif not isinstance(e, asyncio.CancelledError):
+                logger.warning(f"MCP 会话 {entry.key} 异常退出: {e}")
+        finally:
+            entry.closing.set()
+
+    async def _sweep(self) -> None:
+        now = time.monotonic()
+        for key, entry in list(self._entries.items()):
+            if not entry.in_use and now - entry.last_used > self.idle_ttl:
+                await self._evict(key, "evictions_idle")
+
+    async def _make_room(self) -> None:
+        while len(self._entries) >= self.max_size:
+            idle = [e for e in self._entries.values() if not e.in_use]
+            if not idle:
+                # 所有会话都在使用中，暂时允许超出上限
+                return
+            victim = min(idle, key=lambda e: e.last_used)
+            await self._evict(victim.key, "evictions_capacity")
+
+    async def _evict(self, key: str, reason: Optional[str]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        if reason:
+            self._stats[reason] += 1
+        entry.closing.set()
+        if entry.task is not None:
+            try:
+                await asyncio.wait_for(entry.task, timeout=self.health_check_timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                entry.task.cancel()
+            except Exception as e:
+                logger.debug(f"关闭 MCP 会话 {key} 时出错: {e}")
+
+
+_rag_pool: Optional[MCPSessionPool] = None
+_rag_pool_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_rag_session_pool() -> MCPSessionPool:
+    """返回当前事件循环上进程共享的 RAG MCP 会话池。"""
+    global _rag_pool, _rag_pool_loop
+    loop = asyncio.get_running_loop()
+    if _rag_pool is None or _rag_pool_loop is not loop:
+        _rag_pool = MCPSessionPool(
+            rag_http_connection if os.getenv("RAG_MCP_URL") else rag_stdio_connection,
+            max_size=int(os.getenv("RAG_MCP_POOL_MAX_SIZE", 32)),
+            idle_ttl=float(os.getenv("RAG_MCP_POOL_IDLE_TTL", 600)),
+            health_check_interval=float(
+                os.getenv("RAG_MCP_POOL_HEALTH_CHECK_INTERVAL", 30)
+            ),
+        )
+        _rag_pool_loop = loop
+    return _rag_pool
+
+
+async def get_pooled_rag_tools(course_id: str) -> List[BaseTool]:
+    """从共享会话池获取某门课程的 RAG 工具，course_id 已绑定到工具调用中。"""
+    key = SHARED_SESSION_KEY if os.getenv("RAG_MCP_URL") else course_id
+    return await get_rag_session_pool().get_tools(
+        key, bound_args={"course_id": course_id}
+    )
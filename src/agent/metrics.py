@@ -0,0 +1,284 @@
+"""图节点与模型调用的耗时、token、错误指标，以 Prometheus 文本格式导出。
+
+`MetricsCallbackHandler` 通过 LangChain 的 configure hook 挂到进程内的每一次运行上
+（包括 LangGraph 服务直接加载的图和注册表中的子图），记录：
+
+- 每个节点的耗时与错误数（标签 graph、node）；
+- 每次模型调用的耗时、prompt/completion token、费用与错误数（标签 graph、model）；
+- 模型请求在限流器中的排队时间（标签 model，由 `rate_limit` 上报）。
+
+标签取值都有上限：graph 只取注册表中的图名，每个图最多 `MAX_NODES_PER_GRAPH`
+个节点名、全局最多 `MAX_MODELS` 个模型名，超出的归为 ``other``。
+设置 ``AGENT_METRICS=false`` 可关闭采集。
+"""
+
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.tracers.context import register_configure_hook
+from langgraph.errors import GraphBubbleUp
+
+from src.agent.graph_registry import GRAPH_BUILDERS
+
+MAX_NODES_PER_GRAPH = 64
+MAX_MODELS = 32
+OTHER = "other"
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+QUEUE_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: LabelValues, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        buckets: Sequence[float] = DURATION_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # 每组标签：各桶计数（不累计）、总和、总数
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: LabelValues, value: float) -> None:
+        with self._lock:
+            counts, totals = self._values.setdefault(
+                labels, ([0] * (len(self.buckets) + 1), [0.0, 0.0])
+            )
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        with self._lock:
+            for labels, (counts, (total, count)) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, c in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += c
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    lines.append(
+                        f"{self.name}_bucket{_format_labels(names, labels + (le,))} {cumulative}"
+                    )
+                label_str = _format_labels(self.labelnames, labels)
+                lines.append(f"{self.name}_sum{label_str} {total}")
+                lines.append(f"{self.name}_count{label_str} {int(count)}")
+        return lines
+
+
+NODE_DURATION = Histogram(
+    "agent_node_duration_seconds", "Wall time of graph node executions.", ("graph", "node")
+)
+NODE_ERRORS = Counter(
+    "agent_node_errors_total", "Graph node executions that raised.", ("graph", "node")
+)
+LLM_DURATION = Histogram(
+    "agent_llm_duration_seconds", "Wall time of chat model calls.", ("graph", "model")
+)
+LLM_QUEUE = Histogram(
+    "agent_llm_queue_seconds",
+    "Time chat model requests waited in the rate limiter.",
+    ("model",),
+    QUEUE_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "agent_llm_tokens_total", "Tokens used by chat model calls.", ("graph", "model", "type")
+)
+LLM_COST = Counter(
+    "agent_llm_cost_total", "Estimated cost of chat model calls (LLM_PRICES unit).", ("graph", "model")
+)
+LLM_ERRORS = Counter(
+    "agent_llm_errors_total", "Chat model calls that raised.", ("graph", "model")
+)
+
+METRICS = (NODE_DURATION, NODE_ERRORS, LLM_DURATION, LLM_QUEUE, LLM_TOKENS, LLM_COST, LLM_ERRORS)
+
+_label_lock = threading.Lock()
+_nodes: Dict[str, set] = {}
+_models: set = set()
+
+
+def _graph_label(metadata: Optional[Dict[str, Any]]) -> str:
+    graph = (metadata or {}).get("graph_id")
+    return graph if graph in GRAPH_BUILDERS else OTHER
+
+
+def _bounded(value: Optional[str], seen: set, limit: int) -> str:
+    if not value:
+        return OTHER
+    with _label_lock:
+        if value in seen:
+            return value
+        if len(seen) >= limit:
+            return OTHER
+        seen.add(value)
+        return value
+
+
+def _node_label(graph: str, node: str) -> str:
+    with _label_lock:
+        seen = _nodes.setdefault(graph, set())
+    return _bounded(node, seen, MAX_NODES_PER_GRAPH)
+
+
+def _model_label(model: Optional[str]) -> str:
+    return _bounded(model, _models, MAX_MODELS)
+
+
+def _prices() -> Dict[str, Tuple[float, float]]:
+    """``LLM_PRICES``：{"模型名": [每千 prompt token 价格, 每千 completion token 价格]}。"""
+    return {k: tuple(v) for k, v in json.loads(os.getenv("LLM_PRICES", "{}") or "{}").items()}
+
+
+def observe_queue(model: str, seconds: float) -> None:
+    """记录模型请求在限流器中的排队时间。"""
+    LLM_QUEUE.observe((_model_label(model),), seconds)
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """把节点与模型调用的耗时、token、错误写入模块级指标。"""
+
+    run_inline = True
+
+    def __init__(self):
+        self._runs: Dict[UUID, Tuple[float, LabelValues]] = {}
+        self._prices = _prices()
+
+    def on_chain_start(
+        self,
+        serialized: Dict[str, Any],
+        inputs: Dict[str, Any],
+        *,
+        run_id: UUID,
+        tags: Optional[List[str]] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        # 只统计节点本身的运行：LangGraph 给节点任务打上 graph:step:N 标签
+        node = (metadata or {}).get("langgraph_node")
+        if node is None or kwargs.get("name") != node:
+            return
+        if not any(t.startswith("graph:step:") for t in tags or ()):
+            return
+        graph = _graph_label(metadata)
+        self._runs[run_id] = (time.perf_counter(), (graph, _node_label(graph, node)))
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            NODE_DURATION.observe(run[1], time.perf_counter() - run[0])
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        NODE_DURATION.observe(run[1], time.perf_counter() - run[0])
+        # 中断、Command 跳转等控制流异常不算错误
+        if not isinstance(error, GraphBubbleUp):
+            NODE_ERRORS.inc(run[1])
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[Any]],
+        *,
+        run_id: UUID,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        model = (metadata or {}).get("ls_model_name")
+        labels = (_graph_label(metadata), _model_label(model))
+        self._runs[run_id] = (time.perf_counter(), labels)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        labels = run[1]
+        LLM_DURATION.observe(labels, time.perf_counter() - run[0])
+        prompt_tokens, completion_tokens = 0, 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    prompt_tokens += usage.get("input_tokens", 0)
+                    completion_tokens += usage.get("output_tokens", 0)
+        LLM_TOKENS.inc(labels + ("prompt",), prompt_tokens)
+        LLM_TOKENS.inc(labels + ("completion",), completion_tokens)
+        price = self._prices.get(labels[1])
+        if price:
+            LLM_COST.inc(labels, (prompt_tokens * price[0] + completion_tokens * price[1]) / 1000)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            LLM_DURATION.observe(run[1], time.perf_counter() - run[0])
+            LLM_ERRORS.inc(run[1])
+
+
+def render() -> str:
+    """按 Prometheus 文本格式输出全部指标。"""
+    lines: List[str] = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+_handler: Optional[MetricsCallbackHandler] = None
+if os.getenv("AGENT_METRICS", "true").lower() == "true":
+    _handler = MetricsCallbackHandler()
+
+# 上下文变量默认值即为共享的 handler，使其自动加入每一次运行的回调
+metrics_handler_var: ContextVar[Optional[MetricsCallbackHandler]] = ContextVar(
+    "agent_metrics_handler", default=_handler
+)
+register_configure_hook(metrics_handler_var, inheritable=True)
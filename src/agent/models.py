@@ -0,0 +1,164 @@
+"""按逻辑角色分配的聊天模型。
+
+各个图不再各自在导入时 `init_chat_model(...)`，而是通过 `get_model(role)` 取模型：
+
+- 模型在第一次使用时才创建，并按角色和覆盖参数缓存，之后复用同一个实例；
+- 所有模型共用一组 httpx 连接池，跨图、跨角色复用到 DashScope 的连接；
+- 每个角色的模型名、温度、地址可以用环境变量 ``LLM_<ROLE>_MODEL`` /
+  ``LLM_<ROLE>_TEMPERATURE`` / ``LLM_<ROLE>_BASE_URL`` / ``LLM_<ROLE>_API_KEY``
+  覆盖，单次运行也可以在 ``configurable["models"][role]`` 中覆盖；
+- 连接池的传输层按模型限流（见 `rate_limit`），设置 ``LLM_GOVERNOR=false`` 可关闭；
+- 设置 ``LLM_CACHE=true`` 后温度为 0 的角色会缓存调用结果（见 `llm_cache`）。
+- 流式调用同样请求返回 usage（``stream_usage``），token 与费用指标不会漏掉流式回答。
+"""
+
+import os
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+from langchain.chat_models import init_chat_model
+from langchain_core.language_models import BaseChatModel
+
+from src.agent.llm_cache import get_response_cache
+from src.agent.rate_limit import GovernedAsyncTransport, GovernedTransport
+
+DEFAULT_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    model: str
+    temperature: float = 0.0
+    # None 表示不发送 enable_thinking（部分模型不支持该参数）
+    enable_thinking: Optional[bool] = False
+    base_url: Optional[str] = None
+    api_key: Optional[str] = None
+
+
+ROLES: Dict[str, ModelSpec] = {
+    # 规划、结构化抽取等主力任务
+    "planner": ModelSpec("qwen3-235b-a22b"),
+    # RAG 代理的检索决策与回答
+    "responder": ModelSpec("qwen3-235b-a22b"),
+    # 检索结果相关性评分
+    "grader": ModelSpec("qwen3-235b-a22b"),
+    # 逐步执行计划、工具调用
+    "executor": ModelSpec("qwen3-30b-a3b"),
+    # 步骤摘要、批改报告中错误模式的分块归纳
+    "summarizer": ModelSpec("qwen3-14b"),
+    # 代码生成、数学表达式抽取
+    "coder": ModelSpec("qwen2.5-coder-32b-instruct", enable_thinking=None),
+    # 批改初审，稍微增加一点多样性
+    "reviewer": ModelSpec("qwen-plus", temperature=0.2),
+    # 批改仲裁与报告，追求最准确的结果
+    "arbitrator": ModelSpec("qwen-max"),
+    # 教案最终整合
+    "finalizer": ModelSpec("qwen-plus"),
+}
+
+_models: Dict[Tuple[str, Tuple[Tuple[str, Any], ...]], BaseChatModel] = {}
+_http_client: Optional[httpx.Client] = None
+_http_async_client: Optional[httpx.AsyncClient] = None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", 200)),
+        max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE", 50)),
+        keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", 60)),
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(float(os.getenv("LLM_TIMEOUT", 600)), connect=10.0)
+
+
+def _governed() -> bool:
+    return os.getenv("LLM_GOVERNOR", "true").lower() == "true"
+
+
+def shared_http_client() -> httpx.Client:
+    """所有模型共用的同步连接池。"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        transport = httpx.HTTPTransport(limits=_limits())
+        if _governed():
+            transport = GovernedTransport(transport)
+        _http_client = httpx.Client(transport=transport, timeout=_timeout())
+    return _http_client
+
+
+def shared_http_async_client() -> httpx.AsyncClient:
+    """所有模型共用的异步连接池。"""
+    global _http_async_client
+    if _http_async_client is None or _http_async_client.is_closed:
+        transport = httpx.AsyncHTTPTransport(limits=_limits())
+        if _governed():
+            transport = GovernedAsyncTransport(transport)
+        _http_async_client = httpx.AsyncClient(transport=transport, timeout=_timeout())
+    return _http_async_client
+
+
+def role_spec(role: str, overrides: Optional[Dict[str, Any]] = None) -> ModelSpec:
+    """返回角色的模型配置：默认值 < 环境变量 < `overrides`。"""
+    if role not in ROLES:
+        raise KeyError(f"未知的模型角色: {role}")
+    spec = ROLES[role]
+    prefix = f"LLM_{role.upper()}_"
+    env = {
+        "model": os.getenv(prefix + "MODEL"),
+        "temperature": os.getenv(prefix + "TEMPERATURE"),
+        "base_url": os.getenv(prefix + "BASE_URL"),
+        "api_key": os.getenv(prefix + "API_KEY"),
+    }
+    if env["temperature"] is not None:
+        env["temperature"] = float(env["temperature"])
+    spec = replace(spec, **{k: v for k, v in env.items() if v is not None})
+    if overrides:
+        spec = replace(spec, **overrides)
+    return spec
+
+
+def _build(spec: ModelSpec) -> BaseChatModel:
+    kwargs: Dict[str, Any] = {}
+    if spec.enable_thinking is not None:
+        kwargs["extra_body"] = {"enable_thinking": spec.enable_thinking}
+    # 只有确定性的调用才值得缓存
+    cache = get_response_cache() if spec.temperature == 0 else None
+    if cache is not None:
+        kwargs["cache"] = cache
+    return init_chat_model(
+        model=spec.model,
+        model_provider="openai",
+        temperature=spec.temperature,
+        api_key=spec.api_key or os.getenv("DASH_SCOPE_API_KEY", ""),
+        base_url=spec.base_url or os.getenv("DASH_SCOPE_API_URL", DEFAULT_BASE_URL),
+        http_client=shared_http_client(),
+        http_async_client=shared_http_async_client(),
+        # 流式响应的最后一个数据块带上 usage，供 token 指标和限流器校正 TPM
+        stream_usage=True,
+        **kwargs,
+    )
+
+
+def get_model(role: str, config: Optional[dict] = None) -> BaseChatModel:
+    """按角色返回模型实例，首次调用时创建。
+
+    Args:
+        role: `ROLES` 中的角色名
+        config: 运行配置，`configurable["models"][role]` 中的字段会覆盖该角色的配置
+    """
+    overrides = ((config or {}).get("configurable", {}).get("models") or {}).get(role)
+    key = (role, tuple(sorted((overrides or {}).items())))
+    model = _models.get(key)
+    if model is None:
+        model = _models.setdefault(key, _build(role_spec(role, overrides)))
+    return model
+
+
+def register_model(role: str, model: BaseChatModel) -> None:
+    """直接指定某个角色使用的模型实例（用于基准测试中的桩模型等）。"""
+    for key in [k for k in _models if k[0] == role]:
+        del _models[key]
+    _models[(role, ())] = model
@@ -0,0 +1,98 @@
+"""客观题（单选、多选）的确定性批改。
+
+题目自带选项的 `isCorrect` 和 `correctAnswer`，客观题不需要调用模型：把学生作答解析成
+选项标签集合，与正确选项比较即可。多选题少选时的得分由 `MultipleChoiceScoring` 决定，
+错选一律不得分。
+"""
+
+import re
+import unicodedata
+from enum import Enum
+from typing import Iterable, Set, Tuple
+
+OBJECTIVE_TYPES = {"single_choice", "multiple_choice"}
+
+_LABELS_ONLY = re.compile(r"[A-Z](?:[\s,，、;；/]*[A-Z])*")
+_LEADING_LABEL = re.compile(r"([A-Z])\s*[\.．、:：)）]")
+
+
+class MultipleChoiceScoring(str, Enum):
+    all_or_nothing = "all_or_nothing"  # 少选不得分
+    fixed = "fixed"  # 少选得固定的部分分
+    proportional = "proportional"  # 少选按选对的比例得分
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text or "")).strip().upper()
+
+
+def is_objective(question) -> bool:
+    return getattr(question.questionType, "value", question.questionType) in OBJECTIVE_TYPES
+
+
+def correct_labels(question) -> Set[str]:
+    """正确选项的标签：优先取选项上的 isCorrect，没有时解析 correctAnswer。"""
+    labels = {_normalize(o.optionLabel) for o in question.options if o.isCorrect}
+    return labels or parse_choice(question.correctAnswer, question.options)
+
+
+def parse_choice(answer: str, options: Iterable) -> Set[str]:
+    """把作答解析成选项标签集合。
+
+    支持 ``"A,B,D"``、``"ABD"``、``"b、d"``、``"B. 调整亮度"`` 以及直接填写选项原文；
+    无法识别时返回空集合。
+    """
+    options = list(options)
+    valid = {_normalize(o.optionLabel): o for o in options}
+    text = _normalize(answer)
+    if not text:
+        return set()
+    if _LABELS_ONLY.fullmatch(text):
+        labels = set(re.findall(r"[A-Z]", text))
+        # 选项原文本身也可能全是字母（如 "CPU"），不全是有效标签时继续按原文匹配
+        if labels <= valid.keys():
+            return labels
+    match = _LEADING_LABEL.match(text)
+    if match and match.group(1) in valid:
+        return {match.group(1)}
+    for label, option in valid.items():
+        if _normalize(option.optionText) == text:
+            return {label}
+    return set()
+
+
+def _fmt(labels: Iterable[str]) -> str:
+    return ",".join(sorted(labels))
+
+
+def grade_choice(
+    question,
+    answer: str,
+    scoring: MultipleChoiceScoring = MultipleChoiceScoring.fixed,
+    partial_score: float = 0.5,
+) -> Tuple[float, str]:
+    """批改一道单选或多选题，返回 (分数, 评语)，分数在 [0, 1] 之间。"""
+    correct = correct_labels(question)
+    chosen = parse_choice(answer, question.options)
+    explanation = f"解析：{question.answerExplanation}" if question.answerExplanation else ""
+
+    if not chosen:
+        return 0.0, f"未能识别作答中的选项，正确答案为 {_fmt(correct)}。{explanation}"
+    if chosen == correct:
+        return 1.0, f"回答正确，正确答案为 {_fmt(correct)}。"
+
+    wrong, missing = chosen - correct, correct - chosen
+    detail = f"正确答案为 {_fmt(correct)}，你的答案为 {_fmt(chosen)}"
+    if wrong:
+        detail += f"，错选 {_fmt(wrong)}"
+    if missing:
+        detail += f"，漏选 {_fmt(missing)}"
+    single = getattr(question.questionType, "value", question.questionType) == "single_choice"
+    if single or wrong or scoring == MultipleChoiceScoring.all_or_nothing:
+        score = 0.0
+    elif scoring == MultipleChoiceScoring.fixed:
+        score = partial_score
+    else:
+        score = len(chosen) / len(correct)
+    verdict = "回答错误" if score == 0 else "回答部分正确"
+    return score, f"{verdict}，{detail}。{explanation}"
@@ -0,0 +1,233 @@
+"""学生答案之间的雷同检测（MinHash + LSH）。
+
+两两比较所有答案是 O(n²) 的，大班级或整场考试的答案数上万时不可行。这里把每份答案
+规范化后切成字符 n-gram（对中文同样有效），用 MinHash 压缩为固定长度的签名，再按
+LSH 分段（band）分桶：只有至少一段签名完全相同的答案才成为候选对，候选对再计算
+精确的 Jaccard 相似度，达到阈值的用并查集合并成雷同组。整体耗时近似线性。
+
+与标准答案本身高度相似的答案不计入（大家都照着标准答案写不算雷同），过短的答案也不参与检测。
+"""
+
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+
+import numpy as np
+
+from src.agent.answer_clustering import normalize_answer
+
+_PRIME = np.uint64(4294967311)  # 大于 2^32 的最小素数，a·h + b 不会溢出 uint64
+_CHUNK_COLUMNS = 1 << 16
+
+
+def _compact(text: str) -> str:
+    return normalize_answer(text).replace(" ", "")
+
+
+def shingles(text: str, n: int = 5, normalized: bool = False) -> Set[int]:
+    """规范化后去掉空白的字符 n-gram 的 CRC32 集合，不足 n 个字符时整体作为一个 shingle。
+
+    `normalized` 为 true 时认为 `text` 已经过 `_compact`。
+    """
+    if not normalized:
+        text = _compact(text)
+    if len(text) <= n:
+        return {zlib.crc32(text.encode())} if text else set()
+    return {zlib.crc32(text[i : i + n].encode()) for i in range(len(text) - n + 1)}
+
+
+def jaccard(a: Set[int], b: Set[int]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """固定种子的 MinHash：`num_perm` 个 (a·h + b) mod p 形式的哈希函数。"""
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)[:, None]
+        self.b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)[:, None]
+
+    def signatures(self, shingle_sets: Sequence[Set[int]]) -> np.ndarray:
+        """返回 (答案数, num_perm) 的签名矩阵，空集合的签名为全 p。
+
+        所有答案的 shingle 拼成一个数组，按列分块计算哈希后用 `minimum.reduceat`
+        一次求出每份答案的最小值。
+        """
+        lengths = np.fromiter((len(s) for s in shingle_sets), dtype=np.int64, count=len(shingle_sets))
+        signatures = np.full((len(shingle_sets), self.num_perm), _PRIME, dtype=np.uint64)
+        if not lengths.sum():
+            return signatures
+        values = np.fromiter(
+            (h for s in shingle_sets for h in s), dtype=np.uint64, count=int(lengths.sum())
+        )
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        nonempty = np.flatnonzero(lengths)
+        # 按答案边界分块，使每块的哈希矩阵不超过约 num_perm × _CHUNK_COLUMNS
+        block_start = 0
+        while block_start < len(nonempty):
+            first = starts[nonempty[block_start]]
+            block_end = int(
+                np.searchsorted(starts[nonempty], first + _CHUNK_COLUMNS, side="right")
+            )
+            block_end = max(block_end, block_start + 1)
+            rows = nonempty[block_start:block_end]
+            last = starts[rows[-1]] + lengths[rows[-1]]
+            hashed = (self.a * values[first:last] + self.b) % _PRIME
+            signatures[rows] = np.minimum.reduceat(hashed, starts[rows] - first, axis=1).T
+            block_start = block_end
+        return signatures
+
+
+def lsh_params(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """选择 (bands, rows)：在能整除 num_perm 的组合中，取 S 曲线拐点 (1/b)^(1/r) 最接近
+    且不高于阈值的一组，宁可多一些候选对也不漏掉。"""
+    best = (num_perm, 1)
+    best_gap = float("inf")
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        knee = (1 / bands) ** (1 / rows)
+        if knee <= threshold and threshold - knee < best_gap:
+            best, best_gap = (bands, rows), threshold - knee
+    return best
+
+
+def candidate_pairs(
+    signatures: np.ndarray, bands: int, rows: int, max_bucket: int = 50
+) -> np.ndarray:
+    """LSH 分段分桶，返回 (候选对数, 2) 的下标数组（i < j，已去重）。
+
+    桶内答案数超过 `max_bucket` 时只把其余答案与桶内第一份配对，避免单个大桶产生平方级的候选对。
+    """
+    n = len(signatures)
+    pairs: List[np.ndarray] = []
+    for band in range(bands):
+        chunk = np.ascontiguousarray(signatures[:, band * rows : (band + 1) * rows])
+        keys = chunk.view(np.dtype((np.void, chunk.dtype.itemsize * rows))).ravel()
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        same = sorted_keys[1:] == sorted_keys[:-1]
+        if not same.any():
+            continue
+        # 只处理有重复键的桶：same 中连续为 true 的一段对应一个桶
+        edges = np.diff(np.concatenate(([0], same.astype(np.int8), [0])))
+        for first, last in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+            bucket = order[first : last + 1]
+            if len(bucket) <= max_bucket:
+                i, j = np.triu_indices(len(bucket), k=1)
+                pairs.append(np.stack([bucket[i], bucket[j]], axis=1))
+            else:
+                pairs.append(np.stack([np.full(len(bucket) - 1, bucket[0]), bucket[1:]], axis=1))
+    if not pairs:
+        return np.zeros((0, 2), dtype=np.int64)
+    found = np.sort(np.concatenate(pairs), axis=1)
+    found = np.unique(found[:, 0] * n + found[:, 1])
+    return np.stack(np.divmod(found, n), axis=1)
+
+
+@dataclass
+class OverlapCluster:
+    """一组内容雷同的答案。"""
+
+    student_ids: List[str]
+    similarity: float  # 组内已确认的相似答案对的平均 Jaccard 相似度
+    max_similarity: float
+    excerpt: str  # 组内第一份答案的开头
+
+
+def detect_overlaps(
+    answers: Iterable[Tuple[str, str]],
+    threshold: float = 0.8,
+    ngram: int = 5,
+    num_perm: int = 128,
+    min_chars: int = 30,
+    references: Sequence[str] = (),
+) -> List[OverlapCluster]:
+    """检测 (student_id, answer) 列表中的雷同答案，按组大小、相似度从高到低返回。
+
+    Args:
+        threshold: Jaccard 相似度阈值
+        ngram: 字符 n-gram 长度
+        num_perm: MinHash 签名长度
+        min_chars: 规范化后少于这么多字符的答案不参与检测
+        references: 标准答案等参考文本，与其相似度达到阈值的答案不参与检测
+    """
+    reference_sets = [shingles(r, ngram) for r in references if r]
+    ids: List[str] = []
+    texts: List[str] = []
+    sets: List[Set[int]] = []
+    for student_id, answer in answers:
+        compact = _compact(answer)
+        if len(compact) < min_chars:
+            continue
+        shingle_set = shingles(compact, ngram, normalized=True)
+        if any(jaccard(shingle_set, ref) >= threshold for ref in reference_sets):
+            continue
+        ids.append(student_id)
+        texts.append(answer)
+        sets.append(shingle_set)
+    if len(sets) < 2:
+        return []
+
+    signatures = MinHasher(num_perm).signatures(sets)
+    bands, rows = lsh_params(num_perm, threshold)
+    parent = list(range(len(sets)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    confirmed: List[Tuple[int, int, float]] = []
+    for i, j in candidate_pairs(signatures, bands, rows).tolist():
+        similarity = jaccard(sets[i], sets[j])
+        if similarity >= threshold:
+            confirmed.append((i, j, similarity))
+            parent[find(i)] = find(j)
+
+    scores: Dict[int, List[float]] = {}
+    for i, _, similarity in confirmed:
+        scores.setdefault(find(i), []).append(similarity)
+    members: Dict[int, List[int]] = {}
+    for i in range(len(sets)):
+        root = find(i)
+        if root in scores:
+            members.setdefault(root, []).append(i)
+
+    clusters = [
+        OverlapCluster(
+            student_ids=[ids[i] for i in group],
+            similarity=round(float(np.mean(scores[root])), 3),
+            max_similarity=round(float(np.max(scores[root])), 3),
+            excerpt=texts[group[0]][:80],
+        )
+        for root, group in members.items()
+    ]
+    clusters.sort(key=lambda c: (len(c.student_ids), c.similarity), reverse=True)
+    return clusters
+
+
+def detect_overlaps_naive(
+    answers: Iterable[Tuple[str, str]], threshold: float = 0.8, ngram: int = 5, min_chars: int = 30
+) -> List[Tuple[str, str, float]]:
+    """两两比较的对照实现（O(n²)），返回所有达到阈值的 (id, id, 相似度)，供基准测试核对。"""
+    compacted = ((student_id, _compact(answer)) for student_id, answer in answers)
+    items = [
+        (student_id, shingles(compact, ngram, normalized=True))
+        for student_id, compact in compacted
+        if len(compact) >= min_chars
+    ]
+    found = []
+    for x in range(len(items)):
+        for y in range(x + 1, len(items)):
+            similarity = jaccard(items[x][1], items[y][1])
+            if similarity >= threshold:
+                found.append((items[x][0], items[y][0], similarity))
+    return found
+
@@ -20,6 +20,15 @@ REWRITE_PROMPT = (
     "请将其改写为更清晰的问题："
 )
 
+MULTI_QUERY_PROMPT = (
+    "请根据用户的原始问题，从不同角度改写出 {count} 个用于知识库检索的查询。\n"
+    "改写应覆盖问题中的不同关键词、同义表述或子问题，彼此不要重复。\n"
+    "以下是用户的原始问题："
+    "\n ------- \n"
+    "{question}"
+    "\n ------- \n"
+)
+
 GRADE_PROMPT = (
     "你是一个评估检索到的文档与用户问题相关性的评分员。\n"
     "以下是检索到的文档：\n\n{context}\n\n"
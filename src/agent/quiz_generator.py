@@ -1,31 +1,12 @@
 import json
-import os
 from typing import Dict, List, Literal, TypedDict
 
-from langchain.chat_models import init_chat_model
-from langchain_core.rate_limiters import InMemoryRateLimiter
 from langgraph.graph import StateGraph
 from langgraph.graph.graph import CompiledGraph
 from pydantic import BaseModel, Field
 
-from src.agent import rag_agent
-
-rate_limiter = InMemoryRateLimiter(
-    requests_per_second=0.25,  # <-- Super slow! We can only make a request once every 10 seconds!!
-    check_every_n_seconds=0.1,  # Wake up every 100 ms to check whether allowed to make a request,
-    max_bucket_size=10,  # Controls the maximum burst size.
-)
-llm = init_chat_model(
-    model="qwen3-235b-a22b",
-    model_provider="openai",
-    extra_body={"enable_thinking": False},
-    temperature=0,
-    api_key=os.getenv("DASH_SCOPE_API_KEY", ""),
-    # rate_limiter=rate_limiter,
-    base_url=os.getenv(
-        "DASH_SCOPE_API_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1"
-    ),
-)
+from src.agent.graph_registry import get_graph
+from src.agent.models import get_model
 
 
 class ConfigSchema(TypedDict):
@@ -161,7 +142,7 @@ def create_quiz_stems(state: QuizState) -> Dict:
         short_questions: List[QuestionStem]
         true_or_false_questions: List[QuestionStem]
 
-    response = llm.with_structured_output(AllStems).invoke(
+    response = get_model("planner").with_structured_output(AllStems).invoke(
         [{"role": "user", "content": prompt}]
     )
     return {
@@ -227,7 +208,7 @@ async def generate_all_answers(state: QuizState, config) -> Dict:
                 f"题干：{question}\n"
                 f"相关知识点：{', '.join(knowledge_points)}\n"
             )
-            rag_graph = await rag_agent.make_graph()
+            rag_graph = await get_graph("rag_agent")
             response = await rag_graph.ainvoke(
                 {
                     "messages": [
@@ -326,7 +307,7 @@ async def generate_all_answers(state: QuizState, config) -> Dict:
         short_questions: List[ShortAnswerQuestion]
         true_or_false_questions: List[TOrFQuestion]
 
-    response = llm.with_structured_output(AllAnswersWithContext).invoke(
+    response = get_model("planner").with_structured_output(AllAnswersWithContext).invoke(
         [{"role": "user", "content": prompt}]
     )
 
@@ -1,12 +1,10 @@
+import functools
 import json
-import os
 import re
 import struct
 from typing import Dict, List, Literal, TypedDict
 
 from langchain_core.output_parsers import JsonOutputParser
-from langchain.chat_models import init_chat_model
-from langchain_core.rate_limiters import InMemoryRateLimiter
 from langgraph.graph import StateGraph, END, state
 from langgraph.graph.graph import CompiledGraph
 from langgraph.prebuilt import create_react_agent
@@ -15,26 +13,10 @@ from enum import Enum
 from pydantic import BaseModel, Field
 
 from src.agent import prompt, rag_agent
+from src.agent.models import get_model
 from src.agent.tools import rag_tool
 from src.agent.tools import search
 
-rate_limiter = InMemoryRateLimiter(
-    requests_per_second=0.25,  # <-- Super slow! We can only make a request once every 10 seconds!!
-    check_every_n_seconds=0.1,  # Wake up every 100 ms to check whether allowed to make a request,
-    max_bucket_size=10,  # Controls the maximum burst size.
-)
-llm = init_chat_model(
-    model="qwen3-235b-a22b",
-    model_provider="openai",
-    extra_body={"enable_thinking": False},
-    temperature=0,
-    api_key=os.getenv("DASH_SCOPE_API_KEY", ""),
-    # rate_limiter=rate_limiter,
-    base_url=os.getenv(
-        "DASH_SCOPE_API_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1"
-    ),
-)
-
 
 class ConfigSchema(TypedDict):
     course_id: str
@@ -130,7 +112,7 @@ questionType 字段必须是字符串，表示题目的类型，可选值只能
     # resp = await structured_llm.ainvoke(prompt)
 
     planner = create_react_agent(
-        model=llm,
+        model=get_model("planner"),
         tools=[rag_tool, search],
         prompt=prompt,
     )
@@ -173,10 +155,7 @@ async def quiz_classifier(state: QuizState) -> Dict:
     }
 
 
-writer = create_react_agent(
-    model=llm,
-    tools=[rag_tool, search],
-    prompt="""你是测验卷出题助手，根据题目生成计划为老师生成结构化、标准化的测验题目。
+WRITER_PROMPT = """你是测验卷出题助手，根据题目生成计划为老师生成结构化、标准化的测验题目。
 要求：
 - 内容准确、清晰，题干简明，选项合理，答案唯一且有解析。
 - 如遇专业知识点或不确定内容，优先调用 rag_tool 检索知识库。
@@ -270,8 +249,17 @@ writer = create_react_agent(
 "answerExplanation": "两种投影方式各有特点和适用场景，理解它们的区别对于选择合适的投影方式很重要。"
 }}
 ```
-""",
-)
+"""
+
+
+@functools.cache
+def get_writer():
+    """测验题写作 agent，首次使用时创建。"""
+    return create_react_agent(
+        model=get_model("planner"),
+        tools=[rag_tool, search],
+        prompt=WRITER_PROMPT,
+    )
 
 
 import asyncio
@@ -299,7 +287,7 @@ async def quiz_generator(state: QuizState, config) -> Dict:
                 question_type_str = f"""请根据以下多选题的生成计划生成多选题："""
             elif questionType == QuestionType.short_answer:
                 question_type_str = f"""请根据以下简答题的生成计划生成简答题："""
-            response = await writer.ainvoke(
+            response = await get_writer().ainvoke(
                 {
                     "messages": [
                         (
@@ -1,45 +1,104 @@
 """LangGraph agent with RAG tools."""
 
-import os
-from typing import Literal, TypedDict
-
-from langchain.chat_models import init_chat_model
-from langchain_core.rate_limiters import InMemoryRateLimiter
-from langgraph.constants import END, START
+import asyncio
+import logging
+import time
+from functools import partial
+from typing import List, Literal, Optional, TypedDict
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import merge_configs
+from langgraph.constants import END, START, TAG_NOSTREAM
 from langgraph.graph import MessagesState, StateGraph
 from langgraph.graph.graph import CompiledGraph
 from langgraph.prebuilt import ToolNode
 from pydantic import BaseModel, Field
 
-from src.agent.prompt import GENERATE_PROMPT, GRADE_PROMPT, REWRITE_PROMPT
-from src.agent.tools import get_rag_tools
-
-rate_limiter = InMemoryRateLimiter(
-    requests_per_second=0.25,  # <-- Super slow! We can only make a request once every 10 seconds!!
-    check_every_n_seconds=0.1,  # Wake up every 100 ms to check whether allowed to make a request,
-    max_bucket_size=10,  # Controls the maximum burst size.
-)
-#         search_mode: Search mode - "default", "naive", "local", "global", "hybrid", "mix"
-response_model = init_chat_model(
-    model="qwen3-235b-a22b",
-    model_provider="openai",
-    temperature=0,
-    api_key=os.getenv("DASH_SCOPE_API_KEY", ""),
-    # rate_limiter=rate_limiter,
-    extra_body={"enable_thinking": False},
-    base_url=os.getenv(
-        "DASH_SCOPE_API_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1"
-    ),
+from src.agent.models import get_model
+from src.agent.prompt import (
+    GENERATE_PROMPT,
+    GRADE_PROMPT,
+    MULTI_QUERY_PROMPT,
+    REWRITE_PROMPT,
 )
+from src.agent.relevance_grader import default_grader_mode, get_relevance_grader
+from src.agent.retrieval_fusion import fuse_contexts
+from src.agent.semantic_cache import get_semantic_cache
+from src.agent.streaming import astream_message, emit_progress
+from src.agent.tools import get_rag_tools
 
 
 class ConfigSchema(TypedDict):
     course_id: str
+    bypass_semantic_cache: bool
+    relevance_grader: str
+    # "loop"（默认，检索-评分-改写循环）或 "multi_query"（一次改写出多个查询并发检索）
+    retrieval_mode: str
+    multi_query_count: int
+    # 按角色覆盖模型配置，例如 {"responder": {"model": "qwen-plus"}}
+    models: dict
 
 
 class RAGState(MessagesState):
     max_rewrite: int
     rewrite_count: int
+    # 本次运行参与语义缓存的问题，为空表示不读写缓存
+    semantic_cache_question: str
+    # 本次运行开始的时间戳，用于统计端到端首 token 延迟
+    started_at: float
+    # 多查询检索融合后的上下文；为 None 时生成节点使用最后一条（工具）消息的内容
+    retrieved_context: Optional[str]
+
+
+def _nostream(config) -> RunnableConfig:
+    """在本次运行的配置上加上 TAG_NOSTREAM：保留回调、metadata 和 configurable，
+    只是不把这次模型调用的 token 流给客户端。"""
+    return merge_configs(config, {"tags": [TAG_NOSTREAM]})
+
+
+async def check_semantic_cache(state: RAGState, config):
+    """Return a cached answer for a semantically similar question, if any."""
+    started_at = time.time()
+    cache = get_semantic_cache()
+    configurable = config.get("configurable", {})
+    course_id = configurable.get("course_id", None)
+    # 只缓存单轮提问：多轮对话中的答案依赖上下文，不能按问题复用
+    if (
+        cache is None
+        or course_id is None
+        or configurable.get("bypass_semantic_cache", False)
+        or len(state["messages"]) != 1
+    ):
+        return {
+            "semantic_cache_question": "",
+            "started_at": started_at,
+            "retrieved_context": None,
+        }
+
+    question = state["messages"][0].content
+    answer = await cache.lookup(course_id, question)
+    if answer is None:
+        return {
+            "semantic_cache_question": question,
+            "started_at": started_at,
+            "retrieved_context": None,
+        }
+    emit_progress("semantic_cache_hit")
+    return {
+        "messages": [AIMessage(content=answer, response_metadata={"semantic_cache": True})],
+        "semantic_cache_question": "",
+    }
+
+
+def route_after_cache(
+    state: RAGState, config
+) -> Literal["generate_query_or_respond", "multi_query_retrieve", "__end__"]:
+    if isinstance(state["messages"][-1], AIMessage):
+        return END
+    if config.get("configurable", {}).get("retrieval_mode") == "multi_query":
+        return "multi_query_retrieve"
+    return "generate_query_or_respond"
 
 
 async def generate_query_or_respond(state: RAGState, config):
@@ -55,12 +114,22 @@ async def generate_query_or_respond(state: RAGState, config):
     if course_id is None:
         raise ValueError("Course ID must be provided in the config.")
     retriever_tool = await get_rag_tools(course_id)
-    response = await response_model.bind_tools(retriever_tool).ainvoke(
-        state["messages"]
+    # 不需要检索时模型直接作答，回答 token 同样会流式推送
+    response = await astream_message(
+        get_model("responder", config).bind_tools(retriever_tool),
+        state["messages"],
+        config,
+        started_at=state.get("started_at"),
     )
     return {"messages": [response]}
 
 
+def route_after_query(state: RAGState) -> Literal["retrieve", "store_semantic_cache"]:
+    if state["messages"][-1].tool_calls:
+        return "retrieve"
+    return "store_semantic_cache"
+
+
 class GradeDocuments(BaseModel):
     """Grade documents using a binary score for relevance check."""
 
@@ -69,50 +138,51 @@ class GradeDocuments(BaseModel):
     )
 
 
-grader_model = init_chat_model(
-    model="qwen3-235b-a22b",
-    model_provider="openai",
-    temperature=0,
-    extra_body={"enable_thinking": False},
-    api_key=os.getenv("DASH_SCOPE_API_KEY", ""),
-    # rate_limiter=rate_limiter,
-    base_url=os.getenv(
-        "DASH_SCOPE_API_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1"
-    ),
-)
-
-
-def grade_documents(
+async def grade_documents(
     state: RAGState,
     config,
 ) -> Literal["generate_answer", "rewrite_question"]:
     rewrite_count = state["rewrite_count"]
     max_rewrite = state["max_rewrite"]
     if rewrite_count >= max_rewrite:
+        emit_progress("graded", relevant=None, reason="max_rewrite_reached")
         return "generate_answer"
 
     question = state["messages"][0].content
     context = state["messages"][-1].content
 
-    prompt = GRADE_PROMPT.format(question=question, context=context)
-    response = grader_model.with_structured_output(GradeDocuments).invoke(
-        [{"role": "user", "content": prompt}]
+    mode = config.get("configurable", {}).get("relevance_grader", default_grader_mode())
+    relevant = await get_relevance_grader().grade(
+        question, context, partial(llm_grade_documents, config=config), mode=mode
     )
-    score = response.relevant
+    emit_progress("graded", relevant=relevant)
 
-    if score == "yes":
+    if relevant:
         return "generate_answer"
     else:
         return "rewrite_question"
 
 
-def rewrite_question(state: RAGState, config):
+async def llm_grade_documents(question: str, context: str, config=None) -> bool:
+    """Grade relevance with the LLM grader."""
+    prompt = GRADE_PROMPT.format(question=question, context=context)
+    grader = get_model("grader", config).with_structured_output(GradeDocuments)
+    response = await grader.ainvoke(
+        [{"role": "user", "content": prompt}], _nostream(config)
+    )
+    return response.relevant == "yes"
+
+
+async def rewrite_question(state: RAGState, config):
     rewrite_count = state["rewrite_count"]
 
     messages = state["messages"]
     question = messages[0].content
     prompt = REWRITE_PROMPT.format(question=question)
-    response = response_model.invoke([{"role": "user", "content": prompt}])
+    response = await get_model("responder", config).ainvoke(
+        [{"role": "user", "content": prompt}], _nostream(config)
+    )
+    emit_progress("rewritten", question=response.content, rewrite_count=rewrite_count + 1)
 
     return {
         "messages": [{"role": "user", "content": response.content}],
@@ -120,15 +190,99 @@ def rewrite_question(state: RAGState, config):
     }
 
 
-def generate_answer(state: RAGState):
-    """Generate an answer."""
+async def generate_answer(state: RAGState, config):
+    """Generate an answer, streaming tokens to the client."""
     question = state["messages"][0].content
-    context = state["messages"][-1].content
+    context = state.get("retrieved_context")
+    if context is None:
+        context = state["messages"][-1].content
     prompt = GENERATE_PROMPT.format(question=question, context=context)
-    response = response_model.invoke([{"role": "user", "content": prompt}])
+    emit_progress("answer_started")
+    response = await astream_message(
+        get_model("responder", config),
+        [{"role": "user", "content": prompt}],
+        config,
+        started_at=state.get("started_at"),
+    )
+    # 检索结果为空、不相关或改写次数用尽（未经评分）时的回答不写入语义缓存
+    grounded = bool(str(context).strip()) and state.get("rewrite_count", 0) < state.get(
+        "max_rewrite", 3
+    )
+    if not grounded:
+        return {"messages": [response], "semantic_cache_question": ""}
     return {"messages": [response]}
 
 
+async def store_semantic_cache(state: RAGState, config):
+    """Store the generated answer in the semantic cache."""
+    question = state.get("semantic_cache_question")
+    cache = get_semantic_cache()
+    if cache is not None and question:
+        course_id = config.get("configurable", {}).get("course_id")
+        await cache.store(course_id, question, state["messages"][-1].content)
+    return {}
+
+
+class QueryRewrites(BaseModel):
+    """Alternative search queries for the question."""
+
+    queries: List[str] = Field(description="Rewritten search queries")
+
+
+async def multi_query_retrieve(state: RAGState, config):
+    """Rewrite the question into several queries in one call, retrieve them
+    concurrently, fuse the contexts with reciprocal-rank fusion and grade once.
+    """
+    configurable = config.get("configurable", {})
+    course_id = configurable.get("course_id", None)
+    if course_id is None:
+        raise ValueError("Course ID must be provided in the config.")
+    count = configurable.get("multi_query_count", 3)
+    question = state["messages"][0].content
+
+    rewrites, retrieve_tools = await asyncio.gather(
+        get_model("responder", config).with_structured_output(QueryRewrites).ainvoke(
+            [
+                {
+                    "role": "user",
+                    "content": MULTI_QUERY_PROMPT.format(count=count, question=question),
+                }
+            ],
+            _nostream(config),
+        ),
+        get_rag_tools(course_id),
+    )
+    queries = list(dict.fromkeys([question, *rewrites.queries[:count]]))
+    retriever = retrieve_tools[0]
+    emit_progress("retrieval_started", queries=queries)
+    results = await asyncio.gather(
+        *(
+            retriever.ainvoke({"query": q, "mode": "mix", "only_need_context": True})
+            for q in queries
+        ),
+        return_exceptions=True,
+    )
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if len(errors) == len(results):
+        raise errors[0]
+    if errors:
+        logging.warning(f"多查询检索中 {len(errors)}/{len(results)} 路失败: {errors[0]}")
+    contexts = [r for r in results if not isinstance(r, BaseException)]
+    context = fuse_contexts(contexts)
+    emit_progress("retrieval_finished", context_chars=len(context))
+
+    mode = configurable.get("relevance_grader", default_grader_mode())
+    relevant = bool(context) and await get_relevance_grader().grade(
+        question, context, partial(llm_grade_documents, config=config), mode=mode
+    )
+    emit_progress("graded", relevant=relevant)
+    if not relevant:
+        # 一轮检索都不相关时不再改写重试，交给生成节点回答“不知道”
+        context = ""
+    # 融合后的上下文放在状态中，不伪造与工具 schema 不符的工具调用消息
+    return {"retrieved_context": context}
+
+
 async def retrieve_documents(state: RAGState, config):
     """Retrieve documents using the RAG tool."""
     course_id = config.get("configurable", {}).get("course_id", None)
@@ -140,7 +294,15 @@ async def retrieve_documents(state: RAGState, config):
 
     tool_node = ToolNode(retrieve_tools)
 
+    emit_progress(
+        "retrieval_started",
+        queries=[call["args"].get("query") for call in state["messages"][-1].tool_calls],
+    )
     result = await tool_node.ainvoke(state)
+    emit_progress(
+        "retrieval_finished",
+        context_chars=sum(len(str(m.content)) for m in result["messages"]),
+    )
 
     return result
 
@@ -150,15 +312,19 @@ async def make_graph() -> CompiledGraph:
     workflow = StateGraph(RAGState, ConfigSchema)
 
     # Define the nodes we will cycle between
+    workflow.add_node(check_semantic_cache)
     workflow.add_node(generate_query_or_respond)
     workflow.add_node("retrieve", retrieve_documents)
+    workflow.add_node(multi_query_retrieve)
     workflow.add_node(rewrite_question)
     workflow.add_node(generate_answer)
+    workflow.add_node(store_semantic_cache)
 
-    workflow.add_edge(START, "generate_query_or_respond")
+    workflow.add_edge(START, "check_semantic_cache")
+    workflow.add_conditional_edges("check_semantic_cache", route_after_cache)
 
     # Decide whether to retrieve
-    workflow.add_edge("generate_query_or_respond", "retrieve")
+    workflow.add_conditional_edges("generate_query_or_respond", route_after_query)
 
     # Edges taken after the `action` node is called.
     workflow.add_conditional_edges(
@@ -166,7 +332,9 @@ async def make_graph() -> CompiledGraph:
         # Assess agent decision
         grade_documents,
     )
-    workflow.add_edge("generate_answer", END)
+    workflow.add_edge("multi_query_retrieve", "generate_answer")
+    workflow.add_edge("generate_answer", "store_semantic_cache")
+    workflow.add_edge("store_semantic_cache", END)
     workflow.add_edge("rewrite_question", "generate_query_or_respond")
 
     # Compile
@@ -0,0 +1,449 @@
+"""DashScope 调用的进程级限流与并发控制。
+
+每个模型一个 `ModelGovernor`，同时限制：
+
+- 每秒请求数（令牌桶）；
+- 每分钟 token 数（按请求体估算，响应读完后按实际 usage 校正；流式响应取 SSE
+  最后一个带 usage 的数据块）；
+- 同时在途的请求数（流式响应直到读完或关闭才归还名额），上限按 AIMD 自适应：收到 429/5xx 时减半并暂停
+  （优先使用 Retry-After），之后每个成功请求缓慢加回。
+
+governor 挂在 `models` 共用的 httpx 传输层上，所有图的模型调用都会经过它，
+无需改动各个节点。设置 `LLM_GOVERNOR_REDIS_URL` 后，异步调用的 RPS/TPM 配额在
+多个 API worker 之间通过 Redis 共享（同步调用只使用进程内配额）。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import httpx
+
+from src.agent.metrics import observe_queue
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "llm:governor"
+
+# 默认配额，可通过 LLM_RATE_LIMITS（JSON，按模型名配置）或 LLM_DEFAULT_* 覆盖
+DEFAULT_LIMITS = {"rps": 20.0, "tpm": 1_000_000, "max_in_flight": 32}
+
+# 估算输出 token 时，请求未给出 max_tokens 时使用的默认值
+DEFAULT_OUTPUT_TOKENS = 500
+
+
+class ModelGovernor:
+    """单个模型的 RPS / TPM / 并发控制。
+
+    Args:
+        name: 模型名
+        rps: 每秒请求数上限
+        tpm: 每分钟 token 数上限
+        max_in_flight: 在途请求数上限（AIMD 调整的上界）
+        min_in_flight: AIMD 调整的下界
+        redis_url: 共享配额使用的 Redis 地址
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rps: float = DEFAULT_LIMITS["rps"],
+        tpm: int = DEFAULT_LIMITS["tpm"],
+        max_in_flight: int = DEFAULT_LIMITS["max_in_flight"],
+        min_in_flight: int = 1,
+        redis_url: Optional[str] = None,
+    ):
+        self.name = name
+        self.rps = rps
+        self.tpm = tpm
+        self.max_in_flight = max_in_flight
+        self.min_in_flight = min_in_flight
+        self.limit = float(max_in_flight)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiting = 0
+        self._bucket = rps
+        self._bucket_at = time.monotonic()
+        self._tokens: Deque[Tuple[float, int]] = deque()
+        self._token_sum = 0
+        self._paused_until = 0.0
+        self._redis = None
+        if redis_url:
+            import redis.asyncio as aioredis
+
+            self._redis = aioredis.Redis.from_url(redis_url)
+        self._stats = {
+            "requests": 0,
+            "throttled": 0,
+            "server_errors": 0,
+            "redis_errors": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+        }
+
+    async def acquire(self, tokens: int) -> float:
+        """等待配额并占用一个在途名额，返回等待时间（秒）。"""
+        start = time.monotonic()
+        with self._lock:
+            self._waiting += 1
+        try:
+            while True:
+                delay = self._try_acquire(tokens, local_budget=self._redis is None)
+                if delay == 0.0 and self._redis is not None:
+                    delay = await self._redis_budget(tokens)
+                    if delay:
+                        self._release_slot()
+                if delay == 0.0:
+                    break
+                await asyncio.sleep(delay)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        return self._record_wait(time.monotonic() - start)
+
+    def acquire_sync(self, tokens: int) -> float:
+        """同步版本的 `acquire`，只使用进程内配额。"""
+        start = time.monotonic()
+        with self._lock:
+            self._waiting += 1
+        try:
+            while (delay := self._try_acquire(tokens, local_budget=True)) > 0:
+                time.sleep(delay)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        return self._record_wait(time.monotonic() - start)
+
+    def release(
+        self,
+        status_code: Optional[int],
+        estimated_tokens: int,
+        actual_tokens: Optional[int] = None,
+        retry_after: Optional[float] = None,
+    ) -> None:
+        """释放在途名额，并根据响应状态调整并发上限。"""
+        with self._lock:
+            self._in_flight -= 1
+            if actual_tokens is not None and self._redis is None:
+                self._add_tokens(actual_tokens - estimated_tokens)
+            if status_code == 429 or (status_code is not None and status_code >= 500):
+                self._stats["throttled" if status_code == 429 else "server_errors"] += 1
+                # 乘性减：并发上限减半，并在 Retry-After（默认 1 秒）内暂停放行
+                self.limit = max(float(self.min_in_flight), self.limit / 2)
+                pause = retry_after if retry_after is not None else 1.0
+                self._paused_until = max(self._paused_until, time.monotonic() + pause)
+                logger.warning(
+                    f"{self.name} 返回 {status_code}，并发上限降为 {self.limit:.1f}，"
+                    f"暂停 {pause:.1f}s"
+                )
+            elif status_code is not None and status_code < 400:
+                # 加性增：约每个“窗口”（当前上限个成功请求）加 1
+                self.limit = min(float(self.max_in_flight), self.limit + 1.0 / self.limit)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回排队数、在途数、当前并发上限与等待时间。"""
+        with self._lock:
+            requests = self._stats["requests"]
+            return {
+                **self._stats,
+                "queue_depth": self._waiting,
+                "in_flight": self._in_flight,
+                "concurrency_limit": round(self.limit, 2),
+                "tokens_last_minute": self._token_sum,
+                "avg_wait_seconds": (
+                    self._stats["total_wait_seconds"] / requests if requests else 0.0
+                ),
+                "limits": {
+                    "rps": self.rps,
+                    "tpm": self.tpm,
+                    "max_in_flight": self.max_in_flight,
+                },
+                "redis_enabled": self._redis is not None,
+            }
+
+    def _try_acquire(self, tokens: int, local_budget: bool) -> float:
+        """尝试占用名额，成功返回 0，否则返回建议的等待时间。"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self._in_flight >= int(self.limit):
+                return 0.05
+            if local_budget:
+                self._bucket = min(self.rps, self._bucket + (now - self._bucket_at) * self.rps)
+                self._bucket_at = now
+                if self._bucket < 1:
+                    return (1 - self._bucket) / self.rps
+                self._expire_tokens(now)
+                if self._token_sum and self._token_sum + tokens > self.tpm:
+                    return max(0.05, self._tokens[0][0] + 60 - now)
+                self._bucket -= 1
+                self._add_tokens(tokens, now)
+            self._in_flight += 1
+            return 0.0
+
+    def _release_slot(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    async def _redis_budget(self, tokens: int) -> float:
+        """在 Redis 固定窗口计数器上申请 RPS/TPM 配额，成功返回 0。"""
+        now = time.time()
+        second, minute = int(now), int(now // 60)
+        rps_key = f"{REDIS_KEY_PREFIX}:{self.name}:rps:{second}"
+        tpm_key = f"{REDIS_KEY_PREFIX}:{self.name}:tpm:{minute}"
+        try:
+            pipe = self._redis.pipeline()
+            pipe.incr(rps_key)
+            pipe.expire(rps_key, 2)
+            pipe.incrby(tpm_key, tokens)
+            pipe.expire(tpm_key, 120)
+            count, _, used, _ = await pipe.execute()
+            if count > self.rps:
+                await self._redis.decrby(tpm_key, tokens)
+                return second + 1 - now
+            if used > self.tpm and used != tokens:
+                await self._redis.decrby(tpm_key, tokens)
+                return (minute + 1) * 60 - now
+            return 0.0
+        except Exception as e:
+            # Redis 不可用时退回进程内配额，不阻塞调用
+            self._stats["redis_errors"] += 1
+            logger.warning(f"读取 Redis 限流配额失败: {e}")
+            return 0.0
+
+    def _add_tokens(self, tokens: int, now: Optional[float] = None) -> None:
+        self._tokens.append((now or time.monotonic(), tokens))
+        self._token_sum += tokens
+
+    def _expire_tokens(self, now: float) -> None:
+        while self._tokens and now - self._tokens[0][0] >= 60:
+            self._token_sum -= self._tokens.popleft()[1]
+
+    def _record_wait(self, waited: float) -> float:
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["total_wait_seconds"] += waited
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+        observe_queue(self.name, waited)
+        return waited
+
+
+_governors: Dict[str, ModelGovernor] = {}
+_governors_lock = threading.Lock()
+
+
+def _limits_for(model: str) -> Dict[str, Any]:
+    limits = {
+        "rps": float(os.getenv("LLM_DEFAULT_RPS", DEFAULT_LIMITS["rps"])),
+        "tpm": int(os.getenv("LLM_DEFAULT_TPM", DEFAULT_LIMITS["tpm"])),
+        "max_in_flight": int(
+            os.getenv("LLM_DEFAULT_MAX_IN_FLIGHT", DEFAULT_LIMITS["max_in_flight"])
+        ),
+    }
+    overrides = json.loads(os.getenv("LLM_RATE_LIMITS", "{}") or "{}")
+    limits.update(overrides.get("default", {}))
+    limits.update(overrides.get(model, {}))
+    return limits
+
+
+def get_governor(model: str) -> ModelGovernor:
+    """返回某个模型的 governor，首次使用时按环境变量创建。"""
+    governor = _governors.get(model)
+    if governor is None:
+        with _governors_lock:
+            governor = _governors.get(model)
+            if governor is None:
+                governor = ModelGovernor(
+                    model,
+                    redis_url=os.getenv("LLM_GOVERNOR_REDIS_URL") or None,
+                    **_limits_for(model),
+                )
+                _governors[model] = governor
+    return governor
+
+
+def governor_stats() -> Dict[str, Dict[str, Any]]:
+    """所有模型的限流统计。"""
+    return {name: g.stats() for name, g in sorted(_governors.items())}
+
+
+def _inspect_request(request: httpx.Request) -> Tuple[Optional[str], int]:
+    """从请求体中取出模型名并估算 token 数（输入约 2 字符/token，加上输出上限）。"""
+    try:
+        body = json.loads(request.content or b"{}")
+    except ValueError:
+        return None, 0
+    if not isinstance(body, dict) or "model" not in body:
+        return None, 0
+    output = body.get("max_tokens") or body.get("max_completion_tokens") or DEFAULT_OUTPUT_TOKENS
+    return body["model"], len(request.content) // 2 + int(output)
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return float(response.headers["retry-after"])
+    except (KeyError, ValueError):
+        return None
+
+
+def _usage_tokens(response: httpx.Response) -> Optional[int]:
+    """已读完的响应中的 usage.total_tokens：JSON 响应取 usage 字段，SSE 响应取数据块中的。"""
+    if not response.headers.get("content-type", "").startswith("application/json"):
+        usage = _SSEUsage()
+        usage.feed(response.content + b"\n")
+        return usage.total_tokens
+    try:
+        return int(response.json()["usage"]["total_tokens"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class _SSEUsage:
+    """逐块扫描 SSE 响应体，记录最后一个 `data:` 行中的 usage.total_tokens。"""
+
+    def __init__(self):
+        self._pending = b""
+        self.total_tokens: Optional[int] = None
+
+    def feed(self, chunk: bytes) -> None:
+        lines = (self._pending + chunk).split(b"\n")
+        self._pending = lines.pop()
+        for line in lines:
+            if not line.startswith(b"data:") or b'"usage"' not in line:
+                continue
+            try:
+                self.total_tokens = int(json.loads(line[5:])["usage"]["total_tokens"])
+            except (ValueError, KeyError, TypeError):
+                pass
+
+
+class _GovernedAsyncStream(httpx.AsyncByteStream):
+    """包装流式响应体：关闭时才归还 governor 名额，并按流中的 usage 校正 TPM。"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self._stream = stream
+        self._release = release
+        self._usage = _SSEUsage()
+        self._released = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._usage.feed(chunk)
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._release(self._usage.total_tokens)
+
+
+class _GovernedStream(httpx.SyncByteStream):
+    """同步版本的 `_GovernedAsyncStream`。"""
+
+    def __init__(self, stream: httpx.SyncByteStream, release):
+        self._stream = stream
+        self._release = release
+        self._usage = _SSEUsage()
+        self._released = False
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._usage.feed(chunk)
+            yield chunk
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            if not self._released:
+                self._released = True
+                self._release(self._usage.total_tokens)
+
+
+def _is_stream(response: httpx.Response) -> bool:
+    """尚未读取的非 JSON 成功响应；已读完（is_closed）的响应直接按内容校正。"""
+    return (
+        response.status_code < 400
+        and not response.is_closed
+        and "json" not in response.headers.get("content-type", "")
+    )
+
+
+class GovernedAsyncTransport(httpx.AsyncBaseTransport):
+    """在请求发出前经过对应模型的 governor。"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        model, tokens = _inspect_request(request)
+        if model is None:
+            return await self._transport.handle_async_request(request)
+        governor = get_governor(model)
+        await governor.acquire(tokens)
+        status_code, actual, retry_after = None, None, None
+        streaming = False
+        try:
+            response = await self._transport.handle_async_request(request)
+            status_code, retry_after = response.status_code, _retry_after(response)
+            if _is_stream(response):
+                # 流式响应：名额一直占到响应体读完或被关闭
+                response.stream = _GovernedAsyncStream(
+                    response.stream,
+                    lambda used: governor.release(status_code, tokens, used, retry_after),
+                )
+                streaming = True
+            elif status_code < 400:
+                await response.aread()
+                actual = _usage_tokens(response)
+            return response
+        finally:
+            if not streaming:
+                governor.release(status_code, tokens, actual, retry_after)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class GovernedTransport(httpx.BaseTransport):
+    """同步版本的 `GovernedAsyncTransport`。"""
+
+    def __init__(self, transport: httpx.BaseTransport):
+        self._transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        model, tokens = _inspect_request(request)
+        if model is None:
+            return self._transport.handle_request(request)
+        governor = get_governor(model)
+        governor.acquire_sync(tokens)
+        status_code, actual, retry_after = None, None, None
+        streaming = False
+        try:
+            response = self._transport.handle_request(request)
+            status_code, retry_after = response.status_code, _retry_after(response)
+            if _is_stream(response):
+                response.stream = _GovernedStream(
+                    response.stream,
+                    lambda used: governor.release(status_code, tokens, used, retry_after),
+                )
+                streaming = True
+            elif status_code < 400:
+                response.read()
+                actual = _usage_tokens(response)
+            return response
+        finally:
+            if not streaming:
+                governor.release(status_code, tokens, actual, retry_after)
+
+    def close(self) -> None:
+        self._transport.close()
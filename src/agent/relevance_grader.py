@@ -0,0 +1,252 @@
+"""检索结果相关性评分。
+
+`rag_agent.grade_documents` 原本每次检索后都要调用大模型判断相关性。这里提供一个
+可替换的评分器：用本地 CPU 上的 sentence-transformers cross-encoder 给
+(问题, 上下文) 打分，分数经过校准后落在阈值之外时直接给出结论，只有落在
+不确定区间内时才回退到大模型。
+
+评分模式（`configurable["relevance_grader"]` 或环境变量 RAG_RELEVANCE_GRADER）：
+
+- ``llm``：只用大模型（原有行为）
+- ``cross_encoder``：cross-encoder + 不确定区间回退大模型
+"""
+
+import asyncio
+import logging
+import math
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+LLMGrader = Callable[[str, str], Awaitable[bool]]
+
+GRADER_MODES = ("llm", "cross_encoder")
+
+
+class _LatencyStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "avg_seconds": self.total / self.count if self.count else 0.0,
+            "max_seconds": self.max,
+        }
+
+
+class RelevanceGrader:
+    """cross-encoder 相关性评分器，不确定时回退大模型。
+
+    Args:
+        model_name: cross-encoder 模型名或本地路径
+        low: 校准后概率不高于该值判为不相关
+        high: 校准后概率不低于该值判为相关，(low, high) 之间交给大模型
+        calibration: Platt 校准参数 (a, b)，概率为 sigmoid(a * logit + b)
+        chunk_chars: 上下文按该长度切块分别打分后取最大值，避免长上下文被截断
+        max_chunks: 最多打分的块数
+        shadow_rate: 对有把握的结论按该比例在后台再请大模型判一次，用于统计一致率；
+            为 0 时不收集一致率
+        max_samples: 保留用于重新校准的 (logit, 大模型结论) 样本数
+    """
+
+    def __init__(
+        self,
+        model_name: str = "BAAI/bge-reranker-base",
+        low: float = 0.2,
+        high: float = 0.8,
+        calibration: Tuple[float, float] = (1.0, 0.0),
+        chunk_chars: int = 1000,
+        max_chunks: int = 8,
+        shadow_rate: float = 0.05,
+        max_samples: int = 2000,
+    ):
+        self.model_name = model_name
+        self.low = low
+        self.high = high
+        self.calibration = calibration
+        self.chunk_chars = chunk_chars
+        self.max_chunks = max_chunks
+        self.shadow_rate = shadow_rate
+        self._model = None
+        self._model_lock = asyncio.Lock()
+        self._shadow_tasks: set = set()
+        self.samples: Deque[Tuple[float, bool]] = deque(maxlen=max_samples)
+        self._latency = {
+            "cross_encoder": _LatencyStats(),
+            "llm": _LatencyStats(),
+            "decision": _LatencyStats(),
+        }
+        self._stats = {
+            "decisions": 0,
+            "confident_relevant": 0,
+            "confident_irrelevant": 0,
+            "llm_fallbacks": 0,
+            "llm_only": 0,
+            "encoder_errors": 0,
+            "agreement_checks": 0,
+            "agreements": 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "RelevanceGrader":
+        """按环境变量构造评分器。"""
+        a, b = (float(x) for x in os.getenv("RAG_GRADER_CALIBRATION", "1,0").split(","))
+        return cls(
+            model_name=os.getenv("RAG_GRADER_MODEL", "BAAI/bge-reranker-base"),
+            low=float(os.getenv("RAG_GRADER_LOW", 0.2)),
+            high=float(os.getenv("RAG_GRADER_HIGH", 0.8)),
+            calibration=(a, b),
+            shadow_rate=float(os.getenv("RAG_GRADER_SHADOW_RATE", 0.05)),
+        )
+
+    async def grade(
+        self, question: str, context: str, llm_grade: LLMGrader, mode: str = "cross_encoder"
+    ) -> bool:
+        """判断上下文是否与问题相关。"""
+        start = time.perf_counter()
+        self._stats["decisions"] += 1
+        try:
+            if mode == "llm":
+                self._stats["llm_only"] += 1
+                return await self._llm(question, context, llm_grade)
+
+            try:
+                logit = await self.score(question, context)
+            except Exception as e:
+                self._stats["encoder_errors"] += 1
+                logger.warning(f"cross-encoder 评分失败，回退到大模型: {e}")
+                return await self._llm(question, context, llm_grade)
+
+            probability = self.probability(logit)
+            if self.low < probability < self.high:
+                self._stats["llm_fallbacks"] += 1
+                relevant = await self._llm(question, context, llm_grade)
+                self.samples.append((logit, relevant))
+                return relevant
+
+            relevant = probability >= self.high
+            self._stats["confident_relevant" if relevant else "confident_irrelevant"] += 1
+            if self.shadow_rate and random.random() < self.shadow_rate:
+                task = asyncio.create_task(
+                    self._shadow_check(question, context, logit, relevant, llm_grade)
+                )
+                self._shadow_tasks.add(task)
+                task.add_done_callback(self._shadow_tasks.discard)
+            return relevant
+        finally:
+            self._latency["decision"].add(time.perf_counter() - start)
+
+    async def score(self, question: str, context: str) -> float:
+        """返回 cross-encoder 的原始 logit（多个块取最大值）。"""
+        model = await self._get_model()
+        chunks = [
+            context[i : i + self.chunk_chars]
+            for i in range(0, max(len(context), 1), self.chunk_chars)
+        ][: self.max_chunks]
+        start = time.perf_counter()
+        scores = await asyncio.to_thread(
+            model.predict, [(question, chunk) for chunk in chunks]
+        )
+        self._latency["cross_encoder"].add(time.perf_counter() - start)
+        # 单标签 cross-encoder 默认输出 sigmoid 概率，还原为 logit 再做校准
+        p = float(np.clip(np.max(scores), 1e-6, 1 - 1e-6))
+        return math.log(p / (1 - p))
+
+    def probability(self, logit: float) -> float:
+        """按校准参数把 logit 转成相关概率。"""
+        a, b = self.calibration
+        return 1.0 / (1.0 + math.exp(-(a * logit + b)))
+
+    def calibrate(self, iterations: int = 500, lr: float = 0.1) -> Tuple[float, float]:
+        """用记录下的 (logit, 大模型结论) 样本拟合 Platt 校准参数并立即生效。"""
+        if len(self.samples) < 20:
+            return self.calibration
+        x = np.array([s[0] for s in self.samples], dtype=np.float64)
+        y = np.array([s[1] for s in self.samples], dtype=np.float64)
+        if y.min() == y.max():
+            return self.calibration
+        a, b = self.calibration
+        for _ in range(iterations):
+            p = 1.0 / (1.0 + np.exp(-(a * x + b)))
+            a -= lr * float(np.mean((p - y) * x))
+            b -= lr * float(np.mean(p - y))
+        self.calibration = (a, b)
+        return self.calibration
+
+    def stats(self) -> Dict[str, Any]:
+        """返回各类结论的数量、延迟和与大模型的一致率。"""
+        checks = self._stats["agreement_checks"]
+        decisions = self._stats["decisions"]
+        return {
+            **self._stats,
+            "llm_call_rate": (
+                (self._stats["llm_fallbacks"] + self._stats["llm_only"]) / decisions
+                if decisions
+                else 0.0
+            ),
+            "agreement_rate": self._stats["agreements"] / checks if checks else None,
+            "latency": {k: v.as_dict() for k, v in self._latency.items()},
+            "thresholds": {"low": self.low, "high": self.high},
+            "calibration": list(self.calibration),
+            "samples": len(self.samples),
+        }
+
+    async def _llm(self, question: str, context: str, llm_grade: LLMGrader) -> bool:
+        start = time.perf_counter()
+        try:
+            return await llm_grade(question, context)
+        finally:
+            self._latency["llm"].add(time.perf_counter() - start)
+
+    async def _shadow_check(
+        self, question: str, context: str, logit: float, relevant: bool, llm_grade: LLMGrader
+    ) -> None:
+        try:
+            llm_relevant = await self._llm(question, context, llm_grade)
+        except Exception as e:
+            logger.debug(f"相关性一致率抽查失败: {e}")
+            return
+        self.samples.append((logit, llm_relevant))
+        self._stats["agreement_checks"] += 1
+        if llm_relevant == relevant:
+            self._stats["agreements"] += 1
+
+    async def _get_model(self):
+        if self._model is None:
+            async with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+
+                    self._model = await asyncio.to_thread(CrossEncoder, self.model_name)
+        return self._model
+
+
+_grader: Optional[RelevanceGrader] = None
+
+
+def get_relevance_grader() -> RelevanceGrader:
+    """返回进程共享的评分器（cross-encoder 模型在首次打分时才加载）。"""
+    global _grader
+    if _grader is None:
+        _grader = RelevanceGrader.from_env()
+    return _grader
+
+
+def default_grader_mode() -> str:
+    """环境变量 RAG_RELEVANCE_GRADER 指定的默认评分模式。"""
+    mode = os.getenv("RAG_RELEVANCE_GRADER", "llm")
+    return mode if mode in GRADER_MODES else "llm"
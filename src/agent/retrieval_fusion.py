@@ -0,0 +1,68 @@
+"""多路检索结果的融合。
+
+多查询检索模式下，同一个问题的若干改写会并发检索知识库，每一路得到一段上下文。
+这里把每段上下文切成片段，按片段在各路结果中的排名做倒数排名融合（RRF），
+去掉重复片段后拼成一份上下文交给评分和生成节点。
+"""
+
+import hashlib
+import json
+import re
+from typing import Dict, List
+
+
+def extract_context(raw: str) -> str:
+    """取出 LightRAG 返回结果中的文本（`{"response": ...}` 或纯文本）。"""
+    try:
+        data = json.loads(raw, strict=False)
+    except (TypeError, ValueError):
+        return raw
+    if isinstance(data, dict) and isinstance(data.get("response"), str):
+        return data["response"]
+    return raw
+
+
+def split_passages(context: str) -> List[str]:
+    """按空行把上下文切成片段，顺序即该路检索中的排名。"""
+    return [p.strip() for p in re.split(r"\n\s*\n", context) if p.strip()]
+
+
+def _fingerprint(passage: str) -> str:
+    normalized = re.sub(r"\s+", " ", passage).strip().lower()
+    return hashlib.sha1(normalized.encode()).hexdigest()
+
+
+def reciprocal_rank_fusion(ranked_lists: List[List[str]], k: int = 60) -> List[str]:
+    """RRF：片段得分为其在各路结果中 1 / (k + 排名) 之和，按得分降序返回去重后的片段。"""
+    scores: Dict[str, float] = {}
+    passages: Dict[str, str] = {}
+    for ranked in ranked_lists:
+        seen = set()
+        for rank, passage in enumerate(ranked, start=1):
+            key = _fingerprint(passage)
+            if key in seen:
+                continue
+            seen.add(key)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            passages.setdefault(key, passage)
+    return [passages[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+def fuse_contexts(contexts: List[str], max_chars: int = 12000, k: int = 60) -> str:
+    """融合多路检索得到的上下文，总长度不超过 `max_chars`。
+
+    按融合后的排名依次放入片段，放不下的片段跳过，继续尝试排名更低、更短的片段；
+    排名第一的片段本身超出预算时截断保留。
+    """
+    fused = reciprocal_rank_fusion(
+        [split_passages(extract_context(c)) for c in contexts], k=k
+    )
+    selected, total = [], 0
+    for passage in fused:
+        if not selected and len(passage) > max_chars:
+            passage = passage[:max_chars]
+        if total + len(passage) > max_chars:
+            continue
+        selected.append(passage)
+        total += len(passage) + 2
+    return "\n\n".join(selected)
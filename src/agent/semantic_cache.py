@@ -0,0 +1,306 @@
+"""RAG 答案的语义缓存。
+
+使用本地 sentence-transformers 模型对问题做向量化，在每门课程独立的内存向量索引中
+查找相似度超过阈值的历史问题，命中时直接返回缓存的答案，不再调用 LLM 和 LightRAG。
+索引会持久化到磁盘，进程重启后按课程懒加载。磁盘读写都放在线程中执行；修改后延迟
+`persist_delay` 秒在后台写盘，期间同一门课程的多次修改只写一次。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _CourseIndex:
+    embeddings: np.ndarray  # (n, dim)，已归一化
+    questions: List[str] = field(default_factory=list)
+    answers: List[str] = field(default_factory=list)
+    created_at: List[float] = field(default_factory=list)
+    last_used: List[float] = field(default_factory=list)
+    dirty: bool = False
+
+
+class SemanticAnswerCache:
+    """按课程划分的语义答案缓存。
+
+    Args:
+        model_name: sentence-transformers 模型名或本地路径
+        threshold: 余弦相似度阈值，达到该值才视为命中
+        max_entries: 每门课程最多缓存的问答数，超出时淘汰最久未使用的条目
+        ttl: 条目过期时间（秒）
+        persist_dir: 索引持久化目录，为空时只保存在内存中
+        persist_delay: 修改后延迟多少秒写盘
+    """
+
+    def __init__(
+        self,
+        model_name: str = "BAAI/bge-small-zh-v1.5",
+        threshold: float = 0.92,
+        max_entries: int = 2000,
+        ttl: float = 7 * 24 * 3600,
+        persist_dir: Optional[str] = None,
+        persist_delay: float = 1.0,
+    ):
+        self.model_name = model_name
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persist_dir = persist_dir
+        self.persist_delay = persist_delay
+        self._model = None
+        self._model_lock = asyncio.Lock()
+        self._indexes: Dict[str, _CourseIndex] = {}
+        self._persist_tasks: Dict[str, asyncio.Task] = {}
+        self._persist_lock = asyncio.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "SemanticAnswerCache":
+        """按环境变量构造缓存。"""
+        return cls(
+            model_name=os.getenv("RAG_SEMANTIC_CACHE_MODEL", "BAAI/bge-small-zh-v1.5"),
+            threshold=float(os.getenv("RAG_SEMANTIC_CACHE_THRESHOLD", 0.92)),
+            max_entries=int(os.getenv("RAG_SEMANTIC_CACHE_MAX_ENTRIES", 2000)),
+            ttl=float(os.getenv("RAG_SEMANTIC_CACHE_TTL", 7 * 24 * 3600)),
+            persist_dir=os.getenv("RAG_SEMANTIC_CACHE_DIR", ".cache/semantic_cache"),
+            persist_delay=float(os.getenv("RAG_SEMANTIC_CACHE_PERSIST_DELAY", 1.0)),
+        )
+
+    async def lookup(self, course_id: str, question: str) -> Optional[str]:
+        """查找语义相近的历史问题，命中时返回其答案。"""
+        index = await self._index(course_id)
+        if not index.answers:
+            self._stats["misses"] += 1
+            return None
+        vector = await self._embed(question)
+        self._expire(course_id, index)
+        if not index.answers:
+            self._stats["misses"] += 1
+            return None
+        scores = index.embeddings @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            self._stats["misses"] += 1
+            return None
+        index.last_used[best] = time.time()
+        self._stats["hits"] += 1
+        logger.info(
+            f"语义缓存命中 course={course_id} score={scores[best]:.3f} "
+            f"cached_question={index.questions[best]!r}"
+        )
+        return index.answers[best]
+
+    async def store(self, course_id: str, question: str, answer: str) -> None:
+        """缓存一条问答。"""
+        if not answer:
+            return
+        vector = await self._embed(question)
+        index = await self._index(course_id)
+        now = time.time()
+        if index.answers:
+            scores = index.embeddings @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= 0.999:
+                # 同一个问题，直接覆盖旧答案
+                index.answers[best] = answer
+                index.created_at[best] = index.last_used[best] = now
+                index.dirty = True
+                self._schedule_persist(course_id)
+                return
+        if index.embeddings.size:
+            index.embeddings = np.vstack([index.embeddings, vector[None, :]])
+        else:
+            index.embeddings = vector[None, :]
+        index.questions.append(question)
+        index.answers.append(answer)
+        index.created_at.append(now)
+        index.last_used.append(now)
+        index.dirty = True
+        self._stats["stores"] += 1
+        overflow = len(index.answers) - self.max_entries
+        if overflow > 0:
+            victims = np.argsort(np.asarray(index.last_used))[:overflow]
+            self._remove(index, set(int(i) for i in victims))
+            self._stats["evictions"] += overflow
+        self._schedule_persist(course_id)
+
+    async def invalidate(self, course_id: str) -> None:
+        """清空某门课程的缓存（例如知识库更新后）。"""
+        self._stats["invalidations"] += 1
+        task = self._persist_tasks.pop(course_id, None)
+        if task is not None:
+            task.cancel()
+        self._indexes.pop(course_id, None)
+        async with self._persist_lock:
+            await asyncio.to_thread(self._remove_files, course_id)
+
+    async def flush(self) -> None:
+        """立即写入所有尚未持久化的修改（进程退出前调用）。"""
+        for course_id in list(self._persist_tasks):
+            self._persist_tasks.pop(course_id).cancel()
+        for course_id in list(self._indexes):
+            await self._persist(course_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中率与索引规模。"""
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "courses": len(self._indexes),
+            "entries": sum(len(i.answers) for i in self._indexes.values()),
+            "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+        }
+
+    async def _embed(self, text: str) -> np.ndarray:
+        model = await self._get_model()
+        vectors = await asyncio.to_thread(
+            model.encode, [text], normalize_embeddings=True
+        )
+        return np.asarray(vectors[0], dtype=np.float32)
+
+    async def _get_model(self):
+        if self._model is None:
+            async with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+
+                    self._model = await asyncio.to_thread(
+                        SentenceTransformer, self.model_name
+                    )
+        return self._model
+
+    async def _index(self, course_id: str) -> _CourseIndex:
+        index = self._indexes.get(course_id)
+        if index is None:
+            loaded = await asyncio.to_thread(self._load, course_id)
+            # 加载期间可能已有并发请求建好了索引
+            index = self._indexes.setdefault(
+                course_id, loaded or _CourseIndex(embeddings=np.zeros((0, 0), dtype=np.float32))
+            )
+        return index
+
+    def _expire(self, course_id: str, index: _CourseIndex) -> None:
+        now = time.time()
+        expired = {i for i, t in enumerate(index.created_at) if now - t > self.ttl}
+        if expired:
+            self._remove(index, expired)
+            self._stats["expirations"] += len(expired)
+            self._schedule_persist(course_id)
+
+    @staticmethod
+    def _remove(index: _CourseIndex, positions: set) -> None:
+        keep = [i for i in range(len(index.answers)) if i not in positions]
+        index.embeddings = index.embeddings[keep]
+        for name in ("questions", "answers", "created_at", "last_used"):
+            values = getattr(index, name)
+            setattr(index, name, [values[i] for i in keep])
+        index.dirty = True
+
+    def _paths(self, course_id: str):
+        if not self.persist_dir:
+            return None, None
+        safe = re.sub(r"[^\w.-]", "_", course_id)
+        base = os.path.join(self.persist_dir, safe)
+        return base + ".npy", base + ".json"
+
+    def _load(self, course_id: str) -> Optional[_CourseIndex]:
+        npy_path, json_path = self._paths(course_id)
+        if not npy_path or not os.path.exists(npy_path) or not os.path.exists(json_path):
+            return None
+        try:
+            embeddings = np.load(npy_path)
+            with open(json_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            return _CourseIndex(
+                embeddings=embeddings,
+                questions=meta["questions"],
+                answers=meta["answers"],
+                created_at=meta["created_at"],
+                last_used=meta["last_used"],
+            )
+        except Exception as e:
+            logger.warning(f"加载课程 {course_id} 的语义缓存失败，将重新构建: {e}")
+            return None
+
+    def _schedule_persist(self, course_id: str) -> None:
+        if not self.persist_dir or course_id in self._persist_tasks:
+            return
+        self._persist_tasks[course_id] = asyncio.get_running_loop().create_task(
+            self._persist_later(course_id)
+        )
+
+    async def _persist_later(self, course_id: str) -> None:
+        try:
+            await asyncio.sleep(self.persist_delay)
+        finally:
+            # 写盘期间的新修改会另外安排一次写入
+            self._persist_tasks.pop(course_id, None)
+        await self._persist(course_id)
+
+    async def _persist(self, course_id: str) -> None:
+        index = self._indexes.get(course_id)
+        npy_path, json_path = self._paths(course_id)
+        if index is None or not npy_path or not index.dirty:
+            return
+        # 在事件循环上取快照，线程中写盘时索引可以继续被修改
+        embeddings = index.embeddings
+        meta = {
+            "questions": list(index.questions),
+            "answers": list(index.answers),
+            "created_at": list(index.created_at),
+            "last_used": list(index.last_used),
+        }
+        index.dirty = False
+        async with self._persist_lock:
+            if self._indexes.get(course_id) is not index:  # 已被清空
+                return
+            try:
+                await asyncio.to_thread(self._write, npy_path, json_path, embeddings, meta)
+            except Exception as e:
+                index.dirty = True
+                logger.warning(f"持久化课程 {course_id} 的语义缓存失败: {e}")
+
+    def _write(self, npy_path: str, json_path: str, embeddings: np.ndarray, meta: dict) -> None:
+        os.makedirs(self.persist_dir, exist_ok=True)
+        # 先写临时文件再替换，避免进程中断留下半个索引
+        with open(npy_path + ".tmp", "wb") as f:
+            np.save(f, embeddings)
+        with open(json_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(npy_path + ".tmp", npy_path)
+        os.replace(json_path + ".tmp", json_path)
+
+    def _remove_files(self, course_id: str) -> None:
+        for path in self._paths(course_id):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+
+_semantic_cache: Optional[SemanticAnswerCache] = None
+
+
+def get_semantic_cache() -> Optional[SemanticAnswerCache]:
+    """返回进程共享的语义缓存，未通过 RAG_SEMANTIC_CACHE 开启时返回 None。"""
+    global _semantic_cache
+    if os.getenv("RAG_SEMANTIC_CACHE", "false").lower() not in ("1", "true", "yes"):
+        return None
+    if _semantic_cache is None:
+        _semantic_cache = SemanticAnswerCache.from_env()
+    return _semantic_cache
@@ -0,0 +1,80 @@
+"""RAG 代理的流式输出辅助函数。
+
+- `emit_progress`：通过 LangGraph 的 custom 流模式发送节点进度事件
+  （开始检索、评分结果、问题改写等），前端据此渲染进度。
+- `astream_message`：流式调用模型并把分块合并成完整消息；在 messages 流模式下
+  token 会实时推送给客户端，同时记录首 token 延迟（TTFT）。
+"""
+
+import statistics
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from langchain_core.messages import BaseMessage, message_chunk_to_message
+from langgraph.config import get_stream_writer
+
+
+def emit_progress(event: str, **data: Any) -> None:
+    """发送一条进度事件，不在流式运行中时静默忽略。"""
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:
+        return
+    writer({"event": event, **data})
+
+
+class TTFTStats:
+    """首 token 延迟统计，保留最近 `window` 个样本计算分位数。"""
+
+    def __init__(self, window: int = 1000):
+        self._samples: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, int] = {}
+        self.window = window
+
+    def record(self, name: str, seconds: float) -> None:
+        self._samples.setdefault(name, deque(maxlen=self.window)).append(seconds)
+        self._counts[name] = self._counts.get(name, 0) + 1
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        result = {}
+        for name, samples in self._samples.items():
+            ordered = sorted(samples)
+            result[name] = {
+                "count": self._counts[name],
+                "avg_seconds": statistics.fmean(ordered),
+                "p50_seconds": ordered[len(ordered) // 2],
+                "p95_seconds": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                "max_seconds": ordered[-1],
+            }
+        return result
+
+
+ttft_stats = TTFTStats()
+
+
+async def astream_message(
+    model, messages, config=None, started_at: Optional[float] = None
+) -> BaseMessage:
+    """流式调用模型，返回合并后的完整消息。
+
+    记录两项 TTFT：`generation`（从本次模型调用开始算）和 `end_to_end`（从
+    `started_at`，即本次运行开始的 `time.time()`）。只有带正文内容的分块才算首 token，
+    只含工具调用的回复不计入。
+    """
+    call_started = time.perf_counter()
+    first_token_at = None
+    merged = None
+    async for chunk in model.astream(messages, config):
+        if first_token_at is None and chunk.content:
+            first_token_at = time.perf_counter()
+            ttft = first_token_at - call_started
+            ttft_stats.record("generation", ttft)
+            if started_at is not None:
+                ttft_stats.record("end_to_end", time.time() - started_at)
+            emit_progress("first_token", ttft_seconds=ttft)
+        merged = chunk if merged is None else merged + chunk
+    message = message_chunk_to_message(merged)
+    if first_token_at is not None:
+        message.response_metadata["ttft_seconds"] = first_token_at - call_started
+    return message
@@ -0,0 +1,305 @@
+"""基于考试统计的本地知识掌握分析。
+
+把一门课程里各学生的考试统计（`/exam/statistics/student/{studentId}/course/{courseId}`
+的返回）整理成 学生 × 章节 × 知识点 的答题数与正确数张量，一次向量化计算出各章节正确率、
+成绩趋势、最薄弱的知识点以及在班级中的百分位。评审员和报告生成拿到的是这些数字组成的
+精简上下文，不再每次让模型从原始 JSON 中总结。
+
+统计数据中的字段：
+- ``chapterAccuracyList``：章节正确率（百分比）和答题次数，作为该章节“未标注知识点”的数据；
+- ``questionAccuracyList`` / ``problemQuestionList``：题目级记录，带 ``knowledgePoints``
+  （逗号分隔）时按知识点计入，学生有题目级记录时不再使用章节汇总；
+- ``paperStatisticsList``：各次考试得分，按试卷 ID 排序后计算趋势（每次考试的得分变化）。
+
+分析结果按（课程，调用方）缓存，考试统计客户端中该课程的数据版本或参与分析的学生
+变化、或超过 ``STUDENT_ANALYTICS_CACHE_TTL`` 秒（默认 600）后才重新计算；最多缓存
+``STUDENT_ANALYTICS_CACHE_MAX_ENTRIES`` 份（默认 64），超出时淘汰最久未使用的。班级百分位只在参与分析的学生是整个班级时才有意义，见 `get_course_mastery`。
+"""
+
+import asyncio
+import logging
+import os
+import re
+import time
+import warnings
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.agent.exam_status_client import get_exam_status_client, principal
+
+logger = logging.getLogger(__name__)
+
+UNLABELED_POINT = ""  # 没有知识点标注的答题记录
+
+
+def _data(payload: Any) -> Dict[str, Any]:
+    if isinstance(payload, dict) and isinstance(payload.get("data"), dict):
+        return payload["data"]
+    return payload if isinstance(payload, dict) else {}
+
+
+def _rate(item: Dict[str, Any]) -> Optional[float]:
+    if item.get("accuracyRate") is not None:
+        return float(item["accuracyRate"]) / 100
+    if item.get("isCorrect") is not None:
+        return float(bool(item["isCorrect"]))
+    return None
+
+
+def _chapter(item: Dict[str, Any]) -> str:
+    return str(item.get("chapterName") or item.get("chapterId") or "未分章节")
+
+
+@dataclass
+class MasteryAnalytics:
+    """一门课程的知识掌握分析结果，第一维均按 `student_ids` 排列。"""
+
+    student_ids: List[str]
+    chapters: List[str]
+    points: List[str]
+    attempts: np.ndarray  # (学生, 章节, 知识点) 答题次数
+    accuracy: np.ndarray  # (学生, 章节, 知识点) 正确率，无数据为 NaN
+    chapter_accuracy: np.ndarray  # (学生, 章节)
+    overall_accuracy: np.ndarray  # (学生,)
+    chapter_percentile: np.ndarray  # (学生, 章节) 班级百分位，0~100
+    overall_percentile: np.ndarray  # (学生,)
+    trend: np.ndarray  # (学生,) 每次考试得分的平均变化，考试少于两次为 NaN
+    exams: np.ndarray  # (学生,) 考试次数
+    weakest: np.ndarray  # (学生, n) 最薄弱的（章节 × 知识点）展平下标
+    _index: Dict[str, int] = field(default_factory=dict, repr=False)
+
+    def __post_init__(self):
+        self._index = {sid: i for i, sid in enumerate(self.student_ids)}
+
+    def student_context(
+        self, student_id: str, top_chapters: int = 5, percentiles: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        """某个学生的精简掌握情况；没有该学生的章节数据时返回 None。
+
+        `percentiles` 为 false 时不给出班级百分位（参与分析的学生不是整个班级时）。
+        """
+        i = self._index.get(str(student_id))
+        if i is None or np.isnan(self.overall_accuracy[i]):
+            return None
+        chapter_acc = self.chapter_accuracy[i]
+        order = [c for c in np.argsort(chapter_acc) if not np.isnan(chapter_acc[c])]
+        n_points = len(self.points)
+        weakest = []
+        for flat in self.weakest[i]:
+            c, k = divmod(int(flat), n_points)
+            if self.attempts[i, c, k] == 0:
+                break
+            if self.points[k] == UNLABELED_POINT:  # 已体现在 weakest_chapters 中
+                continue
+            weakest.append(
+                {
+                    "chapter": self.chapters[c],
+                    "point": self.points[k],
+                    "accuracy": round(float(self.accuracy[i, c, k]), 3),
+                    "attempts": int(self.attempts[i, c, k]),
+                }
+            )
+        context = {
+            "student_id": str(student_id),
+            "overall_accuracy": round(float(self.overall_accuracy[i]), 3),
+            "class_percentile": round(float(self.overall_percentile[i]), 1),
+            "exams": int(self.exams[i]),
+            "score_trend_per_exam": None if np.isnan(self.trend[i]) else round(float(self.trend[i]), 2),
+            "weakest_chapters": [
+                {
+                    "chapter": self.chapters[c],
+                    "accuracy": round(float(chapter_acc[c]), 3),
+                    "class_percentile": round(float(self.chapter_percentile[i, c]), 1),
+                }
+                for c in order[:top_chapters]
+            ],
+            "weakest_points": weakest,
+        }
+        if not percentiles:
+            del context["class_percentile"]
+            for chapter in context["weakest_chapters"]:
+                del chapter["class_percentile"]
+        return context
+
+    def class_context(self, top_chapters: int = 5, pass_line: float = 0.6) -> Dict[str, Any]:
+        """全班的精简掌握情况：各章节平均正确率（最弱的在前）与成绩趋势分布。"""
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # 没有数据的章节均值为 NaN
+            chapter_mean = np.nanmean(self.chapter_accuracy, axis=0)
+            mean_accuracy = np.nanmean(self.overall_accuracy)
+        below = np.sum(self.chapter_accuracy < pass_line, axis=0)
+        covered = np.sum(~np.isnan(self.chapter_accuracy), axis=0)
+        order = [c for c in np.argsort(chapter_mean) if covered[c]]
+        trend = self.trend[~np.isnan(self.trend)]
+        return {
+            "students": int(np.sum(~np.isnan(self.overall_accuracy))),
+            "mean_accuracy": round(float(mean_accuracy), 3),
+            "weakest_chapters": [
+                {
+                    "chapter": self.chapters[c],
+                    "mean_accuracy": round(float(chapter_mean[c]), 3),
+                    "students_below_pass": int(below[c]),
+                    "students": int(covered[c]),
+                }
+                for c in order[:top_chapters]
+            ],
+            "improving_students": int(np.sum(trend > 0)),
+            "declining_students": int(np.sum(trend < 0)),
+        }
+
+
+def _percentile_rank(values: np.ndarray) -> np.ndarray:
+    """按列计算百分位：同列有效值中严格低于自己的比例 × 100，NaN 保持为 NaN。
+
+    取值需在 [0, 1] 内。各列加上不同的偏移后只需一次排序和一次 searchsorted。
+    """
+    rows, cols = values.shape
+    valid = ~np.isnan(values)
+    offsets = np.arange(cols) * 4.0
+    keys = np.where(valid, values, 2.0) + offsets
+    below = np.searchsorted(np.sort(keys, axis=None), keys, side="left") - np.arange(cols) * rows
+    n = valid.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pct = np.where(n > 1, below / (n - 1), 1.0) * 100
+    return np.where(valid, pct, np.nan)
+
+
+def _slopes(scores: np.ndarray) -> np.ndarray:
+    """每行按有效值出现顺序做最小二乘直线拟合的斜率，少于两个有效值为 NaN。"""
+    valid = ~np.isnan(scores)
+    n = valid.sum(axis=1)
+    x = np.where(valid, np.cumsum(valid, axis=1) - 1, 0).astype(np.float64)
+    y = np.where(valid, scores, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_x = x.sum(axis=1) / n
+        mean_y = y.sum(axis=1) / n
+        dx = np.where(valid, x - mean_x[:, None], 0.0)
+        slope = (dx * (y - mean_y[:, None])).sum(axis=1) / (dx**2).sum(axis=1)
+    return np.where(n >= 2, slope, np.nan)
+
+
+def build_mastery(records: Dict[str, Any], weakest_n: int = 3) -> MasteryAnalytics:
+    """由 学生 ID -> 考试统计 构建分析结果。"""
+    student_ids = list(records)
+    chapters: Dict[str, int] = {}
+    points: Dict[str, int] = {UNLABELED_POINT: 0}
+    # 答题记录展平为 (学生, 章节, 知识点, 次数, 正确次数) 几列，最后一次性累加进张量
+    s_idx, c_idx, k_idx, counts, correct = [], [], [], [], []
+    paper_scores: List[List[float]] = []
+
+    def add(s: int, chapter: str, point: str, rate: float, count: float) -> None:
+        s_idx.append(s)
+        c_idx.append(chapters.setdefault(chapter, len(chapters)))
+        k_idx.append(points.setdefault(point, len(points)))
+        counts.append(count)
+        correct.append(rate * count)
+
+    for s, student_id in enumerate(student_ids):
+        data = _data(records[student_id])
+        questions = [
+            q
+            for key in ("questionAccuracyList", "problemQuestionList")
+            for q in data.get(key) or []
+            if isinstance(q, dict) and _rate(q) is not None
+        ]
+        for q in questions:
+            labels = [p.strip() for p in re.split(r"[,，、]", str(q.get("knowledgePoints") or "")) if p.strip()]
+            count = float(q.get("answerCount") or 1)
+            for point in labels or [UNLABELED_POINT]:
+                add(s, _chapter(q), point, _rate(q), count)
+        if not questions:
+            for item in data.get("chapterAccuracyList") or []:
+                rate = _rate(item)
+                if rate is not None:
+                    add(s, _chapter(item), UNLABELED_POINT, rate, float(item.get("answerCount") or 1))
+        papers = [p for p in data.get("paperStatisticsList") or [] if p.get("averageScore") is not None]
+        papers.sort(key=lambda p: str(p.get("paperId")).zfill(12))
+        paper_scores.append([float(p["averageScore"]) for p in papers])
+
+    shape = (len(student_ids), max(len(chapters), 1), len(points))
+    flat_index = np.ravel_multi_index((s_idx, c_idx, k_idx), shape) if s_idx else np.zeros(0, np.intp)
+    size = int(np.prod(shape))
+    attempts = np.bincount(flat_index, weights=counts, minlength=size).reshape(shape)
+    right = np.bincount(flat_index, weights=correct, minlength=size).reshape(shape)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        accuracy = right / attempts
+        chapter_attempts = attempts.sum(axis=2)
+        chapter_accuracy = right.sum(axis=2) / chapter_attempts
+        overall_accuracy = right.sum(axis=(1, 2)) / attempts.sum(axis=(1, 2))
+
+    width = max((len(p) for p in paper_scores), default=0)
+    scores = np.full((len(student_ids), max(width, 1)), np.nan)
+    for s, row in enumerate(paper_scores):
+        scores[s, : len(row)] = row
+
+    flat = np.where(attempts > 0, accuracy, np.inf).reshape(len(student_ids), -1)
+    n = min(weakest_n, flat.shape[1])
+    weakest = np.argsort(flat, axis=1, kind="stable")[:, :n]
+
+    return MasteryAnalytics(
+        student_ids=[str(s) for s in student_ids],
+        chapters=list(chapters) or ["未分章节"],
+        points=list(points),
+        attempts=attempts,
+        accuracy=accuracy,
+        chapter_accuracy=chapter_accuracy,
+        overall_accuracy=overall_accuracy,
+        chapter_percentile=_percentile_rank(chapter_accuracy),
+        overall_percentile=_percentile_rank(overall_accuracy[:, None])[:, 0],
+        trend=_slopes(scores),
+        exams=np.sum(~np.isnan(scores), axis=1),
+        weakest=weakest,
+    )
+
+
+ANALYTICS_CACHE_TTL = float(os.getenv("STUDENT_ANALYTICS_CACHE_TTL", 600))
+ANALYTICS_CACHE_MAX_ENTRIES = int(os.getenv("STUDENT_ANALYTICS_CACHE_MAX_ENTRIES", 64))
+
+# (course_id, principal) -> (写入时间, 数据版本, 分析结果)
+_analytics: "OrderedDict[Tuple[str, str], Tuple[float, Any, MasteryAnalytics]]" = OrderedDict()
+
+
+async def get_course_mastery(
+    course_id: str,
+    authorization: Optional[str] = None,
+    student_ids: Sequence[str] = (),
+) -> Optional[MasteryAnalytics]:
+    """返回一个班级的知识掌握分析，只使用以同一个 `authorization` 取到的考试统计。
+
+    `student_ids` 应为整个班级：先（经缓存）加载其中还没有数据的学生，百分位在这些学生
+    之间计算。不给出时使用该调用方已缓存的全部学生。没有任何数据时返回 None。
+    """
+    client = get_exam_status_client()
+    roster = [str(s) for s in student_ids] or None
+    version, records = client.course_snapshot(course_id, authorization, roster)
+    missing = [s for s in roster or () if s not in records]
+    if missing:
+        await client.prefetch(missing, course_id, authorization)
+        version, records = client.course_snapshot(course_id, authorization, roster)
+    if not records:
+        return None
+    key = (str(course_id), principal(authorization))
+    version = (version, tuple(records))
+    cached = _analytics.get(key)
+    if (
+        cached is not None
+        and cached[1] == version
+        and time.monotonic() - cached[0] < ANALYTICS_CACHE_TTL
+    ):
+        _analytics.move_to_end(key)
+        return cached[2]
+    # 大班级的考试统计解析可达数百毫秒，放到线程中避免阻塞事件循环
+    analytics = await asyncio.to_thread(build_mastery, records)
+    _analytics[key] = (time.monotonic(), version, analytics)
+    _analytics.move_to_end(key)
+    while len(_analytics) > ANALYTICS_CACHE_MAX_ENTRIES:
+        _analytics.popitem(last=False)
+    logger.info(
+        f"课程 {course_id} 知识掌握分析：{len(analytics.student_ids)} 名学生，"
+        f"{len(analytics.chapters)} 个章节，{len(analytics.points)} 个知识点"
+    )
+    return analytics
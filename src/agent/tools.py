@@ -1,12 +1,9 @@
-import http
+import json
 import logging
 import math
-import os
 import re
 from typing import List, Optional
 
-import httpx
-from langchain.chat_models import init_chat_model
 import numexpr
 from langchain.chains.openai_functions import create_structured_output_runnable
 from langchain_core.messages import SystemMessage
@@ -17,34 +14,22 @@ from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
 from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
-from langchain_mcp_adapters.client import MultiServerMCPClient
 from langchain_tavily import TavilySearch
 
-from src.agent import rag_agent
+from src.agent.exam_status_client import get_exam_status_client
+from src.agent.graph_registry import get_graph
+from src.agent.mcp_pool import get_pooled_rag_tools
+from src.agent.models import get_model
+from src.agent.student_analytics import build_mastery, get_course_mastery
 
 
 async def get_rag_tools(course_id: str = None):
     """
-    获取 RAG 工具
+    获取 RAG 工具，工具背后的 MCP 会话由进程级会话池按课程复用
     """
     logging.info(f"Retrieving RAG tools for user_id: {course_id}")
 
-    rag_client = MultiServerMCPClient(
-        {
-            "rag": {
-                "command": "uv",
-                "args": [
-                    "run",
-                    "src/agent/mcp/rag_tools.py",
-                    "--course-id",
-                    f"{course_id}",
-                ],
-                "transport": "stdio",
-            }
-        }
-    )
-
-    return await rag_client.get_tools()
+    return await get_pooled_rag_tools(course_id)
 
 
 @tool
@@ -80,7 +65,7 @@ async def rag_tool(question: str, config: RunnableConfig) -> str:
     :param config: 配置参数
     :return: 回答内容
     """
-    rag_graph = await rag_agent.make_graph()
+    rag_graph = await get_graph("rag_agent")
     response = await rag_graph.ainvoke(
         {
             "messages": [{"role": "user", "content": question}],
@@ -236,9 +221,7 @@ async def code_generate_tool(requirement: str, config: RunnableConfig) -> str:
     :param config: 配置参数
     :return: 生成的代码
     """
-    from src.agent.code_agent import build_code_generator
-
-    code_agent = build_code_generator()
+    code_agent = await get_graph("code_generator")
     response = await code_agent.ainvoke(
         {
             "messages": [{"role": "user", "content": requirement}],
@@ -256,9 +239,7 @@ async def code_validate_tool(code: str, config: RunnableConfig) -> str:
     :param config: 配置参数
     :return: 验证结果或建议
     """
-    from src.agent.code_agent import build_code_validator
-
-    validator_agent = build_code_validator()
+    validator_agent = await get_graph("code_validator")
     response = await validator_agent.ainvoke(
         {
             "messages": [{"role": "user", "content": code}],
@@ -268,47 +249,11 @@ async def code_validate_tool(code: str, config: RunnableConfig) -> str:
     return response["messages"][-1].content
 
 
-BACKEND_BASE_URL = "http://127.0.0.1:8080/api/eduagentx"
-
-
-@tool
-async def get_stu_exam_status(stu_id: str, config: RunnableConfig) -> str:
-    """
-    获取学生考试信息
-    :param stu_id: 学生ID
-    :param config: 配置参数
-    :return: 学生考试状态
-    """
-    # /exam/statistics/student/{studentId}/course/{courseId}
-
-    courseId = config.get("configurable", {}).get("courseId", None)
-
-    url = BACKEND_BASE_URL + f"/exam/statistics/student/{stu_id}/course/{courseId}"
-
-    user_info = config.get("configurable", {}).get("langgraph_auth_user", None)
-
-    auth_header = user_info.get("authorization", None)
-
-    headers = {
-        "Authorization": auth_header,
-        "Content-Type": "application/json",
-    }
-
-    resp = httpx.get(
-        url,
-        headers=headers,
-    )
-    if resp.status_code != http.HTTPStatus.OK:
-        raise ValueError(
-            f"Failed to get student exam status. Status code: {resp.status_code}, "
-            f"Response: {resp.text}"
-        )
-
-    prompt = f"""
+EXAM_EVALUATION_PROMPT = """
 请根据以下学生考试历史数据，自动生成一段对该学生知识点掌握情况的评价，内容需包括整体表现、各章节掌握情况、存在的主要问题及改进建议，语言简明、客观、具体。
 
 【学生考试数据】
-{resp.data}
+{data}
 
 【输出要求】
 - 先简要评价学生整体知识点掌握情况（如准确率、得分等）。
@@ -318,27 +263,37 @@ async def get_stu_exam_status(stu_id: str, config: RunnableConfig) -> str:
 
 请用中文输出评价内容。
 """
-    llm = init_chat_model(
-        model="qwen3-30b-a3b",
-        model_provider="openai",
-        temperature=0,
-        extra_body={"enable_thinking": False},
-        api_key=os.getenv("DASH_SCOPE_API_KEY", ""),
-        # rate_limiter=rate_limiter,
-        base_url=os.getenv(
-            "DASH_SCOPE_API_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1"
-        ),
-    )
 
-    response = await llm.ainvoke(
-        {
-            "messages": [{"role": "user", "content": prompt}],
-        },
-        config,
-    )
 
-    return (
-        response["messages"][-1].content.strip()
-        if response["messages"]
-        else "No response generated."
-    )
+@tool
+async def get_stu_exam_status(stu_id: str, config: RunnableConfig) -> str:
+    """
+    获取学生考试信息
+    :param stu_id: 学生ID
+    :param config: 配置参数
+    :return: 学生考试状态
+    """
+    configurable = config.get("configurable", {})
+    course_id = configurable.get("course_id") or configurable.get("courseId")
+    user_info = configurable.get("langgraph_auth_user") or {}
+
+    async def evaluate(data) -> str:
+        prompt = EXAM_EVALUATION_PROMPT.format(data=json.dumps(data, ensure_ascii=False))
+        response = await get_model("executor", config).ainvoke(prompt, config)
+        return response.content.strip() or "No response generated."
+
+    # 优先返回本地计算的掌握情况；统计数据中没有章节信息时才让模型总结
+    client = get_exam_status_client()
+    authorization = user_info.get("authorization")
+    data = await client.fetch(stu_id, course_id, authorization)
+    roster = client.roster(course_id, authorization)
+    if str(stu_id) in roster:
+        # 批改前预取了整个班级时才给出班级百分位
+        analytics = await get_course_mastery(course_id, authorization, student_ids=roster)
+        context = analytics.student_context(stu_id) if analytics is not None else None
+    else:
+        context = build_mastery({str(stu_id): data}).student_context(stu_id, percentiles=False)
+    if context is not None:
+        return json.dumps(context, ensure_ascii=False)
+    # 原始统计与评价按（学生，课程）缓存，同一道题的多位评审员不再重复拉取和总结
+    return await client.evaluation(stu_id, course_id, authorization, evaluate)
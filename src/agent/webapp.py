@@ -1,13 +1,157 @@
 # main.py
 import contextlib
-from fastapi import FastAPI
+import logging
+import os
+
+import httpx
+import redis.asyncio as aioredis
+from fastapi import FastAPI, Response
 
 from fastapi import Request
 
-app = FastAPI()
+from src.agent import graph_registry, metrics
+from src.agent.exam_status_client import exam_status_stats
+from src.agent.llm_cache import get_response_cache
+from src.agent.loop_monitor import get_loop_monitor
+from src.agent.mcp.rag_cache import generation_key
+from src.agent.mcp_pool import get_rag_session_pool
+from src.agent.rate_limit import governor_stats
+from src.agent.relevance_grader import get_relevance_grader
+from src.agent.semantic_cache import get_semantic_cache
+from src.agent.streaming import ttft_stats
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    if os.getenv("LOOP_LAG_MONITOR", "true").lower() in ("1", "true", "yes"):
+        get_loop_monitor().start()
+    # 启动时预编译各个图，首个请求不再承担构建开销
+    if os.getenv("GRAPH_WARM_UP", "true").lower() in ("1", "true", "yes"):
+        build_seconds = await graph_registry.warm_up()
+        logging.info(f"已预编译 {len(build_seconds)} 个图: {build_seconds}")
+    yield
+    semantic_cache = get_semantic_cache()
+    if semantic_cache is not None:
+        await semantic_cache.flush()
+    await get_loop_monitor().stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 @app.get("/hello")
 async def hello():
     """A simple hello world endpoint."""
     return {"message": "Hello, world!"}
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """节点与模型调用的耗时、token、费用和错误数（Prometheus 文本格式）。"""
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/stats/mcp-pool")
+async def mcp_pool_stats():
+    """RAG MCP 会话池的命中率与子进程启动次数。"""
+    return get_rag_session_pool().stats()
+
+
+@app.get("/stats/graphs")
+async def graph_stats():
+    """已编译的图及其构建耗时。"""
+    return graph_registry.stats()
+
+
+@app.get("/stats/event-loop")
+async def event_loop_stats():
+    """事件循环的调度延迟，blocked 表示超过阈值的次数。"""
+    return get_loop_monitor().stats()
+
+
+@app.get("/stats/relevance-grader")
+async def relevance_grader_stats():
+    """相关性评分器的大模型调用率、延迟及与大模型的一致率。"""
+    return get_relevance_grader().stats()
+
+
+@app.post("/rag/relevance-grader/calibrate")
+async def calibrate_relevance_grader():
+    """用已记录的大模型结论重新拟合 cross-encoder 的校准参数。"""
+    grader = get_relevance_grader()
+    return {"calibration": list(grader.calibrate()), "samples": len(grader.samples)}
+
+
+@app.get("/stats/llm-governor")
+async def llm_governor_stats():
+    """各模型的限流状态：排队数、在途数、当前并发上限与等待时间。"""
+    return governor_stats()
+
+
+@app.get("/stats/exam-status")
+async def exam_status_client_stats():
+    """学生考试统计客户端的请求、重试次数与缓存命中率。"""
+    return exam_status_stats()
+
+
+@app.get("/stats/ttft")
+async def ttft():
+    """RAG 代理回答的首 token 延迟分位数。"""
+    return ttft_stats.stats()
+
+
+@app.get("/stats/semantic-cache")
+async def semantic_cache_stats():
+    """RAG 答案语义缓存的命中率，未开启时返回 enabled=false。"""
+    semantic_cache = get_semantic_cache()
+    if semantic_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **semantic_cache.stats()}
+
+
+@app.get("/stats/llm-cache")
+async def llm_cache_stats():
+    """温度为 0 的模型调用结果缓存：按图统计命中率与节省的耗时。"""
+    response_cache = get_response_cache()
+    if response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **response_cache.stats()}
+
+
+@app.post("/rag/cache/invalidate/{course_id}")
+async def invalidate_rag_cache(course_id: str):
+    """上传新文档后调用（static/upload.html 上传成功后自动调用），使该课程的知识库查询缓存失效。"""
+    result = {"course_id": course_id}
+
+    # Redis 共享层：递增版本号，所有 MCP 服务进程在数秒内感知
+    redis_url = os.getenv("RAG_CACHE_REDIS_URL")
+    if redis_url:
+        redis_client = aioredis.Redis.from_url(redis_url)
+        try:
+            result["generation"] = await redis_client.incr(generation_key(course_id))
+        finally:
+            await redis_client.aclose()
+
+    rag_mcp_url = os.getenv("RAG_MCP_URL")
+    if rag_mcp_url:
+        # 多租户服务：直接清理其进程内缓存
+        url = httpx.URL(rag_mcp_url).join(f"/cache/invalidate/{course_id}")
+        try:
+            async with httpx.AsyncClient(timeout=10.0) as client:
+                resp = await client.post(url)
+                resp.raise_for_status()
+        except httpx.HTTPError as e:
+            logging.warning(f"通知 RAG MCP 服务清理缓存失败: {e}")
+    else:
+        # stdio 模式：关闭该课程的会话，进程内缓存随子进程一起释放
+        await get_rag_session_pool().evict(course_id)
+
+    semantic_cache = get_semantic_cache()
+    if semantic_cache is not None:
+        await semantic_cache.invalidate(course_id)
+
+    response_cache = get_response_cache()
+    if response_cache is not None:
+        await response_cache.invalidate(course_id)
+
+    return result
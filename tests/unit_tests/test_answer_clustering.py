@@ -0,0 +1,67 @@
+import math
+
+import numpy as np
+import pytest
+
+from src.agent import answer_clustering
+from src.agent import batch_grading_agent as bga
+from src.agent.answer_clustering import cluster_exact, normalize_answer
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("ＴＣＰ　三次握手", "tcp 三次握手"),
+        ("  SYN\n\tSYN-ACK   ACK ", "syn syn ack ack"),
+        ("第一步：发送SYN。第二步，回复！", "第一步 发送syn 第二步 回复"),
+        ("约等于１．５", "约等于1.5"),
+        ("结果是 -3", "结果是 -3"),
+        ("", ""),
+        (None, ""),
+    ],
+)
+def test_normalize_answer(text, expected):
+    assert normalize_answer(text) == expected
+
+
+def test_normalize_keeps_numbers_apart():
+    assert normalize_answer("1.5") != normalize_answer("15")
+    assert normalize_answer("-3") != normalize_answer("3")
+
+
+def _answers(texts):
+    return [bga.StudentAnswer(student_id=f"s{i}", answer=t) for i, t in enumerate(texts)]
+
+
+def test_cluster_exact_groups_normalized_duplicates_in_order():
+    clusters = cluster_exact(_answers(["TCP，三次握手", "B", "ｔｃｐ  三次握手。", "b"]))
+    assert [(c.representative_id, c.members) for c in clusters] == [
+        ("s0", ["s0", "s2"]),
+        ("s1", ["s1", "s3"]),
+    ]
+
+
+class _Encoder:
+    """按答案文本返回固定的单位向量：a 与 b 的余弦相似度为 0.98，c 与两者正交。"""
+
+    angle = math.acos(0.98)
+    vectors = {"a": [1.0, 0.0], "b": [math.cos(angle), math.sin(angle)], "c": [0.0, 1.0]}
+
+    def encode(self, texts, normalize_embeddings=True):
+        return np.array([self.vectors[t] for t in texts])
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    "mode, threshold, expected",
+    [
+        ("near", 0.97, {"s0": ["s0", "s3", "s1"], "s2": ["s2"]}),
+        ("near", 0.99, {"s0": ["s0", "s3"], "s1": ["s1"], "s2": ["s2"]}),
+        ("exact", 0.5, {"s0": ["s0", "s3"], "s1": ["s1"], "s2": ["s2"]}),
+        ("off", 0.5, {"s0": ["s0"], "s1": ["s1"], "s2": ["s2"], "s3": ["s3"]}),
+    ],
+)
+async def test_group_answers_merge_threshold(monkeypatch, mode, threshold, expected):
+    monkeypatch.setattr(answer_clustering, "get_encoder", lambda model_name: _Encoder())
+    config = {"configurable": {"answer_clustering": mode, "answer_similarity_threshold": threshold}}
+    assert await bga.group_answers(_answers(["a", "b", "c", "A"]), config) == expected
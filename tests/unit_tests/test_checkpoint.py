@@ -0,0 +1,26 @@
+import sys
+
+import pytest
+
+from src.agent.checkpoint import open_checkpointer
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_sqlite_checkpointer_opens(tmp_path):
+    async with open_checkpointer(f"sqlite:///{tmp_path / 'checkpoints.sqlite'}") as saver:
+        assert saver is not None
+
+
+@pytest.mark.parametrize(
+    "url, module",
+    [
+        ("postgresql://localhost/db", "langgraph.checkpoint.postgres.aio"),
+        ("redis://localhost:6379", "langgraph.checkpoint.redis.aio"),
+    ],
+)
+async def test_missing_optional_saver_names_the_extra(monkeypatch, url, module):
+    monkeypatch.setitem(sys.modules, module, None)
+    with pytest.raises(ImportError, match=r"--extra checkpoint"):
+        async with open_checkpointer(url):
+            pass
@@ -0,0 +1,74 @@
+import json
+from collections import OrderedDict
+
+import httpx
+import pytest
+
+from src.agent import exam_status_client, student_analytics, tools
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def client(monkeypatch):
+    requests = []
+
+    def handler(request):
+        requests.append((request.url.path, request.headers.get("authorization")))
+        student_id = request.url.path.split("/")[-3]
+        rate = 40 + 10 * int(student_id[1:])
+        chapters = [{"chapterName": "第一章", "accuracyRate": rate, "answerCount": 4}]
+        return httpx.Response(200, json={"data": {"chapterAccuracyList": chapters}})
+
+    client = exam_status_client.ExamStatusClient(base_url="http://backend")
+    client._client = httpx.AsyncClient(
+        base_url="http://backend", transport=httpx.MockTransport(handler)
+    )
+    client.requests = requests
+    monkeypatch.setattr(exam_status_client, "get_exam_status_client", lambda: client)
+    monkeypatch.setattr(student_analytics, "get_exam_status_client", lambda: client)
+    monkeypatch.setattr(tools, "get_exam_status_client", lambda: client)
+    monkeypatch.setattr(student_analytics, "_analytics", OrderedDict())
+    return client
+
+
+def _config(token):
+    return {"configurable": {"course_id": "c1", "langgraph_auth_user": {"authorization": token}}}
+
+
+async def test_cache_is_not_shared_between_tokens(client):
+    await client.fetch("s1", "c1", "token-a")
+    assert client.course_snapshot("c1", "token-b")[1] == {}
+
+    await client.fetch("s1", "c1", "token-b")
+    assert [auth for _, auth in client.requests] == ["token-a", "token-b"]
+    assert list(client.course_snapshot("c1", "token-a")[1]) == ["s1"]
+
+
+async def test_percentiles_only_for_prefetched_roster(client):
+    alone = json.loads(await tools.get_stu_exam_status.ainvoke({"stu_id": "s1"}, _config("t")))
+    assert "class_percentile" not in alone
+    assert all("class_percentile" not in c for c in alone["weakest_chapters"])
+
+    await client.prefetch(["s0", "s1", "s2"], "c1", "t", roster=True)
+    ranked = json.loads(await tools.get_stu_exam_status.ainvoke({"stu_id": "s1"}, _config("t")))
+    assert ranked["class_percentile"] == 50.0
+
+    # 另一个调用方没有预取过班级，拿不到基于他人数据的百分位
+    other = json.loads(await tools.get_stu_exam_status.ainvoke({"stu_id": "s1"}, _config("u")))
+    assert "class_percentile" not in other
+
+
+async def test_analytics_cache_is_bounded(client, monkeypatch):
+    monkeypatch.setattr(student_analytics, "ANALYTICS_CACHE_MAX_ENTRIES", 2)
+    for token in ("t1", "t2", "t3"):
+        await student_analytics.get_course_mastery("c1", token, student_ids=["s0", "s1"])
+    assert [key[1] for key in student_analytics._analytics] == [
+        exam_status_client.principal("t2"),
+        exam_status_client.principal("t3"),
+    ]
+
+    first = await student_analytics.get_course_mastery("c1", "t3", student_ids=["s0", "s1"])
+    assert await student_analytics.get_course_mastery("c1", "t3", ["s0", "s1"]) is first
+    monkeypatch.setattr(student_analytics, "ANALYTICS_CACHE_TTL", 0)
+    assert await student_analytics.get_course_mastery("c1", "t3", ["s0", "s1"]) is not first
@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+from langgraph.checkpoint.memory import InMemorySaver
+
+from src.agent import batch_grading_agent as bga
+
+pytestmark = pytest.mark.anyio
+
+
+def _question():
+    return bga.Question(
+        questionType="short_answer",
+        questionText="简述 TCP 三次握手的过程",
+        difficulty="medium",
+        options=[],
+        correctAnswer="SYN、SYN-ACK、ACK",
+        answerExplanation="",
+    )
+
+
+def _answers(ids):
+    return [bga.StudentAnswer(student_id=i, answer=f"{i} 的答案") for i in ids]
+
+
+class _StubReviews:
+    """替代 review_student：记录批改过的学生，`fail_after` 次成功之后抛出不会重试的异常。"""
+
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.graded = []
+
+    async def __call__(self, question, answer, config, limit=None):
+        if self.fail_after is not None and len(self.graded) >= self.fail_after:
+            # 让已成功的分支先完成并写入检查点
+            await asyncio.sleep(0.05)
+            raise RuntimeError("模拟批改中途崩溃")
+        self.graded.append(answer.student_id)
+        return [
+            bga.SingleGradingResult(
+                student_id=answer.student_id,
+                is_correct=True,
+                score=0.8,
+                analysis="",
+                errors=[],
+                reviewer=reviewer,
+            )
+            for reviewer in ("reviewer_A", "reviewer_B")
+        ]
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    async def no_report(state, config):
+        return {}
+
+    monkeypatch.setattr(bga, "report_generator_node", no_report)
+    return bga.build_checkpointed_grading_workflow(InMemorySaver())
+
+
+def _config(thread_id):
+    return {"configurable": {"thread_id": thread_id, "answer_clustering": "off"}}
+
+
+async def test_resume_grades_only_unfinished_students(graph, monkeypatch):
+    ids = [f"s{i}" for i in range(20)]
+    state = {"question": _question(), "student_answers": _answers(ids)}
+    config = _config("resume")
+
+    crashing = _StubReviews(fail_after=7)
+    monkeypatch.setattr(bga, "review_student", crashing)
+    with pytest.raises(RuntimeError):
+        await graph.ainvoke(state, config)
+    assert len(crashing.graded) == 7
+
+    resumed = _StubReviews()
+    monkeypatch.setattr(bga, "review_student", resumed)
+    result = await graph.ainvoke(None, config)
+
+    assert sorted(resumed.graded) == sorted(set(ids) - set(crashing.graded))
+    assert [r.student_id for r in result["final_grading_results"]] == ids
+
+
+async def test_second_run_on_thread_drops_previous_students(graph, monkeypatch):
+    monkeypatch.setattr(bga, "review_student", _StubReviews())
+    config = _config("rerun")
+    await graph.ainvoke(
+        {"question": _question(), "student_answers": _answers(["a", "b", "c"])}, config
+    )
+    result = await graph.ainvoke(
+        {"question": _question(), "student_answers": _answers(["d", "e"])}, config
+    )
+
+    assert [r.student_id for r in result["final_grading_results"]] == ["d", "e"]
+    assert set(result["review_results"]) == {"d", "e"}
+
+
+async def test_branches_share_grading_concurrency(graph, monkeypatch):
+    running = peak = 0
+
+    async def review(question, answer, config, limit=None):
+        nonlocal running, peak
+        async with limit:
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+        return await _StubReviews()(question, answer, config)
+
+    monkeypatch.setattr(bga, "review_student", review)
+    config = _config("limit")
+    config["configurable"]["grading_concurrency"] = 3
+    await graph.ainvoke(
+        {"question": _question(), "student_answers": _answers([f"s{i}" for i in range(12)])},
+        config,
+    )
+    assert peak == 3
+
+
+async def test_default_path_streams_each_student(graph, monkeypatch):
+    monkeypatch.setattr(bga, "review_student", _StubReviews())
+    ids = [f"s{i}" for i in range(5)]
+    events = [
+        chunk
+        async for chunk in graph.astream(
+            {"question": _question(), "student_answers": _answers(ids)},
+            _config("stream"),
+            stream_mode="custom",
+        )
+        if chunk.get("event") == "student_graded"
+    ]
+
+    assert sorted(e["result"]["student_id"] for e in events) == ids
+    assert all(e["total"] == len(ids) for e in events)
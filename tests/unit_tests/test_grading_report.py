@@ -0,0 +1,53 @@
+import pytest
+
+from src.agent.grading_report import AnalysisGroup, ErrorPattern, ErrorPatterns, summarize_errors
+
+pytestmark = pytest.mark.anyio
+
+
+class _Summarizer:
+    """每块归纳成一条模式（人数为块内人数之和）；`failing` 中的评语所在块每次都失败。"""
+
+    def __init__(self, failing=(), flaky=()):
+        self.failing = set(failing)
+        self.flaky = set(flaky)
+        self.calls = 0
+
+    def with_structured_output(self, schema):
+        return self
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        if any(f in prompt for f in self.failing):
+            raise RuntimeError("模型调用失败")
+        for f in list(self.flaky):
+            if f in prompt:
+                self.flaky.discard(f)
+                raise RuntimeError("偶发失败")
+        count = sum(int(line[1:].split(" ")[0]) for line in prompt.splitlines() if line.startswith("["))
+        return ErrorPatterns(patterns=[ErrorPattern(description="归纳", student_count=count)])
+
+
+def _groups(n):
+    return [AnalysisGroup(analysis=f"评语{i:02d}" + "错" * 10, count=i + 1, mean_score=0.5) for i in range(n)]
+
+
+async def test_failed_chunk_keeps_every_entry():
+    groups = _groups(12)
+    llm = _Summarizer(failing=["评语00"])
+    patterns = await summarize_errors("题目", groups, llm, token_budget=60, max_patterns=2)
+
+    # 失败的块原样保留，其余块归纳后总人数不变
+    assert any(p.startswith("[1 人") for p in patterns)
+    total = sum(int(p[1:].split(" ")[0]) for p in patterns)
+    assert total == sum(g.count for g in groups)
+
+
+async def test_failed_chunk_is_retried():
+    llm = _Summarizer(flaky=["评语00"])
+    patterns = await summarize_errors("题目", _groups(8), llm, token_budget=60)
+
+    # 两块各调用一次，失败的那块重试一次
+    assert llm.calls == 3
+    assert len(patterns) == 2
+    assert sum(int(p[1:].split(" ")[0]) for p in patterns) == 36
@@ -0,0 +1,65 @@
+import json
+
+import httpx
+import pytest
+
+from src.agent import metrics, models, rate_limit
+
+pytestmark = pytest.mark.anyio
+
+
+def _sse(*chunks):
+    body = "".join(f"data: {json.dumps(c)}\n\n" for c in chunks) + "data: [DONE]\n\n"
+    return body.encode()
+
+
+def _chunk(choices, usage=None):
+    return {
+        "id": "chatcmpl-1",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "stub-model",
+        "choices": choices,
+        "usage": usage,
+    }
+
+
+async def test_streamed_call_reports_token_usage(monkeypatch):
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        body = _sse(
+            _chunk([{"index": 0, "delta": {"role": "assistant", "content": "回答"}}]),
+            _chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}]),
+            _chunk([], {"prompt_tokens": 12, "completion_tokens": 3, "total_tokens": 15}),
+        )
+
+        async def stream():
+            yield body
+
+        return httpx.Response(
+            200, headers={"content-type": "text/event-stream"}, content=stream()
+        )
+
+    governor = rate_limit.ModelGovernor("stub-model", rps=100, tpm=100_000, max_in_flight=4)
+    monkeypatch.setattr(rate_limit, "_governors", {"stub-model": governor})
+    monkeypatch.setattr(
+        models,
+        "_http_async_client",
+        httpx.AsyncClient(
+            transport=rate_limit.GovernedAsyncTransport(httpx.MockTransport(handler))
+        ),
+    )
+    monkeypatch.setattr(metrics.LLM_TOKENS, "_values", {})
+    model = models._build(models.ModelSpec("stub-model", base_url="http://llm", api_key="k"))
+
+    # 进程共享的 MetricsCallbackHandler 通过 configure hook 自动挂到这次调用上
+    chunks = [c async for c in model.astream("问题")]
+
+    assert requests[0]["stream_options"] == {"include_usage": True}
+    usage = sum(chunks[1:], chunks[0]).usage_metadata
+    assert (usage["input_tokens"], usage["output_tokens"]) == (12, 3)
+    tokens = {labels[-1]: value for labels, value in metrics.LLM_TOKENS._values.items()}
+    assert tokens == {"prompt": 12, "completion": 3}
+    assert governor.stats()["tokens_last_minute"] == 15
@@ -0,0 +1,64 @@
+import pytest
+
+from src.agent.batch_grading_agent import Option, Question
+from src.agent.objective_grading import MultipleChoiceScoring, grade_choice, parse_choice
+
+
+def _question(question_type, correct, texts=("CPU", "RAM", "TCP", "磁盘")):
+    options = [
+        Option(optionLabel=label, optionText=text, isCorrect=label in correct)
+        for label, text in zip("ABCD", texts)
+    ]
+    return Question(
+        questionType=question_type,
+        questionText="",
+        difficulty="easy",
+        options=options,
+        correctAnswer=",".join(correct),
+        answerExplanation="",
+    )
+
+
+@pytest.mark.parametrize(
+    "answer, expected",
+    [
+        ("A,B,D", {"A", "B", "D"}),
+        ("abd", {"A", "B", "D"}),
+        ("b、d", {"B", "D"}),
+        ("B. RAM", {"B"}),
+        ("ｃ", {"C"}),
+        ("磁盘", {"D"}),
+        ("ram", {"B"}),
+        ("CPU", {"A"}),
+        ("TCP", {"C"}),
+        ("E", set()),
+        ("不知道", set()),
+        ("", set()),
+    ],
+)
+def test_parse_choice(answer, expected):
+    assert parse_choice(answer, _question("multiple_choice", "A").options) == expected
+
+
+def test_single_choice():
+    question = _question("single_choice", "C")
+    assert grade_choice(question, "TCP")[0] == 1.0
+    assert grade_choice(question, "A")[0] == 0.0
+    assert grade_choice(question, "?")[0] == 0.0
+
+
+@pytest.mark.parametrize(
+    "scoring, answer, score",
+    [
+        (MultipleChoiceScoring.all_or_nothing, "ABD", 1.0),
+        (MultipleChoiceScoring.all_or_nothing, "AB", 0.0),
+        (MultipleChoiceScoring.fixed, "AB", 0.5),
+        (MultipleChoiceScoring.fixed, "ABC", 0.0),
+        (MultipleChoiceScoring.proportional, "AB", 2 / 3),
+        (MultipleChoiceScoring.proportional, "D", 1 / 3),
+        (MultipleChoiceScoring.proportional, "CD", 0.0),
+    ],
+)
+def test_multiple_choice_scoring(scoring, answer, score):
+    question = _question("multiple_choice", "ABD")
+    assert grade_choice(question, answer, scoring)[0] == pytest.approx(score)
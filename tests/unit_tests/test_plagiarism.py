@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from src.agent import batch_grading_agent as bga
+from src.agent.plagiarism import detect_overlaps
+
+REFERENCE = "客户端发送 SYN 报文，服务器回复 SYN-ACK 报文，客户端再发送 ACK 报文，双方进入 ESTABLISHED 状态"
+SOURCE = (
+    "TCP 通过三次握手建立连接，客户端首先发送 SYN 报文并进入 SYN_SENT 状态，"
+    "服务器收到后回复 SYN-ACK，握手可以防止历史连接的重复建立，我认为序列号最关键"
+)
+
+
+def _ids(clusters):
+    return [sorted(c.student_ids) for c in clusters]
+
+
+def test_exact_copy_is_grouped():
+    answers = [
+        ("a", SOURCE),
+        ("b", "  " + SOURCE.replace("，", " ， ") + "\n"),  # 只有空白不同
+        ("c", "UDP 是无连接的协议，不需要握手，也不保证可靠传输，适合实时音视频等对延迟敏感的场景"),
+    ]
+    [cluster] = detect_overlaps(answers)
+    assert sorted(cluster.student_ids) == ["a", "b"]
+    assert cluster.similarity == cluster.max_similarity == 1.0
+
+
+def test_near_copy_is_grouped_and_distinct_answers_are_not():
+    near = SOURCE.replace("我认为", "我觉得").replace("最关键", "很重要")
+    answers = [("a", SOURCE), ("b", near), ("c", SOURCE[::-1])]
+    assert _ids(detect_overlaps(answers, threshold=0.7)) == [["a", "b"]]
+    assert detect_overlaps(answers, threshold=0.99) == []
+
+
+def test_answers_close_to_reference_are_excluded():
+    answers = [("a", REFERENCE), ("b", REFERENCE + "。"), ("c", SOURCE), ("d", SOURCE)]
+    assert _ids(detect_overlaps(answers)) == [["a", "b"], ["c", "d"]]
+    assert _ids(detect_overlaps(answers, references=[REFERENCE])) == [["c", "d"]]
+
+
+def test_short_answers_are_ignored():
+    assert detect_overlaps([("a", "SYN、SYN-ACK、ACK"), ("b", "SYN、SYN-ACK、ACK")]) == []
+
+
+@pytest.mark.anyio
+async def test_report_failure_cancels_overlap_detection(monkeypatch):
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def slow_overlaps(state, config):
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def failing_groups(*args, **kwargs):
+        await started.wait()
+        raise RuntimeError("归纳失败")
+
+    monkeypatch.setattr(bga, "_suspicious_overlaps", slow_overlaps)
+    monkeypatch.setattr(bga, "group_analyses", failing_groups)
+    question = bga.Question(
+        questionType="short_answer",
+        questionText="",
+        difficulty="easy",
+        options=[],
+        correctAnswer=REFERENCE,
+        answerExplanation="",
+    )
+    with pytest.raises(RuntimeError):
+        await bga.report_generator_node(
+            {"question": question, "final_grading_results": [], "student_answers": []}, {}
+        )
+    await asyncio.sleep(0)
+    assert cancelled.is_set()
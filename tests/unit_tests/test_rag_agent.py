@@ -0,0 +1,95 @@
+import pytest
+from langchain_core.messages import AIMessageChunk
+from langchain_core.tools import StructuredTool
+from langgraph.constants import TAG_NOSTREAM
+
+from src.agent import models, rag_agent
+
+pytestmark = pytest.mark.anyio
+
+
+class _Grader:
+    """记录收到的运行配置的桩评分模型。"""
+
+    def __init__(self):
+        self.configs = []
+
+    def with_structured_output(self, schema):
+        return self
+
+    async def ainvoke(self, messages, config=None):
+        self.configs.append(config)
+        return rag_agent.GradeDocuments(relevant="yes")
+
+
+async def test_llm_grader_uses_run_config(monkeypatch):
+    monkeypatch.setattr(models, "_models", {})
+    default, override = _Grader(), _Grader()
+    models.register_model("grader", default)
+    models._models[("grader", (("model", "qwen-plus"),))] = override
+    config = {
+        "configurable": {"course_id": "c1", "models": {"grader": {"model": "qwen-plus"}}},
+        "metadata": {"request": "r1"},
+        "tags": ["rag"],
+    }
+
+    assert await rag_agent.llm_grade_documents("问题", "上下文", config=config)
+
+    assert not default.configs
+    [used] = override.configs
+    assert set(used["tags"]) == {"rag", TAG_NOSTREAM}
+    assert used["metadata"]["request"] == "r1"
+    assert used["configurable"]["course_id"] == "c1"
+
+
+class _Responder:
+    """多查询改写与生成回答的桩模型，记录生成时收到的提示词。"""
+
+    def __init__(self):
+        self.prompts = []
+        self.schema = None
+
+    def with_structured_output(self, schema):
+        responder = _Responder()
+        responder.prompts, responder.schema = self.prompts, schema
+        return responder
+
+    async def ainvoke(self, messages, config=None):
+        return self.schema(queries=["改写一", "改写二"])
+
+    async def astream(self, messages, config=None):
+        self.prompts.append(messages[-1]["content"])
+        yield AIMessageChunk(content="回答")
+
+
+async def test_multi_query_keeps_context_out_of_messages(monkeypatch):
+    monkeypatch.setattr(models, "_models", {})
+    responder = _Responder()
+    models.register_model("responder", responder)
+    models.register_model("grader", _Grader())
+
+    async def retrieve(query: str, mode: str, only_need_context: bool) -> str:
+        """Query the knowledge base."""
+        return f"{query} 的片段\n\n公共片段"
+
+    async def get_rag_tools(course_id=None):
+        return [StructuredTool.from_function(coroutine=retrieve, name="query_rag")]
+
+    monkeypatch.setattr(rag_agent, "get_rag_tools", get_rag_tools)
+    graph = await rag_agent.make_graph()
+    result = await graph.ainvoke(
+        {"messages": [("user", "问题")], "max_rewrite": 3, "rewrite_count": 0},
+        {
+            "configurable": {
+                "course_id": "c1",
+                "retrieval_mode": "multi_query",
+                "relevance_grader": "llm",
+                "bypass_semantic_cache": True,
+            }
+        },
+    )
+
+    assert [m.type for m in result["messages"]] == ["human", "ai"]
+    assert not result["messages"][-1].tool_calls
+    assert result["retrieved_context"].count("公共片段") == 1
+    assert "改写二 的片段" in responder.prompts[0]
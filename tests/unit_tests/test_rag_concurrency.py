@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.tools import StructuredTool
+
+from src.agent import models, rag_agent
+from src.agent.loop_monitor import LoopLagMonitor
+
+pytestmark = pytest.mark.anyio
+
+LATENCY = 0.1
+RUNS = 10
+
+
+class _FakeModel:
+    """只实现 rag_agent 用到的接口；`blocking` 时在 ainvoke 里同步 sleep，模拟在 async 节点中调用同步 invoke。"""
+
+    def __init__(self, blocking: bool, tools=None, schema=None):
+        self.blocking = blocking
+        self.tools = tools
+        self.schema = schema
+
+    def bind_tools(self, tools):
+        return _FakeModel(self.blocking, tools=tools)
+
+    def with_structured_output(self, schema):
+        return _FakeModel(self.blocking, schema=schema)
+
+    async def astream(self, messages, config=None):
+        yield await self.ainvoke(messages, config)
+
+    async def ainvoke(self, messages, config=None):
+        if self.blocking:
+            time.sleep(LATENCY)
+        else:
+            await asyncio.sleep(LATENCY)
+        if self.schema is not None:
+            return self.schema(relevant="yes")
+        if self.tools:
+            return AIMessage(
+                content="",
+                tool_calls=[{"name": self.tools[0].name, "args": {"query": "q"}, "id": "call-0"}],
+            )
+        return AIMessage(content="answer")
+
+
+async def _query_rag_tool(query: str) -> str:
+    """Query the knowledge base."""
+    await asyncio.sleep(LATENCY)
+    return "stub context"
+
+
+async def _run_concurrently(monkeypatch, blocking: bool):
+    monkeypatch.setattr(models, "_models", {})
+    model = _FakeModel(blocking)
+    models.register_model("responder", model)
+    models.register_model("grader", model)
+    tools = [StructuredTool.from_function(coroutine=_query_rag_tool)]
+
+    async def get_rag_tools(course_id=None):
+        return tools
+
+    monkeypatch.setattr(rag_agent, "get_rag_tools", get_rag_tools)
+    graph = await rag_agent.make_graph()
+    config = {
+        "configurable": {
+            "course_id": "test",
+            "bypass_semantic_cache": True,
+            "relevance_grader": "llm",
+        }
+    }
+
+    monitor = LoopLagMonitor(threshold=LATENCY / 2, interval=0.01)
+    monitor.start()
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            graph.ainvoke(
+                {"messages": [("user", f"问题 {i}")], "max_rewrite": 3, "rewrite_count": 0},
+                config,
+            )
+            for i in range(RUNS)
+        )
+    )
+    elapsed = time.perf_counter() - start
+    await monitor.stop()
+    return elapsed, monitor.stats()
+
+
+async def test_concurrent_rag_runs_do_not_block_event_loop(monkeypatch):
+    elapsed, stats = await _run_concurrently(monkeypatch, blocking=False)
+
+    assert stats["blocked"] == 0
+    # 每次运行依次经过 4 次桩调用；并发运行的总耗时应接近单次运行
+    assert elapsed < 4 * LATENCY * 3
+
+
+async def test_monitor_detects_blocking_model(monkeypatch):
+    elapsed, stats = await _run_concurrently(monkeypatch, blocking=True)
+
+    assert stats["blocked"] > 0
+    assert elapsed > 3 * LATENCY * RUNS
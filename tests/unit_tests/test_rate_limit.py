@@ -0,0 +1,89 @@
+import json
+
+import httpx
+import pytest
+
+from src.agent import rate_limit
+
+BODY = json.dumps({"model": "m", "messages": [], "max_tokens": 100, "stream": True})
+SSE = [
+    b'data: {"choices": [{"delta": {"content": "hi"}}], "usage": null}\n\n',
+    b'data: {"choices": [], "usage": {"total_tokens": ',
+    b'42}}\n\ndata: [DONE]\n\n',
+]
+
+
+@pytest.fixture
+def governor(monkeypatch):
+    governor = rate_limit.ModelGovernor("m", rps=100, tpm=10_000, max_in_flight=4)
+    monkeypatch.setattr(rate_limit, "_governors", {"m": governor})
+    return governor
+
+
+@pytest.mark.anyio
+async def test_async_stream_holds_slot_until_closed(governor):
+    async def sse():
+        for chunk in SSE:
+            yield chunk
+
+    transport = rate_limit.GovernedAsyncTransport(
+        httpx.MockTransport(
+            lambda request: httpx.Response(
+                200, headers={"content-type": "text/event-stream"}, content=sse()
+            )
+        )
+    )
+    async with httpx.AsyncClient(transport=transport) as client:
+        async with client.stream("POST", "http://llm/chat", content=BODY) as response:
+            assert governor.stats()["in_flight"] == 1
+            chunks = [chunk async for chunk in response.aiter_raw()]
+        assert b"".join(chunks) == b"".join(SSE)
+
+    stats = governor.stats()
+    assert stats["in_flight"] == 0
+    assert stats["tokens_last_minute"] == 42
+
+
+def test_sync_stream_released_on_early_close(governor):
+    transport = rate_limit.GovernedTransport(
+        httpx.MockTransport(
+            lambda request: httpx.Response(
+                200, headers={"content-type": "text/event-stream"}, content=iter(SSE)
+            )
+        )
+    )
+    with httpx.Client(transport=transport) as client:
+        with client.stream("POST", "http://llm/chat", content=BODY) as response:
+            assert governor.stats()["in_flight"] == 1
+            next(response.iter_raw())
+        assert governor.stats()["in_flight"] == 0
+    # 没读到 usage 时保留按请求体估算的 token 数
+    assert governor.stats()["tokens_last_minute"] == len(BODY) // 2 + 100
+
+
+def test_json_response_corrected_from_usage(governor):
+    transport = rate_limit.GovernedTransport(
+        httpx.MockTransport(lambda request: httpx.Response(200, json={"usage": {"total_tokens": 7}}))
+    )
+    with httpx.Client(transport=transport) as client:
+        client.post("http://llm/chat", content=BODY)
+
+    assert governor.stats()["in_flight"] == 0
+    assert governor.stats()["tokens_last_minute"] == 7
+
+
+def test_preloaded_stream_released_immediately(governor):
+    # bytes 内容的响应在构造时就已读完，没有可包装的流
+    transport = rate_limit.GovernedTransport(
+        httpx.MockTransport(
+            lambda request: httpx.Response(
+                200, headers={"content-type": "text/event-stream"}, content=b"".join(SSE)
+            )
+        )
+    )
+    with httpx.Client(transport=transport) as client:
+        with client.stream("POST", "http://llm/chat", content=BODY) as response:
+            assert governor.stats()["in_flight"] == 0
+            assert b"".join(response.iter_bytes()) == b"".join(SSE)
+
+    assert governor.stats()["tokens_last_minute"] == 42
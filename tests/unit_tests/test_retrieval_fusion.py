@@ -0,0 +1,51 @@
+import json
+
+from src.agent.retrieval_fusion import (
+    extract_context,
+    fuse_contexts,
+    reciprocal_rank_fusion,
+    split_passages,
+)
+
+
+def test_rrf_prefers_passages_ranked_high_in_many_lists():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "b", "d"], ["b", "e"]])
+    # b: 1/62 + 1/62 + 1/61 > c: 1/63 + 1/61 > a: 1/61
+    assert fused[:3] == ["b", "c", "a"]
+    assert sorted(fused) == ["a", "b", "c", "d", "e"]
+
+
+def test_rrf_ties_keep_first_seen_order():
+    assert reciprocal_rank_fusion([["x", "y"], ["y", "x"]]) == ["x", "y"]
+    assert reciprocal_rank_fusion([["y", "x"], ["x", "y"]]) == ["y", "x"]
+
+
+def test_rrf_deduplicates_ignoring_case_and_whitespace():
+    fused = reciprocal_rank_fusion([["TCP  握手", "tcp 握手", "UDP"], ["Tcp\n握手"]])
+    assert fused == ["TCP  握手", "UDP"]
+
+
+def test_rrf_counts_duplicate_in_one_list_once():
+    # 同一路中重复出现的片段只按第一次出现的排名计分
+    assert reciprocal_rank_fusion([["a", "a", "a"], ["b"]]) == ["a", "b"]
+    assert reciprocal_rank_fusion([["b", "a", "a"], ["a", "b"]]) == ["b", "a"]
+
+
+def test_fuse_contexts_unwraps_json_and_limits_length():
+    first = json.dumps({"response": "p1\n\np2"})
+    second = "p2\n\n  \n\np3"
+    assert extract_context(first) == "p1\n\np2"
+    assert split_passages(second) == ["p2", "p3"]
+    assert fuse_contexts([first, second]) == "p2\n\np1\n\np3"
+    assert fuse_contexts([first, second], max_chars=6) == "p2\n\np1"
+    assert fuse_contexts([]) == ""
+
+
+def test_fuse_contexts_skips_oversized_passage_in_the_middle():
+    long = "x" * 50
+    first = "\n\n".join(["p1", long, "p3", "p4"])
+    assert fuse_contexts([first], max_chars=20) == "p1\n\np3\n\np4"
+
+
+def test_fuse_contexts_truncates_oversized_top_passage():
+    assert fuse_contexts(["y" * 50 + "\n\np2"], max_chars=10) == "y" * 10
@@ -0,0 +1,58 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from src.agent.semantic_cache import SemanticAnswerCache
+
+pytestmark = pytest.mark.anyio
+
+
+class _Cache(SemanticAnswerCache):
+    """用确定的向量代替 sentence-transformers：问题文本相同则向量相同。"""
+
+    writes = 0
+
+    async def _embed(self, text):
+        vector = np.random.default_rng(abs(hash(text)) % 2**32).normal(size=8)
+        return (vector / np.linalg.norm(vector)).astype(np.float32)
+
+    def _write(self, *args):
+        type(self).writes += 1
+        super()._write(*args)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    _Cache.writes = 0
+    return _Cache(persist_dir=str(tmp_path), persist_delay=0.05)
+
+
+async def test_stores_are_persisted_once_in_background(cache, tmp_path):
+    for i in range(5):
+        await cache.store("c1", f"问题{i}", f"答案{i}")
+    assert _Cache.writes == 0
+    assert await cache.lookup("c1", "问题3") == "答案3"
+
+    await asyncio.sleep(0.2)
+    assert _Cache.writes == 1
+
+    reloaded = _Cache(persist_dir=str(tmp_path))
+    assert await reloaded.lookup("c1", "问题3") == "答案3"
+
+
+async def test_invalidate_cancels_pending_write(cache, tmp_path):
+    await cache.store("c1", "问题", "答案")
+    await cache.invalidate("c1")
+    await asyncio.sleep(0.2)
+
+    assert _Cache.writes == 0
+    assert not list(tmp_path.iterdir())
+
+
+async def test_flush_writes_immediately(cache, tmp_path):
+    await cache.store("c1", "问题", "答案")
+    await cache.flush()
+
+    assert _Cache.writes == 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["c1.json", "c1.npy"]